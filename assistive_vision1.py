@@ -20,6 +20,8 @@ import numpy as np
 
 import io
 
+import copy
+
 import json
 
 import requests
@@ -28,10 +30,20 @@ import speech_recognition as sr
 
 import base64
 
-from typing import Optional, Dict, List, Tuple
+import re
+
+from typing import Optional, Dict, List, Tuple, Union, Callable
 
 import queue # Added for AudioSystem speech queue
 
+from collections import OrderedDict
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from concurrent.futures.process import BrokenProcessPool
+
+import multiprocessing
+
 
 
 # --- API Key Configuration ---
@@ -150,6 +162,20 @@ except ImportError:
 
 
 
+try:
+
+    from picamera2.encoders import MJPEGEncoder
+
+    from picamera2.outputs import FileOutput
+
+    HAS_PICAMERA2_ENCODERS = True
+
+except ImportError:
+
+    HAS_PICAMERA2_ENCODERS = False
+
+
+
 try:
 
     from pynput import keyboard
@@ -178,6 +204,34 @@ except ImportError:
 
 
 
+try:
+
+    import simplejpeg
+
+    HAS_SIMPLEJPEG = True
+
+except ImportError:
+
+    HAS_SIMPLEJPEG = False
+
+    logging.warning("simplejpeg not found. Falling back to OpenCV for JPEG encoding. Install with 'pip install simplejpeg'")
+
+
+
+try:
+
+    from tflite_runtime.interpreter import Interpreter as TFLiteInterpreter
+
+    HAS_TFLITE = True
+
+except ImportError:
+
+    HAS_TFLITE = False
+
+    logging.warning("tflite-runtime not found. Offline object detection will be unavailable. Install with 'pip install tflite-runtime'")
+
+
+
 try:
 
     import pytesseract
@@ -192,6 +246,20 @@ except ImportError:
 
 
 
+try:
+
+    import tesserocr
+
+    HAS_TESSEROCR = True
+
+except ImportError:
+
+    HAS_TESSEROCR = False
+
+    logging.warning("tesserocr not found. Offline OCR will start a tesseract process per call. Install with 'pip install tesserocr'")
+
+
+
 try:
 
     import speech_recognition as sr
@@ -308,1147 +376,6041 @@ def is_online(host="8.8.8.8", port=53, timeout=3):
 
 
 
-# --- Global Flask and SocketIO instances ---
+class ConnectivityMonitor:
 
-app = Flask(__name__) if HAS_FLASK_SOCKETIO else None
+    """
 
-#socketio = SocketIO(app) if HAS_FLASK_SOCKETIO else None
+    Keeps a cached online/offline state so hot paths read a boolean instead of blocking on a socket probe.
 
-socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins="*") if HAS_FLASK_SOCKETIO else None
+    A background thread probes every `interval` seconds (every `offline_interval` while offline, to notice
 
-# --- Hardware System Class (Raspberry Pi GPIO, Sensors) ---
+    recovery quickly) and right away when a request reports a network failure. The first probe sets the
 
-class HardwareSystem:
+    initial state quietly; listeners are called with the new state whenever it changes after that.
 
-    """Manages Raspberry Pi GPIO pins for LED, Buzzer, Ultrasonic Sensor, and 4-button gesture input."""
+    """
 
-    def __init__(self, enable_distance_sensor: bool = True):
+    def __init__(self, interval: float = 30.0, offline_interval: float = 5.0, probe_timeout: float = 2.0):
 
-        self.pins_setup = False
+        self.interval = interval
 
-        self.enable_distance_sensor = enable_distance_sensor
+        self.offline_interval = offline_interval
 
+        self.probe_timeout = probe_timeout
 
+        self.min_probe_gap = 2.0 # Failure reports closer together than this share one probe
 
-        # GPIO Pin Definitions (BCM numbering)
+        self.online = True # Optimistic until the first probe; a failing request corrects it quickly
 
-        self.led_pin = 18       # Status LED
+        self.last_change = time.time()
 
-        self.buzzer_pin = 19    # Buzzer
+        self.last_probe = 0.0
 
-        self.trigger_pin = 23   # Ultrasonic Sensor Trigger (Trig)
+        self.probe_count = 0
 
-        self.echo_pin = 24      # Ultrasonic Sensor Echo (Echo) - NOTE: Requires voltage divider!
+        self.probed = False # Set by the first probe, which establishes the boot state without notifying listeners
 
+        self._listeners: List[Callable[[bool], None]] = []
 
+        self._wake = threading.Event()
 
-        self.status_led_on = False # Keep track of LED state
+        self._thread: Optional[threading.Thread] = None
 
+        self._running = False
 
 
-        # 4-Button Configuration (New Pin Assignments for clarity)
 
-        self.button_pins = {
+    def start(self):
 
-            'BUTTON_1': 17,  # Main Action (Describe, Read, Detect)
+        if self._thread is None:
 
-            'BUTTON_2': 27,  # Navigation (Location, Weather, Toggle Nav)
+            self._running = True
 
-            'BUTTON_3': 22,  # Alerts/Utility (Obstacle, Buzzer, Emergency)
+            self._thread = threading.Thread(target=self._monitor_loop, name="connectivity", daemon=True)
 
-            'BUTTON_4': 2   # Voice/Accessibility (Toggle Voice, Repeat, Stop Speaking)
+            self._thread.start()
 
-        }
+            logger.info("ConnectivityMonitor: Started.")
 
 
 
-        # Button State Tracking for Gestures
+    def stop(self):
 
-        self.button_states = {
+        self._running = False
 
-            pin: {'last_press_time': 0, 'press_count': 0, 'press_start_time': 0, 'is_pressed': False, 'timer': None}
+        self._wake.set()
 
-            for pin in self.button_pins.values()
 
-        }
 
-        self.DOUBLE_TAP_WINDOW = 0.4  # seconds
+    def add_listener(self, listener: Callable[[bool], None]):
 
-        self.LONG_PRESS_DURATION = 1.0  # seconds
+        self._listeners.append(listener)
 
 
 
-        if HAS_GPIO:
+    def report_failure(self):
 
-            try:
+        """Called when a network request fails; schedules an immediate re-probe."""
 
-                GPIO.setmode(GPIO.BCM)
+        self._wake.set()
 
-                GPIO.setup(self.led_pin, GPIO.OUT)
 
-                GPIO.setup(self.buzzer_pin, GPIO.OUT)
 
-                
+    def report_success(self):
 
-                if self.enable_distance_sensor:
+        """Called when a network request succeeds, which proves we are online."""
 
-                    GPIO.setup(self.trigger_pin, GPIO.OUT)
+        if not self.online:
 
-                    GPIO.setup(self.echo_pin, GPIO.IN)
+            self._set_online(True)
 
-                    logger.info(f"HardwareSystem: Ultrasonic sensor (Trig:{self.trigger_pin}, Echo:{self.echo_pin}) configured.")
 
-                else:
 
-                    logger.info("HardwareSystem: Ultrasonic sensor disabled by configuration.")
+    def _monitor_loop(self):
 
+        while self._running:
 
+            self._wake.clear()
 
-                # Setup Buttons for input with pull-up resistors
+            self.last_probe = time.time()
 
-                for name, pin in self.button_pins.items():
+            self.probe_count += 1
 
-                    GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            online = is_online(timeout=self.probe_timeout)
 
-                    # Add event detection for both rising and falling edges to track press start/end
+            if not self.probed:
 
-                    GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._button_event_callback, bouncetime=50) # Increased bouncetime for stability
+                self.probed = True
 
-                    logger.info(f"HardwareSystem: Button '{name}' on GPIO {pin} configured.")
+                self.online = online
 
+                self.last_change = time.time()
 
+                logger.info(f"ConnectivityMonitor: Started {'online' if online else 'offline'}.")
 
-                # Ensure initial state is off
+            else:
 
-                GPIO.output(self.led_pin, GPIO.LOW)
+                self._set_online(online)
 
-                GPIO.output(self.buzzer_pin, GPIO.LOW)
+            self._wake.wait(self.interval if self.online else self.offline_interval)
 
+            # Rate-limit probes triggered by bursts of failure reports
 
+            time.sleep(max(0.0, self.min_probe_gap - (time.time() - self.last_probe)))
 
-                self.pins_setup = True
 
-                logger.info("HardwareSystem: GPIO pins initialized successfully.")
 
-            except Exception as e:
+    def _set_online(self, online: bool):
 
-                logger.error(f"HardwareSystem: GPIO setup failed: {e}. Hardware features may be limited.")
+        if online == self.online:
 
-        else:
+            return
 
-            logger.warning("HardwareSystem: RPi.GPIO not available. Hardware features are disabled.")
+        self.online = online
 
+        self.last_change = time.time()
 
+        logger.info(f"ConnectivityMonitor: Now {'online' if online else 'offline'}.")
 
-    def _button_event_callback(self, channel):
+        for listener in list(self._listeners):
 
-        """Callback for GPIO button events (both rising and falling edges)."""
+            try:
 
-        current_time = time.time()
+                listener(online)
 
-        button_state = self.button_states[channel]
+            except Exception as e:
 
+                logger.error(f"ConnectivityMonitor: Listener failed: {e}")
 
 
-        if GPIO.input(channel) == GPIO.LOW:  # Button is pressed (falling edge)
 
-            button_state['is_pressed'] = True
+    def stats(self) -> Dict:
 
-            button_state['press_start_time'] = current_time
+        return {'online': self.online, 'since': round(time.time() - self.last_change, 1), 'probes': self.probe_count}
 
-            # Start a timer to check for long press
 
-            if button_state['timer']:
 
-                button_state['timer'].cancel() # Cancel any pending timer for double tap if button pressed again
+connectivity = ConnectivityMonitor() # Read connectivity.online instead of calling is_online() on hot paths
 
-            button_state['timer'] = threading.Timer(self.LONG_PRESS_DURATION, self._long_press_detected, args=[channel])
 
-            button_state['timer'].start()
 
-            logger.debug(f"Button {channel} pressed.")
+# --- Shared HTTP Session (connection pooling, DNS cache, reuse stats) ---
 
-        else:  # Button is released (rising edge)
+class DNSCache:
 
-            button_state['is_pressed'] = False
+    """
 
-            if button_state['timer']:
+    Caches getaddrinfo() results for the hosts the HTTP client talks to, so a new pooled
 
-                button_state['timer'].cancel() # Cancel long press timer if released before duration
+    connection skips the DNS lookup. A stale entry is used if a refresh fails (flaky links).
 
+    """
 
+    def __init__(self, ttl: float = 300.0):
 
-            press_duration = current_time - button_state['press_start_time']
+        self.ttl = ttl
 
-            
+        self.hosts = set() # Only these hosts are cached; every other lookup passes straight through
 
-            if press_duration < self.LONG_PRESS_DURATION: # Not a long press, process as short press
+        self._entries: Dict[tuple, Tuple[float, list]] = {}
 
-                logger.debug(f"Button {channel} released after short press ({press_duration:.3f}s).")
+        self._lock = threading.Lock()
 
-                if (current_time - button_state['last_press_time']) < self.DOUBLE_TAP_WINDOW:
+        self._resolve = socket.getaddrinfo
 
-                    button_state['press_count'] += 1
+        self._installed = False
 
-                    if button_state['press_count'] == 2:
+        self.hits = 0
 
-                        self._dispatch_gesture(channel, 'double_tap')
+        self.misses = 0
 
-                        button_state['press_count'] = 0 # Reset for next gesture
 
-                        button_state['last_press_time'] = 0
 
-                else:
+    def install(self):
 
-                    button_state['press_count'] = 1
+        """Routes socket.getaddrinfo through this cache (once per process)."""
 
-                    button_state['last_press_time'] = current_time
+        if not self._installed:
 
-                    # Start a timer to confirm single press if no second press occurs
+            self._resolve = socket.getaddrinfo
 
-                    threading.Timer(self.DOUBLE_TAP_WINDOW, self._check_single_press, args=[channel]).start()
+            socket.getaddrinfo = self._getaddrinfo
 
-            # If it was a long press, _long_press_detected would have handled it.
+            self._installed = True
 
 
 
-    def _check_single_press(self, channel):
+    def _getaddrinfo(self, host, *args, **kwargs):
 
-        """Checks if a single press was confirmed after the double-tap window."""
+        if host not in self.hosts:
 
-        button_state = self.button_states[channel]
+            return self._resolve(host, *args, **kwargs)
 
-        current_time = time.time()
+        key = (host, args, tuple(sorted(kwargs.items())))
 
-        if (button_state['press_count'] == 1 and 
+        with self._lock:
 
-            (current_time - button_state['last_press_time']) >= self.DOUBLE_TAP_WINDOW):
+            entry = self._entries.get(key)
 
-            self._dispatch_gesture(channel, 'single_press')
+        if entry is not None and time.time() - entry[0] < self.ttl:
 
-            button_state['press_count'] = 0 # Reset
+            self.hits += 1
 
-            button_state['last_press_time'] = 0
+            return entry[1]
 
+        try:
 
+            result = self._resolve(host, *args, **kwargs)
 
-    def _long_press_detected(self, channel):
+        except socket.gaierror as e:
 
-        """Called when a long press is detected."""
+            if entry is None:
 
-        button_state = self.button_states[channel]
+                raise
 
-        if button_state['is_pressed']: # Ensure button is still held down
+            logger.warning(f"DNSCache: Lookup of {host} failed ({e}); using cached address.")
 
-            logger.debug(f"Button {channel} long press detected.")
+            return entry[1]
 
-            self._dispatch_gesture(channel, 'long_press')
+        with self._lock:
 
-            button_state['press_count'] = 0 # Reset counts after a long press
+            self._entries[key] = (time.time(), result)
 
-            button_state['last_press_time'] = 0
+        self.misses += 1
 
-            button_state['is_pressed'] = False # Simulate release for state machine consistency
+        return result
 
 
 
-    def _dispatch_gesture(self, channel, gesture_type):
+class HTTPClient:
 
-        """Dispatches the detected gesture to the system instance."""
+    """
 
-        button_name = next(name for name, pin in self.button_pins.items() if pin == channel)
+    One keep-alive requests.Session shared by every cloud call (Gemini, weather, IP location).
 
-        logger.info(f"Gesture detected: {button_name} - {gesture_type}")
+    Pooled connections skip the DNS + TCP + TLS setup a bare requests.get/post pays on each command.
 
-        # Emit to SocketIO for web interface feedback (optional, but good for debugging/status)
+    """
 
-        if socketio:
+    def __init__(self, pool_size: int = 4, dns_ttl: float = 300.0):
 
-            socketio.emit('button_gesture', {'button': button_name, 'gesture': gesture_type})
+        self.session = requests.Session()
 
-        
+        # Retry a failed connect once; read errors, error statuses and everything else are never
 
-        # Pass control to the main system handler
+        # retried, so a request the server may already have received (a POST) is never sent twice
 
-        system_instance.handle_button_gesture(button_name, gesture_type)
+        retry = requests.adapters.Retry(total=1, connect=1, read=0, status=0, other=0)
 
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=retry)
 
+        self.session.mount('https://', self.adapter)
 
-    def set_status_led(self, on: bool):
+        self.session.mount('http://', self.adapter)
 
-        """Turns the status LED on or off."""
+        self.dns_cache = DNSCache(ttl=dns_ttl) # Inactive until main() calls dns_cache.install()
 
-        if self.pins_setup:
+        self._stats: Dict[str, Dict[str, float]] = {}
 
-            GPIO.output(self.led_pin, GPIO.HIGH if on else GPIO.LOW)
+        self._stats_lock = threading.Lock()
 
-            self.status_led_on = on
 
-            logger.info(f"HardwareSystem: Status LED {'ON' if on else 'OFF'}")
 
-        else:
+    def get(self, url: str, **kwargs) -> requests.Response:
 
-            logger.warning("HardwareSystem: Cannot control LED, GPIO not set up.")
+        return self.request('GET', url, **kwargs)
 
 
 
-    def toggle_status_led(self):
+    def post(self, url: str, **kwargs) -> requests.Response:
 
-        """Toggles the status LED on/off."""
+        return self.request('POST', url, **kwargs)
 
-        self.set_status_led(not self.status_led_on)
 
 
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
 
-    def trigger_buzzer(self, duration: float = 0.1):
+        """Sends a request over the shared pool and records per-host timing."""
 
-        """Triggers the buzzer for a specified duration."""
+        host = requests.utils.urlparse(url).hostname
 
-        if self.pins_setup:
+        self.dns_cache.hosts.add(host)
 
-            try:
+        is_remote = host not in ('127.0.0.1', 'localhost', '::1') # Local servers say nothing about the Internet
 
-                GPIO.output(self.buzzer_pin, GPIO.HIGH)
+        start = time.perf_counter()
 
-                time.sleep(duration)
+        failed = False
 
-                GPIO.output(self.buzzer_pin, GPIO.LOW)
+        try:
 
-                logger.info(f"HardwareSystem: Buzzer triggered for {duration}s.")
+            response = self.session.request(method, url, **kwargs)
 
-            except Exception as e:
+            if is_remote:
 
-                logger.error(f"HardwareSystem: Error triggering buzzer: {e}")
+                connectivity.report_success()
 
-        else:
+            return response
 
-            logger.warning("HardwareSystem: Cannot trigger buzzer, GPIO not set up.")
+        except requests.exceptions.RequestException as e:
 
+            failed = True
 
+            if is_remote and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
 
-    def get_distance(self) -> float:
+                connectivity.report_failure()
 
-        """Gets distance reading from ultrasonic sensor (HC-SR04). Returns distance in cm."""
+            raise
 
-        if not self.pins_setup or not self.enable_distance_sensor:
+        finally:
 
-            return 50.0  # Mock distance if hardware not available/enabled
+            self._record(host, time.perf_counter() - start, failed)
 
 
 
-        try:
+    def _record(self, host: str, seconds: float, failed: bool):
 
-            # Ensure trigger is low before pulse
+        with self._stats_lock:
 
-            GPIO.output(self.trigger_pin, False)
+            stats = self._stats.setdefault(host, {'requests': 0, 'errors': 0, 'total_seconds': 0.0})
 
-            time.sleep(0.000002)
+            stats['requests'] += 1
 
+            stats['errors'] += int(failed)
 
+            stats['total_seconds'] += seconds
 
-            # Send 10us pulse to trigger
 
-            GPIO.output(self.trigger_pin, True)
 
-            time.sleep(0.00001)
+    def _connections_opened(self) -> Dict[str, int]:
 
-            GPIO.output(self.trigger_pin, False)
+        """Connections each host's urllib3 pools have opened so far."""
 
+        opened: Dict[str, int] = {}
 
+        pools = self.adapter.poolmanager.pools
 
-            pulse_start_time = time.time()
+        for key in pools.keys():
 
-            pulse_end_time = time.time()
+            pool = pools.get(key)
 
+            if pool is not None:
 
+                opened[pool.host] = opened.get(pool.host, 0) + pool.num_connections
 
-            timeout_start = time.time()
+        return opened
 
-            # Wait for echo to go HIGH
 
-            while GPIO.input(self.echo_pin) == 0:
 
-                pulse_start_time = time.time()
+    def stats(self) -> Dict:
 
-                if time.time() - timeout_start > 0.02: # 20ms timeout for pulse start
+        """Per-host request counts, connections opened vs. reused, and mean latency."""
 
-                    logger.warning("HardwareSystem: Ultrasonic: Echo pulse start timeout.")
+        opened_by_host = self._connections_opened()
 
-                    return -1.0
+        with self._stats_lock:
 
-            
+            hosts = {}
 
-            timeout_end = time.time()
+            for host, stats in self._stats.items():
 
-            # Wait for echo to go LOW
+                opened = opened_by_host.get(host, 0)
 
-            while GPIO.input(self.echo_pin) == 1:
+                hosts[host] = {
 
-                pulse_end_time = time.time()
+                    'requests': int(stats['requests']),
 
-                if time.time() - timeout_end > 0.04: # 40ms timeout for pulse end (total 60ms)
+                    'errors': int(stats['errors']),
 
-                    logger.warning("HardwareSystem: Ultrasonic: Echo pulse end timeout.")
+                    'connections_opened': opened,
 
-                    return -1.0
+                    'connections_reused': max(0, int(stats['requests']) - opened),
 
+                    'mean_ms': round(1000 * stats['total_seconds'] / stats['requests'], 1),
 
+                }
 
-            pulse_duration = pulse_end_time - pulse_start_time
+        return {'hosts': hosts, 'dns_cache': {'hits': self.dns_cache.hits, 'misses': self.dns_cache.misses}}
 
-            distance = pulse_duration * 17150  # Speed of sound (34300 cm/s / 2)
 
-            distance = round(distance, 2)
 
+    def prewarm(self, urls: List[str]):
 
+        """Opens (and TLS-handshakes) pooled connections to urls in the background, ahead of the first command."""
 
-            # Filter out invalid readings (e.g., too close, too far, or errors)
+        def run():
 
-            if 2 <= distance <= 400:
+            for url in urls:
 
-                return distance
+                start = time.perf_counter()
 
-            else:
+                try:
 
-                logger.warning(f"HardwareSystem: Ultrasonic: Invalid distance reading: {distance} cm. Returning -1.0")
+                    self.request('HEAD', url, timeout=5)
 
-                return -1.0
+                    logger.info(f"HTTPClient: Pre-warmed {url} in {(time.perf_counter() - start) * 1000:.0f} ms.")
 
-        except Exception as e:
+                except requests.exceptions.RequestException as e:
 
-            logger.error(f"HardwareSystem: Error getting distance: {e}")
+                    logger.warning(f"HTTPClient: Could not pre-warm {url}: {e}")
 
-            return -1.0
+        threading.Thread(target=run, name="http-prewarm", daemon=True).start()
 
 
 
-    def cleanup(self):
+http_client = HTTPClient() # Shared by every outbound API call
 
-        """Cleans up GPIO settings."""
 
-        if self.pins_setup and HAS_GPIO:
 
-            GPIO.cleanup()
+# --- LLM Backends ---
 
-            logger.info("HardwareSystem: GPIO cleanup complete.")
+class LLMBackend:
 
+    """
 
+    Interface to a text + vision LLM service.
 
-# --- AI Vision System Class (Camera, Image Processing, LLM Integration) ---
+    Methods raise requests.exceptions.RequestException on transport errors and ValueError on
 
-class AIVisionSystem:
+    malformed responses; AIVisionSystem turns those into spoken messages.
 
-    """Manages camera operations and AI vision tasks."""
+    """
 
-    def __init__(self, socketio_instance, enable_camera: bool = True):
+    name = "base"
 
-        self.socketio = socketio_instance
+    text_model = ""
 
-        self.enable_camera = enable_camera
+    vision_model = ""
 
-        self.picam2 = None
+    prewarm_url: Optional[str] = None # Fetched at boot to open a pooled connection, if set
 
-        self.last_capture_time = 0
 
 
+    def is_configured(self) -> bool:
 
-        # API and Model Configuration
+        """True if the backend has what it needs (e.g. an API key) to be called at all."""
 
-        self.gemini_api_key = GEMINI_API_KEY
+        raise NotImplementedError
 
-        self.gemini_vision_model = "gemini-2.0-flash" # Model for multimodal inputs
 
-        self.gemini_text_model = "gemini-2.0-flash" # Model for text-only inputs
 
-        if not self.gemini_api_key:
+    def is_available(self) -> bool:
 
-            logger.warning("GEMINI_API_KEY environment variable not set. Online AI features will be disabled.")
+        """True if a call can be attempted right now (configured and reachable)."""
 
+        return self.is_configured()
 
 
-        if self.enable_camera and HAS_CAMERA:
 
-            try:
+    def generate_text(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
 
-                self.picam2 = Picamera2()
+        raise NotImplementedError
 
-                camera_config = self.picam2.create_video_configuration(main={"size": (640, 480)})
 
-                self.picam2.configure(camera_config)
 
-                self.picam2.options["quality"] = 90 # Set JPEG quality for captures
+    def generate_vision(self, prompt: str, image_b64: str, generation_config: Optional[Dict] = None) -> str:
 
-                self.picam2.start()
+        raise NotImplementedError
 
-                logger.info("AIVisionSystem: Camera initialized.")
 
-                time.sleep(2) # Warm-up time
 
-            except Exception as e:
+    def stream_vision(self, prompt: str, image_b64: str, on_text: Callable[[str], None],
 
-                logger.error(f"AIVisionSystem: Camera initialization failed: {e}. Camera features disabled.")
+                      generation_config: Optional[Dict] = None) -> str:
 
-                self.enable_camera = False
+        """Streams the answer to on_text as it is generated and returns the full text. Default: one chunk."""
 
-        else:
+        text = self.generate_vision(prompt, image_b64, generation_config)
 
-            logger.warning("AIVisionSystem: Camera not available or disabled by configuration.")
+        on_text(text)
 
+        return text
 
 
-    def _get_image_data(self) -> Optional[str]:
 
-        """
+class GeminiBackend(LLMBackend):
 
-        Captures an image and returns it as base64 encoded JPEG.
+    """Google Gemini over the generativelanguage REST API, through the shared pooled HTTP client."""
 
-        Returns None if camera is not enabled/initialized or an error occurs.
+    name = "gemini"
 
-        """
+    DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
 
-        if not self.enable_camera or self.picam2 is None:
+    SAFETY_SETTINGS = [
 
-            logger.warning("AIVisionSystem: Camera not enabled or initialized. Cannot capture image. Returning None.")
+        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 
-            return None
+        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 
+        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 
+        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
 
-        try:
+    ]
 
-            array = self.picam2.capture_array()
+    TEXT_CONFIG = {"temperature": 0.5, "maxOutputTokens": 125}
 
-            logger.debug(f"AIVisionSystem: Captured array shape: {array.shape}, dtype: {array.dtype}") # Debug log for array info
+    VISION_CONFIG = {"temperature": 0.4, "topK": 32, "topP": 1, "maxOutputTokens": 200, "stopSequences": []}
 
-            
 
-            if HAS_OPENCV:
 
-                # picamera2.capture_array() usually returns RGB or XBGR.
+    def __init__(self, api_key: Optional[str], text_model: str = "gemini-2.0-flash",
 
-                # XBGR is effectively BGR, so if 3 channels, we assume BGR and proceed.
+                 vision_model: str = "gemini-2.0-flash", base_url: Optional[str] = None, timeout: float = 20):
 
-                # If grayscale (2D array), convert to BGR.
+        self.api_key = api_key
 
-                if len(array.shape) == 2:  # Grayscale image (H, W)
+        self.text_model = text_model # Model for text-only inputs
 
-                    array_bgr = cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)
+        self.vision_model = vision_model # Model for multimodal inputs
 
-                    logger.debug("AIVisionSystem: Converted grayscale (2D) to BGR.")
+        self.base_url = (base_url or self.DEFAULT_BASE_URL).rstrip('/')
 
-                elif array.shape[2] == 3:  # Color image (H, W, 3) - assume it's already BGR or compatible
+        self.timeout = timeout
 
-                    array_bgr = array
+        parsed = requests.utils.urlparse(self.base_url)
 
-                    logger.debug("AIVisionSystem: Image is 3-channel, using directly (assuming BGR/compatible).")
+        self.prewarm_url = f"{parsed.scheme}://{parsed.netloc}/"
 
-                elif array.shape[2] == 4:  # Color image with Alpha channel (H, W, 4)
+        if not self.api_key:
 
-                    array_bgr = cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+            logger.warning("GEMINI_API_KEY environment variable not set. Online AI features will be disabled.")
 
-                    logger.debug("AIVisionSystem: Converted 4-channel (RGBA) to BGR.")
 
-                else:
 
-                    logger.error(f"AIVisionSystem: Unexpected image array shape: {array.shape}. Returning None.")
+    def is_configured(self) -> bool:
 
-                    return None
+        return bool(self.api_key)
 
 
 
-                ret, buffer = cv2.imencode('.jpg', array_bgr)
+    def is_available(self) -> bool:
 
-                if not ret or buffer.size == 0: # Check buffer size in addition to 'ret'
+        return self.is_configured() and connectivity.online
 
-                    logger.error("AIVisionSystem: Failed to encode image to JPEG or resulting buffer is empty. Ret: %s, Buffer size: %s. Returning None.", ret, buffer.size if ret else 'N/A')
 
-                    return None
 
-                
+    def _payload(self, parts: List[Dict], defaults: Dict, generation_config: Optional[Dict]) -> str:
 
-                b64_image = base64.b64encode(buffer).decode('utf-8')
+        config = dict(defaults)
 
-                logger.debug("AIVisionSystem: Successfully encoded image to base64.")
+        if generation_config:
 
-                return f"data:image/jpeg;base64,{b64_image}"
+            config.update(generation_config)
 
-            else:
+        return json.dumps({"contents": [{"parts": parts}], "generationConfig": config,
 
-                logger.warning("AIVisionSystem: OpenCV not found for JPEG encoding. Cannot reliably capture image. Returning None.")
+                           "safetySettings": self.SAFETY_SETTINGS})
 
-                return None
 
 
+    @staticmethod
 
-        except Exception as e:
+    def _vision_parts(prompt: str, image_b64: str) -> List[Dict]:
 
-            logger.error(f"AIVisionSystem: Error capturing or processing image: {e}. Returning None.")
+        return [{"text": prompt}, {"inlineData": {"mimeType": "image/jpeg", "data": image_b64}}]
 
-            return None
 
 
+    @staticmethod
 
-    def describe_scene(self, prompt_suffix: str = "") -> str:
+    def _candidate_text(result: Dict) -> str:
 
-        """Captures an image and uses an LLM to describe the scene."""
+        """Text of the first candidate; raises ValueError if the response has none."""
 
-        logger.info("AIVisionSystem: Describing scene...")
+        try:
 
-        if not is_online() or not self.gemini_api_key:
+            return result['candidates'][0]['content']['parts'][0]['text']
 
-            offline_msg = "Cannot describe scene. Internet connection or AI service is unavailable."
+        except (KeyError, IndexError, TypeError):
 
-            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+            raise ValueError(f"Unexpected response structure: {str(result)[:200]}")
 
-            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
 
-            system_instance.last_spoken_response = offline_msg
 
-            return "Scene description unavailable offline."
+    def _generate(self, model: str, body: str, label: str) -> str:
 
+        api_url = f"{self.base_url}/models/{model}:generateContent?key={self.api_key}"
 
+        request_start = time.time()
 
-        image_data = self._get_image_data()
+        response = http_client.post(api_url, headers={'Content-Type': 'application/json'}, data=body, timeout=self.timeout)
 
-        if image_data:
+        logger.info(f"GeminiBackend: {label} call: {len(body) // 1024} KiB payload, {time.time() - request_start:.2f}s round trip.")
 
-            try:
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
-                base_prompt = "Describe the scene in detail, focusing on objects, colors, and overall environment."
+        return self._candidate_text(response.json())
 
-                full_prompt = f"{base_prompt} {prompt_suffix}".strip()
 
-                response_text = self._call_llm_vision(full_prompt, image_data)
 
-                self.socketio.emit('speech_output', {'message': f"Scene: {response_text}"}) # Still emit for web log
+    def generate_text(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
 
-                system_instance.audio_system.speak(f"Scene: {response_text}") # Now also speak directly on Pi
+        return self._generate(self.text_model, self._payload([{"text": prompt}], self.TEXT_CONFIG, generation_config), "text")
 
-                # Store the last spoken response
 
-                system_instance.last_spoken_response = f"Scene: {response_text}"
 
-                return f"Scene described: {response_text}"
+    def generate_vision(self, prompt: str, image_b64: str, generation_config: Optional[Dict] = None) -> str:
 
-            except Exception as e:
+        body = self._payload(self._vision_parts(prompt, image_b64), self.VISION_CONFIG, generation_config)
 
-                logger.error(f"AIVisionSystem: Error describing scene with LLM: {e}")
+        return self._generate(self.vision_model, body, "vision")
 
-                error_msg = "Sorry, I couldn't describe the scene at the moment."
 
-                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
 
-                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+    def stream_vision(self, prompt: str, image_b64: str, on_text: Callable[[str], None],
 
-                system_instance.last_spoken_response = error_msg
+                      generation_config: Optional[Dict] = None) -> str:
 
-                return "Failed to describe scene."
+        """Posts to streamGenerateContent (server-sent events), forwarding text chunks as they arrive."""
 
-        else:
+        body = self._payload(self._vision_parts(prompt, image_b64), self.VISION_CONFIG, generation_config)
 
-            no_image_msg = "Sorry, I can't capture an image to describe the scene."
+        api_url = f"{self.base_url}/models/{self.vision_model}:streamGenerateContent?alt=sse&key={self.api_key}"
 
-            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+        request_start = time.time()
 
-            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+        chunks: List[str] = []
 
-            system_instance.last_spoken_response = no_image_msg
+        with http_client.post(api_url, headers={'Content-Type': 'application/json'}, data=body,
 
-            return "No image captured for scene description."
+                              timeout=self.timeout, stream=True) as response:
 
+            response.raise_for_status()
 
+            response.encoding = 'utf-8'
 
-    def read_text_from_image(self) -> str:
+            for line in response.iter_lines(decode_unicode=True):
 
-        """Captures an image and uses OCR to read text, with online/offline fallback."""
+                if not line or not line.startswith('data:'):
 
-        logger.info("AIVisionSystem: Reading text from image...")
+                    continue
 
+                event = json.loads(line[len('data:'):])
 
+                for candidate in event.get('candidates', [])[:1]:
 
-        if not self.enable_camera or self.picam2 is None:
+                    for part in candidate.get('content', {}).get('parts', []):
 
-            no_image_msg = "Sorry, I can't capture an image to read text."
+                        if part.get('text'):
 
-            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+                            if not chunks:
 
-            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+                                logger.info(f"GeminiBackend: vision stream: first text after {time.time() - request_start:.2f}s.")
 
-            system_instance.last_spoken_response = no_image_msg
+                            chunks.append(part['text'])
 
-            return "No image captured for text reading."
+                            on_text(part['text'])
 
+        logger.info(f"GeminiBackend: vision stream: {len(body) // 1024} KiB payload, complete after {time.time() - request_start:.2f}s.")
 
+        if not chunks:
 
-        # --- Online Path (Gemini Vision) ---
+            raise ValueError("Stream ended without any text")
 
-        if is_online() and self.gemini_api_key:
+        return "".join(chunks)
 
-            logger.info("AIVisionSystem: Using online AI for text reading.")
 
-            image_data = self._get_image_data()
 
-            if image_data:
+class LocalMockBackend(GeminiBackend):
 
-                try:
+    """
 
-                    prompt = "Read all the text in this image. If there is no text, say 'No text found'."
+    Gemini-compatible client pointed at a local stand-in (see mock_llm_server.py), for benchmarking
 
-                    response_text = self._call_llm_vision(prompt, image_data)
+    and load-testing the command pipeline without network access or an API key.
 
-                    response_msg = f"I read: {response_text.strip()}"
+    """
 
-                    self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+    name = "mock"
 
-                    system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+    DEFAULT_LOCAL_URL = "http://127.0.0.1:8765/v1beta"
 
-                    system_instance.last_spoken_response = response_msg
 
-                    return f"Text read (online): {response_text.strip()}"
 
-                except Exception as e:
+    def __init__(self, base_url: Optional[str] = None, **kwargs):
 
-                    logger.error(f"AIVisionSystem: Error reading text with LLM, falling back to offline: {e}")
+        super().__init__(api_key="mock", base_url=base_url or self.DEFAULT_LOCAL_URL, **kwargs)
 
-                    # Fall through to offline method if online fails
+        self.prewarm_url = None # Local; nothing to warm up
 
-            else:
 
-                logger.warning("AIVisionSystem: Could not get image for online OCR, falling back.")
 
+    def is_available(self) -> bool:
 
+        return True # Reachability shows up as request errors, like any other backend failure
 
-        # --- Offline Path (Tesseract) ---
 
-        logger.info("AIVisionSystem: Using offline Tesseract for text reading.")
 
-        if not HAS_TESSERACT or not HAS_OPENCV:
+LLM_BACKENDS = ('gemini', 'mock')
 
-            no_ocr_msg = "Offline text reading is not available. Please install Tesseract OCR and OpenCV."
 
-            self.socketio.emit('speech_output', {'message': no_ocr_msg}) # Still emit for web log
 
-            system_instance.audio_system.speak(no_ocr_msg) # Now also speak directly on Pi
+def create_llm_backend(backend: str = 'gemini', base_url: Optional[str] = None) -> LLMBackend:
 
-            system_instance.last_spoken_response = no_ocr_msg
+    """Returns the LLM backend for a name. base_url points either backend at another server."""
 
-            return "Text reading not available."
+    if backend == 'mock':
 
+        return LocalMockBackend(base_url=base_url)
 
+    return GeminiBackend(GEMINI_API_KEY, base_url=base_url)
 
-        try:
 
-            array = self.picam2.capture_array()
 
-            # Convert to grayscale for better OCR performance
+def benchmark_llm_backend(ai_vision, request_count: int = 20, concurrency: int = 1) -> Dict[str, Dict]:
 
-            if array.shape[2] == 4:
+    """
 
-                array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+    Sends request_count text, vision and streamed-vision requests through the configured backend
 
-            gray_image = cv2.cvtColor(array, cv2.COLOR_BGR2GRAY)
+    (and the shared HTTP pool), concurrency at a time, and reports latency percentiles and errors.
 
-            text = pytesseract.image_to_string(gray_image)
+    The response cache is bypassed so every request reaches the backend.
 
-            
+    """
 
-            if text.strip():
+    llm = ai_vision.llm
 
-                response_msg = f"I read: {text.strip()}"
+    width, height = ai_vision.still_size
 
-                self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
 
-                system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+    noise = np.random.normal(0, 8, (height, width, 3)).astype(np.float32)
 
-                system_instance.last_spoken_response = response_msg
+    buffer = ai_vision._encode_jpeg(np.clip(gradient + noise, 0, 255).astype(np.uint8), quality=80)
 
-                return f"Text read (offline): {text.strip()}"
+    image_b64 = EncodedFrame(buffer, 0, time.time(), width, height).b64 if buffer is not None else ""
 
-            else:
+    vision_prompt = "Describe the scene in detail, focusing on objects, colors, and overall environment."
 
-                no_text_msg = "No readable text found in the image."
+    calls = {
 
-                self.socketio.emit('speech_output', {'message': no_text_msg}) # Still emit for web log
+        'text': lambda on_text: llm.generate_text("Summarize: it is 18 degrees and cloudy."),
 
-                system_instance.audio_system.speak(no_text_msg) # Now also speak directly on Pi
+        'vision': lambda on_text: llm.generate_vision(vision_prompt, image_b64),
 
-                system_instance.last_spoken_response = no_text_msg
+        'vision_stream': lambda on_text: llm.stream_vision(vision_prompt, image_b64, on_text),
 
-                return "No text found."
+    }
 
-        except Exception as e:
 
-            logger.error(f"AIVisionSystem: Error reading text with Tesseract: {e}")
 
-            error_msg = "Sorry, I encountered an error while trying to read text."
+    def timed(call) -> Tuple[Optional[float], Optional[float]]:
 
-            self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+        start = time.perf_counter()
 
-            system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+        first_text: List[float] = []
 
-            system_instance.last_spoken_response = error_msg
+        def on_text(chunk: str):
 
-            return "Failed to read text."
+            if not first_text:
 
+                first_text.append(time.perf_counter() - start)
 
+        try:
 
-    def detect_objects(self, prompt_suffix: str = "") -> str:
+            call(on_text)
 
-        """Captures an image and uses an LLM to detect objects."""
+        except (requests.exceptions.RequestException, ValueError) as e:
 
-        logger.info("AIVisionSystem: Detecting objects...")
+            logger.debug(f"LLM benchmark request failed: {e}")
 
-        if not is_online() or not self.gemini_api_key:
+            return None, None
 
-            offline_msg = "Cannot detect objects. Internet connection or AI service is unavailable."
+        return time.perf_counter() - start, (first_text[0] if first_text else None)
 
-            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
 
-            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
 
-            system_instance.last_spoken_response = offline_msg
+    results = {}
 
-            return "Object detection unavailable offline."
+    for kind, call in calls.items():
 
+        wall_start = time.perf_counter()
 
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
 
-        image_data = self._get_image_data()
+            outcomes = list(pool.map(lambda _: timed(call), range(request_count)))
 
-        if image_data:
+        wall = time.perf_counter() - wall_start
 
-            try:
+        totals = [total * 1000 for total, _ in outcomes if total is not None]
 
-                base_prompt = "List all prominent objects you see in this image. Be concise."
+        firsts = [first * 1000 for _, first in outcomes if first is not None]
 
-                full_prompt = f"{base_prompt} {prompt_suffix}".strip()
+        stats = {'requests': request_count, 'errors': request_count - len(totals),
 
-                response_text = self._call_llm_vision(full_prompt, image_data)
+                 'requests_per_s': round(request_count / wall, 2)}
 
-                response_msg = f"Objects detected: {response_text}"
+        if totals:
 
-                self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+            stats.update(p50_ms=round(float(np.percentile(totals, 50))), p95_ms=round(float(np.percentile(totals, 95))))
 
-                system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+        if kind == 'vision_stream' and firsts:
 
-                system_instance.last_spoken_response = response_msg
+            stats.update(first_text_p50_ms=round(float(np.percentile(firsts, 50))),
 
-                return f"Objects detected: {response_text}"
+                         first_text_p95_ms=round(float(np.percentile(firsts, 95))))
 
-            except Exception as e:
+        results[kind] = stats
 
-                logger.error(f"AIVisionSystem: Error detecting objects with LLM: {e}")
+        logger.info(f"LLM benchmark [{llm.name}/{kind}] concurrency {concurrency}: {stats}")
 
-                error_msg = "Sorry, I couldn't detect objects at the moment."
+    logger.info(f"LLM benchmark HTTP stats: {http_client.stats()}")
 
-                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+    return results
 
-                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
 
-                system_instance.last_spoken_response = error_msg
 
-                return "Failed to detect objects."
+# --- Global Flask and SocketIO instances ---
 
-        else:
+app = Flask(__name__) if HAS_FLASK_SOCKETIO else None
 
-            no_image_msg = "Sorry, I can't capture an image to detect objects."
+#socketio = SocketIO(app) if HAS_FLASK_SOCKETIO else None
 
-            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins="*") if HAS_FLASK_SOCKETIO else None
 
-            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+# --- Hardware System Class (Raspberry Pi GPIO, Sensors) ---
 
-            system_instance.last_spoken_response = no_image_msg
+class HardwareSystem:
 
-            return "No image captured for object detection."
+    """Manages Raspberry Pi GPIO pins for LED, Buzzer, Ultrasonic Sensor, and 4-button gesture input."""
 
+    def __init__(self, enable_distance_sensor: bool = True):
 
+        self.pins_setup = False
 
-    def recognize_face(self) -> str:
+        self.enable_distance_sensor = enable_distance_sensor
 
-        """Captures an image and attempts face recognition (placeholder)."""
 
-        logger.info("AIVisionSystem: Attempting face recognition...")
 
-        if not is_online() or not self.gemini_api_key:
+        # GPIO Pin Definitions (BCM numbering)
 
-            offline_msg = "Cannot recognize faces. Internet connection or AI service is unavailable."
+        self.led_pin = 18       # Status LED
 
-            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+        self.buzzer_pin = 19    # Buzzer
 
-            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
+        self.trigger_pin = 23   # Ultrasonic Sensor Trigger (Trig)
 
-            system_instance.last_spoken_response = offline_msg
+        self.echo_pin = 24      # Ultrasonic Sensor Echo (Echo) - NOTE: Requires voltage divider!
 
-            return "Face recognition unavailable offline."
 
 
+        self.status_led_on = False # Keep track of LED state
 
-        image_data = self._get_image_data()
 
-        if image_data:
 
-            try:
+        # 4-Button Configuration (New Pin Assignments for clarity)
 
-                # In a real system, you'd send image_data to a face recognition model/API
+        self.button_pins = {
 
-                # This is a placeholder for the actual logic.
+            'BUTTON_1': 17,  # Main Action (Describe, Read, Detect)
 
-                prompt = "Is there a human face in this image? If so, describe any identifiable features. Do not attempt to identify individuals."
+            'BUTTON_2': 27,  # Navigation (Location, Weather, Toggle Nav)
 
-                response_text = self._call_llm_vision(prompt, image_data)
+            'BUTTON_3': 22,  # Alerts/Utility (Obstacle, Buzzer, Emergency)
 
-                if "face" in response_text.lower():
+            'BUTTON_4': 2   # Voice/Accessibility (Toggle Voice, Repeat, Stop Speaking)
 
-                    response_msg = f"I see a face. Description: {response_text}"
+        }
 
-                    self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
 
-                    system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
 
-                else:
+        # Button State Tracking for Gestures
 
-                    response_msg = "I don't detect a human face."
+        self.button_states = {
 
-                    self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+            pin: {'last_press_time': 0, 'press_count': 0, 'press_start_time': 0, 'is_pressed': False, 'timer': None}
 
-                    system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+            for pin in self.button_pins.values()
 
-                system_instance.last_spoken_response = response_msg
+        }
 
-                return f"Face recognition attempt: {response_text}"
+        self.DOUBLE_TAP_WINDOW = 0.4  # seconds
 
-            except Exception as e:
+        self.LONG_PRESS_DURATION = 1.0  # seconds
 
-                logger.error(f"AIVisionSystem: Error during face recognition: {e}")
 
-                error_msg = "Sorry, I couldn't perform face recognition at this time."
 
-                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+    def initialize(self):
 
-                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+        """Configures GPIO pins and button interrupts. Called from a startup thread."""
 
-                system_instance.last_spoken_response = error_msg
+        if HAS_GPIO:
 
-                return "Face recognition failed."
+            try:
 
-        else:
+                GPIO.setmode(GPIO.BCM)
 
-            no_image_msg = "Sorry, I can't capture an image for face recognition."
+                GPIO.setup(self.led_pin, GPIO.OUT)
 
-            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+                GPIO.setup(self.buzzer_pin, GPIO.OUT)
 
-            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+                
 
-            system_instance.last_spoken_response = no_image_msg
+                if self.enable_distance_sensor:
 
-            return "No image captured for face recognition."
+                    GPIO.setup(self.trigger_pin, GPIO.OUT)
 
+                    GPIO.setup(self.echo_pin, GPIO.IN)
 
+                    logger.info(f"HardwareSystem: Ultrasonic sensor (Trig:{self.trigger_pin}, Echo:{self.echo_pin}) configured.")
 
-    def _call_llm_text(self, prompt: str) -> str:
+                else:
 
-        """
+                    logger.info("HardwareSystem: Ultrasonic sensor disabled by configuration.")
+
+
+
+                # Setup Buttons for input with pull-up resistors
+
+                for name, pin in self.button_pins.items():
+
+                    GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+                    # Add event detection for both rising and falling edges to track press start/end
+
+                    GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._button_event_callback, bouncetime=50) # Increased bouncetime for stability
+
+                    logger.info(f"HardwareSystem: Button '{name}' on GPIO {pin} configured.")
+
+
+
+                # Ensure initial state is off
+
+                GPIO.output(self.led_pin, GPIO.LOW)
+
+                GPIO.output(self.buzzer_pin, GPIO.LOW)
+
+
+
+                self.pins_setup = True
+
+                logger.info("HardwareSystem: GPIO pins initialized successfully.")
+
+            except Exception as e:
+
+                logger.error(f"HardwareSystem: GPIO setup failed: {e}. Hardware features may be limited.")
+
+        else:
+
+            logger.warning("HardwareSystem: RPi.GPIO not available. Hardware features are disabled.")
+
+
+
+    def _button_event_callback(self, channel):
+
+        """Callback for GPIO button events (both rising and falling edges)."""
+
+        current_time = time.time()
+
+        button_state = self.button_states[channel]
+
+
+
+        if GPIO.input(channel) == GPIO.LOW:  # Button is pressed (falling edge)
+
+            button_state['is_pressed'] = True
+
+            button_state['press_start_time'] = current_time
+
+            # Start a timer to check for long press
+
+            if button_state['timer']:
+
+                button_state['timer'].cancel() # Cancel any pending timer for double tap if button pressed again
+
+            button_state['timer'] = threading.Timer(self.LONG_PRESS_DURATION, self._long_press_detected, args=[channel])
+
+            button_state['timer'].start()
+
+            logger.debug(f"Button {channel} pressed.")
+
+        else:  # Button is released (rising edge)
+
+            button_state['is_pressed'] = False
+
+            if button_state['timer']:
+
+                button_state['timer'].cancel() # Cancel long press timer if released before duration
+
+
+
+            press_duration = current_time - button_state['press_start_time']
+
+            
+
+            if press_duration < self.LONG_PRESS_DURATION: # Not a long press, process as short press
+
+                logger.debug(f"Button {channel} released after short press ({press_duration:.3f}s).")
+
+                if (current_time - button_state['last_press_time']) < self.DOUBLE_TAP_WINDOW:
+
+                    button_state['press_count'] += 1
+
+                    if button_state['press_count'] == 2:
+
+                        self._dispatch_gesture(channel, 'double_tap')
+
+                        button_state['press_count'] = 0 # Reset for next gesture
+
+                        button_state['last_press_time'] = 0
+
+                else:
+
+                    button_state['press_count'] = 1
+
+                    button_state['last_press_time'] = current_time
+
+                    # Start a timer to confirm single press if no second press occurs
+
+                    threading.Timer(self.DOUBLE_TAP_WINDOW, self._check_single_press, args=[channel]).start()
+
+            # If it was a long press, _long_press_detected would have handled it.
+
+
+
+    def _check_single_press(self, channel):
+
+        """Checks if a single press was confirmed after the double-tap window."""
+
+        button_state = self.button_states[channel]
+
+        current_time = time.time()
+
+        if (button_state['press_count'] == 1 and 
+
+            (current_time - button_state['last_press_time']) >= self.DOUBLE_TAP_WINDOW):
+
+            self._dispatch_gesture(channel, 'single_press')
+
+            button_state['press_count'] = 0 # Reset
+
+            button_state['last_press_time'] = 0
+
+
+
+    def _long_press_detected(self, channel):
+
+        """Called when a long press is detected."""
+
+        button_state = self.button_states[channel]
+
+        if button_state['is_pressed']: # Ensure button is still held down
+
+            logger.debug(f"Button {channel} long press detected.")
+
+            self._dispatch_gesture(channel, 'long_press')
+
+            button_state['press_count'] = 0 # Reset counts after a long press
+
+            button_state['last_press_time'] = 0
+
+            button_state['is_pressed'] = False # Simulate release for state machine consistency
+
+
+
+    def _dispatch_gesture(self, channel, gesture_type):
+
+        """Dispatches the detected gesture to the system instance."""
+
+        button_name = next(name for name, pin in self.button_pins.items() if pin == channel)
+
+        logger.info(f"Gesture detected: {button_name} - {gesture_type}")
+
+        # Emit to SocketIO for web interface feedback (optional, but good for debugging/status)
+
+        if socketio:
+
+            socketio.emit('button_gesture', {'button': button_name, 'gesture': gesture_type})
+
+        
+
+        # Pass control to the main system handler
+
+        system_instance.handle_button_gesture(button_name, gesture_type)
+
+
+
+    def set_status_led(self, on: bool):
+
+        """Turns the status LED on or off."""
+
+        if self.pins_setup:
+
+            GPIO.output(self.led_pin, GPIO.HIGH if on else GPIO.LOW)
+
+            self.status_led_on = on
+
+            logger.info(f"HardwareSystem: Status LED {'ON' if on else 'OFF'}")
+
+        else:
+
+            logger.warning("HardwareSystem: Cannot control LED, GPIO not set up.")
+
+
+
+    def toggle_status_led(self):
+
+        """Toggles the status LED on/off."""
+
+        self.set_status_led(not self.status_led_on)
+
+
+
+    def trigger_buzzer(self, duration: float = 0.1):
+
+        """Triggers the buzzer for a specified duration."""
+
+        if self.pins_setup:
+
+            try:
+
+                GPIO.output(self.buzzer_pin, GPIO.HIGH)
+
+                time.sleep(duration)
+
+                GPIO.output(self.buzzer_pin, GPIO.LOW)
+
+                logger.info(f"HardwareSystem: Buzzer triggered for {duration}s.")
+
+            except Exception as e:
+
+                logger.error(f"HardwareSystem: Error triggering buzzer: {e}")
+
+        else:
+
+            logger.warning("HardwareSystem: Cannot trigger buzzer, GPIO not set up.")
+
+
+
+    def get_distance(self) -> float:
+
+        """Gets distance reading from ultrasonic sensor (HC-SR04). Returns distance in cm."""
+
+        if not self.pins_setup or not self.enable_distance_sensor:
+
+            return 50.0  # Mock distance if hardware not available/enabled
+
+
+
+        try:
+
+            # Ensure trigger is low before pulse
+
+            GPIO.output(self.trigger_pin, False)
+
+            time.sleep(0.000002)
+
+
+
+            # Send 10us pulse to trigger
+
+            GPIO.output(self.trigger_pin, True)
+
+            time.sleep(0.00001)
+
+            GPIO.output(self.trigger_pin, False)
+
+
+
+            pulse_start_time = time.time()
+
+            pulse_end_time = time.time()
+
+
+
+            timeout_start = time.time()
+
+            # Wait for echo to go HIGH
+
+            while GPIO.input(self.echo_pin) == 0:
+
+                pulse_start_time = time.time()
+
+                if time.time() - timeout_start > 0.02: # 20ms timeout for pulse start
+
+                    logger.warning("HardwareSystem: Ultrasonic: Echo pulse start timeout.")
+
+                    return -1.0
+
+            
+
+            timeout_end = time.time()
+
+            # Wait for echo to go LOW
+
+            while GPIO.input(self.echo_pin) == 1:
+
+                pulse_end_time = time.time()
+
+                if time.time() - timeout_end > 0.04: # 40ms timeout for pulse end (total 60ms)
+
+                    logger.warning("HardwareSystem: Ultrasonic: Echo pulse end timeout.")
+
+                    return -1.0
+
+
+
+            pulse_duration = pulse_end_time - pulse_start_time
+
+            distance = pulse_duration * 17150  # Speed of sound (34300 cm/s / 2)
+
+            distance = round(distance, 2)
+
+
+
+            # Filter out invalid readings (e.g., too close, too far, or errors)
+
+            if 2 <= distance <= 400:
+
+                return distance
+
+            else:
+
+                logger.warning(f"HardwareSystem: Ultrasonic: Invalid distance reading: {distance} cm. Returning -1.0")
+
+                return -1.0
+
+        except Exception as e:
+
+            logger.error(f"HardwareSystem: Error getting distance: {e}")
+
+            return -1.0
+
+
+
+    def cleanup(self):
+
+        """Cleans up GPIO settings."""
+
+        if self.pins_setup and HAS_GPIO:
+
+            GPIO.cleanup()
+
+            logger.info("HardwareSystem: GPIO cleanup complete.")
+
+
+
+# --- Scene Change Detection ---
+
+def frame_thumbnail(array: np.ndarray, width: int = 32, height: int = 24) -> np.ndarray:
+
+    """Block-averaged grayscale thumbnail (float32) used for cheap change detection."""
+
+    # Subsample to ~4x the target first so the averaging touches few pixels
+
+    step_y = max(1, array.shape[0] // (height * 4))
+
+    step_x = max(1, array.shape[1] // (width * 4))
+
+    small = array[::step_y, ::step_x]
+
+    gray = small.astype(np.float32) if small.ndim == 2 else small[:, :, :3].mean(axis=2, dtype=np.float32)
+
+    block_h, block_w = gray.shape[0] // height, gray.shape[1] // width
+
+    if block_h == 0 or block_w == 0:
+
+        return gray
+
+    gray = gray[:block_h * height, :block_w * width]
+
+    return gray.reshape(height, block_h, width, block_w).mean(axis=(1, 3))
+
+
+
+def change_score(thumbnail_a: Optional[np.ndarray], thumbnail_b: Optional[np.ndarray]) -> float:
+
+    """Mean absolute difference of two thumbnails, 0.0 (identical) to 1.0. Missing/mismatched input counts as a full change."""
+
+    if thumbnail_a is None or thumbnail_b is None or thumbnail_a.shape != thumbnail_b.shape:
+
+        return 1.0
+
+    return float(np.mean(np.abs(thumbnail_a - thumbnail_b))) / 255.0
+
+
+
+def view_change_score(thumbnail_a: Optional[np.ndarray], thumbnail_b: Optional[np.ndarray]) -> float:
+
+    """
+
+    change_score measured against the views' contrast (four standard deviations of the busier thumbnail,
+
+    about the full 0-255 span for a well-lit view), so two different dim, low-contrast rooms don't pass
+
+    as the same view. 0.0 (identical) to 1.0.
+
+    """
+
+    if thumbnail_a is None or thumbnail_b is None or thumbnail_a.shape != thumbnail_b.shape:
+
+        return 1.0
+
+    contrast = max(float(thumbnail_a.std()), float(thumbnail_b.std()), 8.0) # Floor keeps flat dark views from amplifying noise
+
+    return min(1.0, float(np.mean(np.abs(thumbnail_a - thumbnail_b))) / (4.0 * contrast))
+
+
+
+def perceptual_hash(thumbnail: np.ndarray) -> int:
+
+    """64-bit difference hash (dHash) of a grayscale thumbnail; near-identical views differ in few bits."""
+
+    if HAS_OPENCV:
+
+        small = cv2.resize(thumbnail, (9, 8), interpolation=cv2.INTER_AREA)
+
+    else:
+
+        rows = np.linspace(0, thumbnail.shape[0] - 1, 8).astype(int)
+
+        cols = np.linspace(0, thumbnail.shape[1] - 1, 9).astype(int)
+
+        small = thumbnail[rows][:, cols]
+
+    bits = (small[:, 1:] > small[:, :-1] + 2.0).flatten() # Margin keeps flat regions from flipping on sensor noise
+
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+
+def sharpness_score(array: np.ndarray) -> float:
+
+    """
+
+    Variance of the Laplacian (higher = sharper), computed with numpy slicing on a
+
+    half-resolution single-channel copy. Motion blur flattens edges and lowers the score.
+
+    """
+
+    channel = array[::2, ::2] if array.ndim == 2 else array[::2, ::2, 1] # Green carries most luminance
+
+    gray = channel.astype(np.float32)
+
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+
+        return 0.0
+
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]) - 4.0 * gray[1:-1, 1:-1]
+
+    return float(laplacian.var())
+
+
+
+# --- Camera Frame Ring Buffer (single producer, many consumers) ---
+
+class CameraFrame:
+
+    """
+
+    A captured camera frame tagged with its ring frame id and capture timestamp.
+
+    With convert, the raw capture (e.g. YUV420) is converted on first access to array, on the reader's
+
+    thread, so frames no consumer looks at are never converted.
+
+    """
+
+    def __init__(self, frame_id: int, timestamp: float, array: np.ndarray,
+
+                 convert: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+
+        self.frame_id = frame_id
+
+        self.timestamp = timestamp
+
+        self._array = array
+
+        self._convert = convert
+
+        self._convert_lock = threading.Lock() if convert else None
+
+        self._thumbnail: Optional[np.ndarray] = None
+
+        self._sharpness: Optional[float] = None
+
+
+
+    @property
+
+    def array(self) -> np.ndarray:
+
+        """The frame image, converted from the raw capture once."""
+
+        if self._convert_lock is not None:
+
+            with self._convert_lock:
+
+                if self._convert is not None:
+
+                    self._array, self._convert = self._convert(self._array), None
+
+        return self._array
+
+
+
+    @property
+
+    def thumbnail(self) -> np.ndarray:
+
+        """Grayscale 32x24 thumbnail, computed once."""
+
+        if self._thumbnail is None:
+
+            self._thumbnail = frame_thumbnail(self.array)
+
+        return self._thumbnail
+
+
+
+    @property
+
+    def sharpness(self) -> float:
+
+        """Laplacian-variance sharpness score, computed once."""
+
+        if self._sharpness is None:
+
+            self._sharpness = sharpness_score(self.array)
+
+        return self._sharpness
+
+
+
+class FrameRingBuffer:
+
+    """Fixed-size ring of timestamped frames written by one capture thread and read by every consumer."""
+
+    def __init__(self, capacity: int = 4):
+
+        self.capacity = max(1, capacity)
+
+        self._frames: List[Optional[CameraFrame]] = [None] * self.capacity
+
+        self._next_frame_id = 1 # Monotonically increasing, never reused
+
+        self._condition = threading.Condition()
+
+
+
+    def push(self, array: np.ndarray, convert: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> CameraFrame:
+
+        """Stores a new frame, overwriting the oldest slot, and wakes up waiting consumers."""
+
+        frame = CameraFrame(0, time.time(), array, convert)
+
+        with self._condition:
+
+            frame.frame_id = self._next_frame_id
+
+            self._frames[frame.frame_id % self.capacity] = frame
+
+            self._next_frame_id += 1
+
+            self._condition.notify_all()
+
+        return frame
+
+
+
+    def _latest_locked(self) -> Optional[CameraFrame]:
+
+        if self._next_frame_id == 1:
+
+            return None
+
+        return self._frames[(self._next_frame_id - 1) % self.capacity]
+
+
+
+    def latest(self) -> Optional[CameraFrame]:
+
+        """Returns the most recent frame without waiting (None if nothing has been captured yet)."""
+
+        with self._condition:
+
+            return self._latest_locked()
+
+
+
+    def wait_for_frame(self, after_id: int = 0, newer_than: float = 0.0, timeout: float = 2.0) -> Optional[CameraFrame]:
+
+        """
+
+        Blocks until the freshest frame has an id above after_id and was captured after newer_than.
+
+        Returns None if no such frame arrives within timeout seconds.
+
+        """
+
+        deadline = time.time() + timeout
+
+        with self._condition:
+
+            while True:
+
+                frame = self._latest_locked()
+
+                if frame is not None and frame.frame_id > after_id and frame.timestamp > newer_than:
+
+                    return frame
+
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+
+                    return None
+
+                self._condition.wait(remaining)
+
+
+
+    def recent(self, count: int) -> List[CameraFrame]:
+
+        """Returns up to count buffered frames, newest first."""
+
+        with self._condition:
+
+            frames = []
+
+            frame_id = self._next_frame_id - 1
+
+            while frame_id > 0 and len(frames) < min(count, self.capacity):
+
+                frame = self._frames[frame_id % self.capacity]
+
+                if frame is None or frame.frame_id != frame_id:
+
+                    break
+
+                frames.append(frame)
+
+                frame_id -= 1
+
+            return frames
+
+
+
+class EncodedFrame:
+
+    """
+
+    A JPEG-encoded frame plus its capture metadata.
+
+    The encoder output is exposed without copying; base64 and data-URL forms are built lazily, once.
+
+    """
+
+    def __init__(self, buffer, frame_id: int, timestamp: float, width: int, height: int):
+
+        self._buffer = buffer # np.ndarray from cv2.imencode, or bytes
+
+        self.frame_id = frame_id
+
+        self.timestamp = timestamp
+
+        self.width = width
+
+        self.height = height
+
+        self._jpeg_bytes: Optional[bytes] = None
+
+        self._b64: Optional[str] = None
+
+        self._multipart_chunk: Optional[bytes] = None
+
+        self.thumbnail: Optional[np.ndarray] = None # Thumbnail of the source frame, for change checks
+
+        self.source_frame_id = frame_id # Frame these bytes were encoded from (kept by keep-alive copies)
+
+
+
+    def retagged(self, frame_id: int, timestamp: float) -> 'EncodedFrame':
+
+        """Returns a keep-alive copy for a newer, unchanged frame that shares this frame's bytes."""
+
+        alias = EncodedFrame(self._buffer, frame_id, timestamp, self.width, self.height)
+
+        alias._jpeg_bytes, alias._b64 = self._jpeg_bytes, self._b64
+
+        alias._multipart_chunk = self.multipart_chunk
+
+        alias.thumbnail = self.thumbnail
+
+        alias.source_frame_id = self.source_frame_id
+
+        return alias
+
+
+
+    @property
+
+    def view(self) -> memoryview:
+
+        """Zero-copy view of the encoded JPEG."""
+
+        return memoryview(self._buffer).cast('B')
+
+
+
+    @property
+
+    def size(self) -> int:
+
+        return self.view.nbytes
+
+
+
+    @property
+
+    def jpeg(self) -> bytes:
+
+        """The encoded JPEG as bytes (copied at most once)."""
+
+        if self._jpeg_bytes is None:
+
+            self._jpeg_bytes = self._buffer if isinstance(self._buffer, bytes) else self.view.tobytes()
+
+        return self._jpeg_bytes
+
+
+
+    @property
+
+    def b64(self) -> str:
+
+        """Base64 payload for APIs that need inline data (e.g. Gemini inlineData). Computed once."""
+
+        if self._b64 is None:
+
+            self._b64 = base64.b64encode(self.view).decode('ascii')
+
+        return self._b64
+
+
+
+    @property
+
+    def data_url(self) -> str:
+
+        return f"data:image/jpeg;base64,{self.b64}"
+
+
+
+    @property
+
+    def multipart_chunk(self) -> bytes:
+
+        """The frame wrapped as one part of a multipart/x-mixed-replace stream. Built once."""
+
+        if self._multipart_chunk is None:
+
+            self._multipart_chunk = b''.join((b'--frame\r\nContent-Type: image/jpeg\r\n\r\n', self.view, b'\r\n'))
+
+        return self._multipart_chunk
+
+
+
+# --- JPEG Encoder Backends ---
+
+class JPEGEncoderBackend:
+
+    """Base class for software JPEG encoders. encode() returns a bytes-like JPEG buffer or None."""
+
+    name = "base"
+
+
+
+    def encode(self, image: np.ndarray, quality: int):
+
+        raise NotImplementedError
+
+
+
+class OpenCVJPEGEncoder(JPEGEncoderBackend):
+
+    """JPEG encoding with cv2.imencode (libjpeg via OpenCV)."""
+
+    name = "opencv"
+
+
+
+    def encode(self, image: np.ndarray, quality: int):
+
+        ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+
+        if not ret or buffer.size == 0:
+
+            return None
+
+        return buffer
+
+
+
+class SimpleJPEGEncoder(JPEGEncoderBackend):
+
+    """JPEG encoding with simplejpeg (libjpeg-turbo, no intermediate copies)."""
+
+    name = "simplejpeg"
+
+
+
+    def encode(self, image: np.ndarray, quality: int):
+
+        if image.ndim == 2:
+
+            return simplejpeg.encode_jpeg(np.ascontiguousarray(image[:, :, np.newaxis]), quality=quality, colorspace='GRAY')
+
+        # 4:2:0 chroma subsampling matches OpenCV's default output size
+
+        return simplejpeg.encode_jpeg(np.ascontiguousarray(image), quality=quality, colorspace='BGR', colorsubsampling='420')
+
+
+
+JPEG_ENCODER_BACKENDS = ('auto', 'opencv', 'simplejpeg', 'picamera2')
+
+
+
+def create_jpeg_encoder(backend: str = 'auto') -> Optional[JPEGEncoderBackend]:
+
+    """
+
+    Returns the software encoder for a backend name.
+
+    'picamera2' streams through the camera's MJPEG encoder, so its stills use the best software encoder.
+
+    """
+
+    if backend in ('auto', 'picamera2'):
+
+        backend = 'simplejpeg' if HAS_SIMPLEJPEG else 'opencv'
+
+    if backend == 'simplejpeg':
+
+        if HAS_SIMPLEJPEG:
+
+            return SimpleJPEGEncoder()
+
+        logger.warning("simplejpeg requested but not installed. Falling back to OpenCV encoder.")
+
+    if HAS_OPENCV:
+
+        return OpenCVJPEGEncoder()
+
+    logger.warning("No JPEG encoder available (install OpenCV or simplejpeg).")
+
+    return None
+
+
+
+class BroadcasterOutput(io.BufferedIOBase):
+
+    """File-like sink for Picamera2's MJPEGEncoder: every written JPEG is published to the broadcaster."""
+
+    def __init__(self, broadcaster, width: int, height: int):
+
+        self.broadcaster = broadcaster
+
+        self.width = width
+
+        self.height = height
+
+        self.frames_written = 0
+
+
+
+    def write(self, buf) -> int:
+
+        # Ids count the encoder's own frames: a separate sequence from the ring's (see MJPEGBroadcaster.subscribe)
+
+        self.frames_written += 1
+
+        self.broadcaster.publish(EncodedFrame(bytes(buf), self.frames_written, time.time(), self.width, self.height))
+
+        return len(buf)
+
+
+
+def benchmark_jpeg_encoders(ai_vision, frame_count: int = 100, quality: int = 90) -> Dict[str, Dict]:
+
+    """
+
+    Times every available software encoder on the same preview frame, and measures the
+
+    hardware MJPEG path (if it is streaming) by process CPU time per delivered frame.
+
+    """
+
+    frame = ai_vision.frame_ring.wait_for_frame(timeout=3.0) if ai_vision.enable_camera else None
+
+    if frame is not None:
+
+        image = ai_vision._to_bgr(frame.array)
+
+    else:
+
+        # Synthetic stand-in with smooth gradients plus sensor-like noise
+
+        height, width = ai_vision.preview_size[1], ai_vision.preview_size[0]
+
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+
+        noise = np.random.normal(0, 8, (height, width, 3)).astype(np.float32)
+
+        image = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+
+
+    results = {}
+
+    encoders = []
+
+    if HAS_OPENCV:
+
+        encoders.append(OpenCVJPEGEncoder())
+
+    if HAS_SIMPLEJPEG:
+
+        encoders.append(SimpleJPEGEncoder())
+
+    for encoder in encoders:
+
+        encoder.encode(image, quality) # Warm-up
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        total_bytes = 0
+
+        for _ in range(frame_count):
+
+            total_bytes += memoryview(encoder.encode(image, quality)).nbytes
+
+        wall_ms = (time.perf_counter() - wall_start) * 1000 / frame_count
+
+        cpu_ms = (time.process_time() - cpu_start) * 1000 / frame_count
+
+        results[encoder.name] = {'ms_per_frame': round(wall_ms, 2), 'cpu_ms_per_frame': round(cpu_ms, 2),
+
+                                 'avg_bytes': total_bytes // frame_count}
+
+
+
+    if ai_vision.broadcaster.hardware_encoding:
+
+        frames_before, cpu_start = ai_vision.broadcaster.frames_encoded, time.process_time()
+
+        time.sleep(5)
+
+        delivered = ai_vision.broadcaster.frames_encoded - frames_before
+
+        if delivered:
+
+            cpu_ms = (time.process_time() - cpu_start) * 1000 / delivered
+
+            results['picamera2'] = {'fps': round(delivered / 5, 1), 'cpu_ms_per_frame': round(cpu_ms, 2),
+
+                                    'note': 'process CPU including capture thread'}
+
+
+
+    for name, stats in results.items():
+
+        logger.info(f"JPEG encoder benchmark [{name}] {image.shape[1]}x{image.shape[0]}: {stats}")
+
+    return results
+
+
+
+# --- MJPEG Broadcaster (encode once, fan out to every /video_feed viewer) ---
+
+class AdaptiveStreamPacer:
+
+    """Per-viewer controller that matches frame rate and JPEG quality to the viewer's measured throughput."""
+
+    QUALITY_LEVELS = (30, 45, 60, 75, 90) # Discrete so viewers on similar links share encodes
+
+    ADJUST_INTERVAL = 2.0 # Seconds between quality changes (hysteresis)
+
+
+
+    def __init__(self, max_fps: float = 30.0, max_quality: int = 90):
+
+        self.max_fps = max_fps
+
+        self.min_fps = min(5.0, max_fps) # Below this, trade quality for smoothness
+
+        self.levels = [q for q in self.QUALITY_LEVELS if q <= max_quality] or [max_quality]
+
+        self.level_index = len(self.levels) - 1
+
+        self.target_fps = max_fps
+
+        self.throughput: Optional[float] = None # EWMA of bytes/second actually delivered
+
+        self.next_send_time = 0.0
+
+        self.last_adjust_time = time.time()
+
+        self.frames_sent = 0
+
+        self.bytes_sent = 0
+
+
+
+    @property
+
+    def quality(self) -> int:
+
+        return self.levels[self.level_index]
+
+
+
+    def wait_until_due(self):
+
+        """Sleeps until the next frame is due at the current target frame rate."""
+
+        delay = self.next_send_time - time.time()
+
+        if delay > 0:
+
+            time.sleep(delay)
+
+
+
+    def record_send(self, size: int, send_seconds: float):
+
+        """Updates throughput after a frame was written to the client and re-plans rate and quality."""
+
+        now = time.time()
+
+        self.frames_sent += 1
+
+        self.bytes_sent += size
+
+        rate = size / max(send_seconds, 0.001) # Writes block once the socket buffer is full
+
+        self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+
+
+
+        sustainable_fps = 0.8 * self.throughput / max(size, 1) # Keep 20% headroom so latency can't build up
+
+        self.target_fps = max(0.5, min(self.max_fps, sustainable_fps))
+
+        self.next_send_time = now + 1.0 / self.target_fps
+
+
+
+        if now - self.last_adjust_time >= self.ADJUST_INTERVAL:
+
+            if sustainable_fps < self.min_fps and self.level_index > 0:
+
+                self.level_index -= 1
+
+                self.last_adjust_time = now
+
+            elif sustainable_fps > 1.5 * self.max_fps and self.level_index < len(self.levels) - 1:
+
+                self.level_index += 1
+
+                self.last_adjust_time = now
+
+
+
+class MJPEGBroadcaster:
+
+    """
+
+    Shares encoded JPEG frames between every /video_feed viewer.
+
+    Each (frame, quality) pair is encoded at most once, on demand, by the first viewer that needs it;
+
+    every other viewer receives the same EncodedFrame. Frames no viewer asks for are never encoded.
+
+    """
+
+    def __init__(self, ai_vision_system):
+
+        self.ai_vision = ai_vision_system
+
+        self._condition = threading.Condition() # Signals frames published by the hardware encoder
+
+        self._hardware_latest: Optional[EncodedFrame] = None
+
+        # Stream variants are keyed by (width, quality); width 0 means the native preview size
+
+        self._cache: Dict[Tuple[int, int], EncodedFrame] = {} # variant -> newest encode of that variant
+
+        self._scaled: Dict[int, CameraFrame] = {} # width -> newest downscaled source frame
+
+        self._variant_last_used: Dict[Tuple[int, int], float] = {}
+
+        self._cache_lock = threading.Lock()
+
+        self._encode_locks: Dict[Tuple[int, int], threading.Lock] = {}
+
+        self._scale_locks: Dict[int, threading.Lock] = {}
+
+        self.subscriber_count = 0
+
+        self.frames_encoded = 0
+
+        self.frames_scaled = 0
+
+        self.is_running = False
+
+        self.hardware_encoding = False # True when Picamera2's MJPEGEncoder publishes the default quality
+
+        self.default_max_fps = 30.0
+
+        self.variant_idle_timeout = 30.0 # Seconds before an unrequested variant is evicted
+
+        # Scene-change gating: an unchanged scene reuses the previous encode instead of encoding again
+
+        self.static_scene_threshold = 0.01 # Change score below which a frame counts as unchanged
+
+        self.static_reencode_interval = 5.0 # Re-encode a static scene at least this often (seconds)
+
+        self.keepalive_interval = 1.0 # Resend an unchanged frame to a viewer at least this often
+
+        self.encodes_skipped = 0
+
+
+
+    def start(self):
+
+        """Starts accepting viewers."""
+
+        self.is_running = True
+
+        logger.info("MJPEGBroadcaster: Started.")
+
+
+
+    def use_hardware_encoder(self):
+
+        """Switches the default-quality stream to frames published by the camera's MJPEG encoder."""
+
+        self.hardware_encoding = True
+
+        logger.info("MJPEGBroadcaster: Using camera MJPEG encoder output.")
+
+
+
+    def stop(self):
+
+        """Stops the broadcaster and releases any waiting subscribers."""
+
+        with self._condition:
+
+            self.is_running = False
+
+            self._condition.notify_all()
+
+
+
+    def publish(self, encoded: EncodedFrame):
+
+        """Makes a hardware-encoded frame the current default-quality frame."""
+
+        encoded.multipart_chunk # Build the stream part here, not on a viewer's thread
+
+        with self._condition:
+
+            self._hardware_latest = encoded
+
+            self.frames_encoded += 1
+
+            self._condition.notify_all()
+
+
+
+    def normalize_width(self, width: Optional[int]) -> int:
+
+        """Maps a requested width to a shared variant width (multiple of 16), or 0 for native size."""
+
+        native_width = self.ai_vision.preview_size[0] if self.ai_vision.dual_stream else self.ai_vision.still_size[0]
+
+        if not width or width >= native_width:
+
+            return 0
+
+        return max(80, (width // 16) * 16)
+
+
+
+    def is_hardware_variant(self, quality: int, width: int) -> bool:
+
+        """True if this variant is the camera encoder's output, whose frame ids are the encoder's own."""
+
+        return self.hardware_encoding and quality == self.ai_vision.stream_quality and width == 0
+
+
+
+    def wait_for_frame(self, after_id: int = 0, quality: Optional[int] = None, timeout: float = 1.0,
+
+                       width: int = 0) -> Optional[EncodedFrame]:
+
+        """
+
+        Returns the newest frame with an id above after_id, scaled to width and encoded at quality.
+
+        Each variant of a frame is scaled and encoded at most once and shared by all its viewers.
+
+        """
+
+        quality = quality or self.ai_vision.stream_quality
+
+        if self.is_hardware_variant(quality, width):
+
+            with self._condition:
+
+                self._condition.wait_for(
+
+                    lambda: (self._hardware_latest is not None and self._hardware_latest.frame_id > after_id)
+
+                    or not self.is_running, timeout=timeout)
+
+                latest = self._hardware_latest
+
+            return latest if latest is not None and latest.frame_id > after_id else None
+
+
+
+        frame = self.ai_vision.frame_ring.wait_for_frame(after_id=after_id, timeout=timeout)
+
+        if frame is None:
+
+            return None
+
+        return self._encoded(frame, quality, width)
+
+
+
+    def latest_frame(self, quality: Optional[int] = None, width: int = 0) -> Optional[EncodedFrame]:
+
+        """
+
+        Returns the shared encode of the newest captured frame without waiting or touching the camera.
+
+        Reuses the variant cache, so polling clients cost nothing extra while a stream viewer is active.
+
+        """
+
+        quality = quality or self.ai_vision.stream_quality
+
+        if self.is_hardware_variant(quality, width):
+
+            with self._condition:
+
+                return self._hardware_latest
+
+        frame = self.ai_vision.frame_ring.latest()
+
+        if frame is None:
+
+            return None
+
+        return self._encoded(frame, quality, width)
+
+
+
+    def _scaled_frame(self, frame: CameraFrame, width: int) -> CameraFrame:
+
+        """Returns frame downscaled to width, shared across every quality of that width."""
+
+        if width == 0:
+
+            return frame
+
+        with self._cache_lock:
+
+            scale_lock = self._scale_locks.setdefault(width, threading.Lock())
+
+        with scale_lock:
+
+            cached = self._scaled.get(width)
+
+            if cached is not None and cached.frame_id >= frame.frame_id:
+
+                return cached
+
+            source_height, source_width = frame.array.shape[:2]
+
+            height = max(1, round(source_height * width / source_width))
+
+            if HAS_OPENCV:
+
+                array = cv2.resize(frame.array, (width, height), interpolation=cv2.INTER_AREA)
+
+            else:
+
+                step = max(1, round(source_width / width))
+
+                array = np.ascontiguousarray(frame.array[::step, ::step])
+
+            scaled = CameraFrame(frame.frame_id, frame.timestamp, array)
+
+            self._scaled[width] = scaled
+
+            self.frames_scaled += 1
+
+            return scaled
+
+
+
+    def _encoded(self, frame: CameraFrame, quality: int, width: int = 0) -> Optional[EncodedFrame]:
+
+        """Returns the shared encode of a frame variant, scaling and encoding it only if no viewer has yet."""
+
+        variant = (width, quality)
+
+        with self._cache_lock:
+
+            encode_lock = self._encode_locks.setdefault(variant, threading.Lock())
+
+            self._variant_last_used[variant] = time.time()
+
+        with encode_lock:
+
+            cached = self._cache.get(variant)
+
+            if cached is not None and cached.frame_id >= frame.frame_id:
+
+                return cached
+
+            if (cached is not None and frame.timestamp - cached.timestamp < self.static_reencode_interval
+
+                    and change_score(frame.thumbnail, cached.thumbnail) < self.static_scene_threshold):
+
+                # Scene hasn't changed since the cached encode: reuse its bytes
+
+                encoded = cached.retagged(frame.frame_id, cached.timestamp)
+
+                self._cache[variant] = encoded
+
+                self.encodes_skipped += 1
+
+                return encoded
+
+            encoded = self.ai_vision._encode_frame(self._scaled_frame(frame, width), quality=quality)
+
+            if encoded is None:
+
+                return None
+
+            encoded.multipart_chunk
+
+            encoded.thumbnail = frame.thumbnail
+
+            self._cache[variant] = encoded
+
+            self.frames_encoded += 1
+
+        self._evict_idle_variants()
+
+        return encoded
+
+
+
+    def _evict_idle_variants(self):
+
+        """Drops cached encodes and scaled frames of variants nobody has requested recently."""
+
+        cutoff = time.time() - self.variant_idle_timeout
+
+        with self._cache_lock:
+
+            idle = [variant for variant, last_used in self._variant_last_used.items() if last_used < cutoff]
+
+            for variant in idle:
+
+                del self._variant_last_used[variant]
+
+                self._cache.pop(variant, None)
+
+                self._encode_locks.pop(variant, None)
+
+            active_widths = {width for width, _ in self._variant_last_used}
+
+            for width in list(self._scaled):
+
+                if width not in active_widths:
+
+                    del self._scaled[width]
+
+                    self._scale_locks.pop(width, None)
+
+        if idle:
+
+            logger.info(f"MJPEGBroadcaster: Evicted idle stream variants {idle}.")
+
+
+
+    def subscribe(self, max_fps: Optional[float] = None, max_quality: Optional[int] = None, width: Optional[int] = None):
+
+        """
+
+        Generator yielding multipart JPEG parts for one viewer.
+
+        The viewer's own send throughput sets its frame rate and quality (capped by max_fps/max_quality),
+
+        and it always jumps to the newest frame, so a slow client skips frames instead of building latency.
+
+        width selects a downscaled variant shared with every other viewer of that width.
+
+        """
+
+        width = self.normalize_width(width)
+
+        pacer = AdaptiveStreamPacer(max_fps=max_fps or self.default_max_fps,
+
+                                    max_quality=max_quality or self.ai_vision.stream_quality)
+
+        with self._condition:
+
+            self.subscriber_count += 1
+
+        logger.info(f"MJPEGBroadcaster: Viewer subscribed ({self.subscriber_count} active, width {width or 'native'}, "
+
+                    f"max {pacer.max_fps} fps, quality <= {pacer.levels[-1]}).")
+
+        try:
+
+            last_frame_id = 0
+
+            last_from_hardware = False
+
+            last_chunk: Optional[bytes] = None
+
+            last_send_time = 0.0
+
+            while self.is_running:
+
+                pacer.wait_until_due()
+
+                from_hardware = self.is_hardware_variant(pacer.quality, width)
+
+                if from_hardware != last_from_hardware:
+
+                    last_frame_id, last_from_hardware = 0, from_hardware # Encoder and ring ids aren't comparable
+
+                encoded = self.wait_for_frame(after_id=last_frame_id, quality=pacer.quality, width=width)
+
+                if encoded is None:
+
+                    continue
+
+                last_frame_id = encoded.frame_id
+
+                chunk = encoded.multipart_chunk
+
+                if chunk is last_chunk and time.time() - last_send_time < self.keepalive_interval:
+
+                    continue # Unchanged scene already on this viewer's screen
+
+                last_chunk, last_send_time = chunk, time.time()
+
+                send_start = time.perf_counter()
+
+                yield chunk # Resumes once the server has handed the chunk to the socket
+
+                pacer.record_send(len(chunk), time.perf_counter() - send_start)
+
+        finally:
+
+            with self._condition:
+
+                self.subscriber_count -= 1
+
+            logger.info(f"MJPEGBroadcaster: Viewer unsubscribed ({self.subscriber_count} active). "
+
+                        f"Sent {pacer.frames_sent} frames, {pacer.bytes_sent // 1024} KiB, last {pacer.target_fps:.1f} fps at quality {pacer.quality}.")
+
+
+
+# --- Capture Profiles ---
+
+class CaptureProfile:
+
+    """
+
+    How a still is prepared for one kind of cloud vision upload.
+
+    crop is (left, top, right, bottom) as fractions of the frame; max_width downscales (never upscales).
+
+    burst > 1 captures that many consecutive stills and keeps only the sharpest.
+
+    document=True flattens and deskews the page in view before upload.
+
+    """
+
+    def __init__(self, name: str, max_width: Optional[int] = None, quality: int = 90,
+
+                 grayscale: bool = False, crop: Optional[Tuple[float, float, float, float]] = None,
+
+                 burst: int = 1, document: bool = False):
+
+        self.name = name
+
+        self.max_width = max_width
+
+        self.quality = quality
+
+        self.grayscale = grayscale
+
+        self.crop = crop
+
+        self.burst = burst
+
+        self.document = document # Straighten the page (DocumentPreprocessor) before upload
+
+
+
+    def apply(self, array: np.ndarray) -> np.ndarray:
+
+        """Returns the cropped, color-converted and downscaled image for this profile."""
+
+        if self.crop:
+
+            height, width = array.shape[:2]
+
+            left, top, right, bottom = self.crop
+
+            array = array[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+
+        if self.grayscale and array.ndim == 3:
+
+            code = cv2.COLOR_BGRA2GRAY if array.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+
+            array = cv2.cvtColor(array, code)
+
+        height, width = array.shape[:2]
+
+        if self.max_width and width > self.max_width:
+
+            new_height = max(1, round(height * self.max_width / width))
+
+            array = cv2.resize(array, (self.max_width, new_height), interpolation=cv2.INTER_AREA)
+
+        return np.ascontiguousarray(array)
+
+
+
+# Per-command upload profiles. Scene questions don't need full resolution; text reading does.
+
+CAPTURE_PROFILES: Dict[str, CaptureProfile] = {
+
+    'scene': CaptureProfile('scene', max_width=640, quality=70),
+
+    'objects': CaptureProfile('objects', max_width=800, quality=75, burst=2),
+
+    'face': CaptureProfile('face', max_width=480, quality=80, crop=(0.125, 0.0, 0.875, 1.0), burst=2), # Centre square
+
+    'ocr': CaptureProfile('ocr', quality=92, grayscale=True, burst=4, document=True), # Full still resolution; blur ruins OCR
+
+    'analysis': CaptureProfile('analysis', quality=88, burst=3), # Full color still: must serve scene, objects and text
+
+}
+
+
+
+# --- Local Object Detection (SSD MobileNet, COCO) ---
+
+ML_ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'ml')
+
+DETECTOR_MODEL_PATH = os.path.join(ML_ASSETS_DIR, 'ssd_mobilenet.tflite')
+
+# The model's 90-class COCO labelmap: line 0 is the background class, unused ids are '???'
+
+DETECTOR_LABELS_PATH = os.path.join(ML_ASSETS_DIR, 'ssd_mobilenet.txt')
+
+
+
+def load_detector_labels(path: str = DETECTOR_LABELS_PATH) -> List[str]:
+
+    """Reads the labelmap, keeping line positions (blank lines included) so ids stay aligned."""
+
+    with open(path, 'r') as f:
+
+        return [line.strip() for line in f.read().splitlines()]
+
+
+
+class Detection:
+
+    """One detected object: COCO label, confidence and box (x0, y0, x1, y1) as fractions of the frame."""
+
+    def __init__(self, label: str, confidence: float, box: Tuple[float, float, float, float]):
+
+        self.label = label
+
+        self.confidence = confidence
+
+        self.box = box
+
+
+
+    @property
+
+    def position(self) -> str:
+
+        """Where the object is, from the wearer's point of view."""
+
+        center_x = (self.box[0] + self.box[2]) / 2
+
+        if center_x < 0.33:
+
+            return "on your left"
+
+        if center_x > 0.67:
+
+            return "on your right"
+
+        return "ahead"
+
+
+
+    @property
+
+    def bearing(self) -> str:
+
+        """Finer direction for obstacle alerts (e.g. 'slightly left')."""
+
+        center_x = (self.box[0] + self.box[2]) / 2
+
+        if center_x < 0.2:
+
+            return "to your left"
+
+        if center_x < 0.4:
+
+            return "slightly left"
+
+        if center_x <= 0.6:
+
+            return "ahead"
+
+        if center_x <= 0.8:
+
+            return "slightly right"
+
+        return "to your right"
+
+
+
+    @property
+
+    def area(self) -> float:
+
+        return max(0.0, self.box[2] - self.box[0]) * max(0.0, self.box[3] - self.box[1])
+
+
+
+    def to_dict(self) -> Dict:
+
+        return {'label': self.label, 'confidence': round(self.confidence, 3), 'box': [round(v, 4) for v in self.box]}
+
+
+
+class ObjectDetector:
+
+    """
+
+    SSD MobileNet v1 (COCO, quantized) on tflite-runtime. The model is loaded once and reused;
+
+    detect() takes a preview frame from the ring and returns labelled boxes above score_threshold.
+
+    """
+
+    def __init__(self, model_path: str = DETECTOR_MODEL_PATH, labels_path: str = DETECTOR_LABELS_PATH,
+
+                 score_threshold: float = 0.5, num_threads: int = 4):
+
+        self.model_path = model_path
+
+        self.labels_path = labels_path
+
+        self.score_threshold = score_threshold
+
+        self.num_threads = num_threads
+
+        self.interpreter = None
+
+        self.labels: List[str] = []
+
+        self._input_index = None
+
+        self._input_size = (300, 300)
+
+        self._output_indices: List[int] = []
+
+        self._load_failed = False # Don't retry (and re-log) a model that failed to load
+
+        self._lock = threading.Lock() # A TFLite interpreter must not be invoked concurrently
+
+        self.last_inference_ms = 0.0
+
+
+
+    def is_available(self) -> bool:
+
+        return HAS_TFLITE and HAS_OPENCV and not self._load_failed and os.path.exists(self.model_path)
+
+
+
+    def load(self) -> bool:
+
+        """Loads the model and labels (once). Returns True if the detector is ready."""
+
+        with self._lock:
+
+            if self.interpreter is not None:
+
+                return True
+
+            if not self.is_available():
+
+                if not self._load_failed:
+
+                    logger.warning("ObjectDetector: tflite-runtime, OpenCV or the model file is missing. Offline detection disabled.")
+
+                    self._load_failed = True
+
+                return False
+
+            try:
+
+                start = time.perf_counter()
+
+                interpreter = TFLiteInterpreter(model_path=self.model_path, num_threads=self.num_threads)
+
+                interpreter.allocate_tensors()
+
+                input_details = interpreter.get_input_details()[0]
+
+                self._input_index = input_details['index']
+
+                self._input_size = (int(input_details['shape'][2]), int(input_details['shape'][1])) # (width, height)
+
+                # Postprocess outputs: boxes, classes, scores, count
+
+                self._output_indices = [detail['index'] for detail in interpreter.get_output_details()[:4]]
+
+                self.labels = load_detector_labels(self.labels_path)
+
+                self.interpreter = interpreter
+
+                logger.info(f"ObjectDetector: Loaded {os.path.basename(self.model_path)} ({len(self.labels)} labels) "
+
+                            f"in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+                return True
+
+            except Exception as e:
+
+                logger.error(f"ObjectDetector: Failed to load model: {e}")
+
+                self._load_failed = True
+
+                return False
+
+
+
+    def label_for(self, class_id: int) -> Optional[str]:
+
+        """Name of a model class id (0 = person), or None for ids without a label ('???' placeholders)."""
+
+        index = class_id + 1 # The labelmap starts with the background class
+
+        if 0 < index < len(self.labels) and self.labels[index] not in ('', '???'):
+
+            return self.labels[index]
+
+        return None
+
+
+
+    def detect(self, image: np.ndarray) -> List[Detection]:
+
+        """Runs the detector on a BGR image. Returns detections sorted by confidence (highest first)."""
+
+        if self.interpreter is None and not self.load():
+
+            return []
+
+        rgb = cv2.cvtColor(cv2.resize(image, self._input_size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2RGB)
+
+        with self._lock:
+
+            start = time.perf_counter()
+
+            self.interpreter.set_tensor(self._input_index, rgb[np.newaxis, ...])
+
+            self.interpreter.invoke()
+
+            boxes, classes, scores, count = (self.interpreter.get_tensor(index) for index in self._output_indices)
+
+            self.last_inference_ms = (time.perf_counter() - start) * 1000
+
+        detections = []
+
+        for i in range(int(count[0])):
+
+            score = float(scores[0][i])
+
+            if score < self.score_threshold:
+
+                continue
+
+            label = self.label_for(int(classes[0][i]))
+
+            if label is None:
+
+                continue
+
+            y0, x0, y1, x1 = (float(np.clip(v, 0.0, 1.0)) for v in boxes[0][i])
+
+            detections.append(Detection(label, score, (x0, y0, x1, y1)))
+
+        detections.sort(key=lambda d: d.confidence, reverse=True)
+
+        return detections
+
+
+
+def describe_detections(detections: List[Detection], max_items: int = 5) -> str:
+
+    """Short spoken summary, grouping objects by label and position (e.g. '2 chairs on your left')."""
+
+    groups: 'OrderedDict[Tuple[str, str], int]' = OrderedDict()
+
+    for detection in detections:
+
+        key = (detection.label, detection.position)
+
+        groups[key] = groups.get(key, 0) + 1
+
+    phrases = []
+
+    for (label, position), count in list(groups.items())[:max_items]:
+
+        if count == 1:
+
+            phrases.append(f"a {label} {position}" if label[0] not in "aeiou" else f"an {label} {position}")
+
+        else:
+
+            plural = "people" if label == "person" else f"{label}s"
+
+            phrases.append(f"{count} {plural} {position}")
+
+    if len(phrases) > 1:
+
+        return ", ".join(phrases[:-1]) + f" and {phrases[-1]}"
+
+    return phrases[0] if phrases else ""
+
+
+
+# --- Local Face Recognition ---
+
+# OpenCV DNN face detector (res10 SSD, from the OpenCV samples) with the Haar cascade shipped in
+
+# opencv-python as a fallback, and the MobileFaceNet embedding model also used by the mobile app.
+
+FACE_DETECTOR_PROTO_PATH = os.path.join(ML_ASSETS_DIR, 'face_detector.prototxt')
+
+FACE_DETECTOR_WEIGHTS_PATH = os.path.join(ML_ASSETS_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+
+FACE_EMBEDDER_MODEL_PATH = os.path.join(ML_ASSETS_DIR, 'mobile_face_net.tflite')
+
+FACE_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faces')
+
+
+
+class FaceDetector:
+
+    """Finds faces in a BGR image. Boxes are pixel (x0, y0, x1, y1), largest face first."""
+
+    def __init__(self, proto_path: str = FACE_DETECTOR_PROTO_PATH, weights_path: str = FACE_DETECTOR_WEIGHTS_PATH,
+
+                 confidence_threshold: float = 0.6):
+
+        self.proto_path = proto_path
+
+        self.weights_path = weights_path
+
+        self.confidence_threshold = confidence_threshold
+
+        self.net = None
+
+        self.cascade = None
+
+        self._lock = threading.Lock()
+
+
+
+    def load(self) -> bool:
+
+        if self.net is not None or self.cascade is not None:
+
+            return True
+
+        if not HAS_OPENCV:
+
+            return False
+
+        if os.path.exists(self.proto_path) and os.path.exists(self.weights_path):
+
+            try:
+
+                self.net = cv2.dnn.readNet(self.weights_path, self.proto_path)
+
+                logger.info("FaceDetector: Loaded OpenCV DNN face detector.")
+
+                return True
+
+            except (cv2.error, AttributeError) as e: # OpenCV 5 builds may lack the Caffe importer
+
+                logger.error(f"FaceDetector: Failed to load DNN face detector: {e}")
+
+        cascade_path = os.path.join(getattr(getattr(cv2, 'data', None), 'haarcascades', ''), 'haarcascade_frontalface_default.xml')
+
+        if os.path.exists(cascade_path):
+
+            self.cascade = cv2.CascadeClassifier(cascade_path)
+
+            logger.info("FaceDetector: DNN model not found; using the Haar cascade face detector.")
+
+            return True
+
+        logger.warning("FaceDetector: No face detection model available.")
+
+        return False
+
+
+
+    def detect(self, image: np.ndarray) -> List[Tuple[Tuple[int, int, int, int], float]]:
+
+        if not self.load():
+
+            return []
+
+        height, width = image.shape[:2]
+
+        faces = []
+
+        with self._lock:
+
+            if self.net is not None:
+
+                blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+
+                self.net.setInput(blob)
+
+                output = self.net.forward()[0, 0] # [N, 7]: _, _, confidence, x0, y0, x1, y1 (normalized)
+
+                for row in output:
+
+                    if row[2] < self.confidence_threshold:
+
+                        continue
+
+                    x0, y0, x1, y1 = (np.clip(row[3:7], 0.0, 1.0) * [width, height, width, height]).astype(int)
+
+                    if x1 > x0 and y1 > y0:
+
+                        faces.append(((int(x0), int(y0), int(x1), int(y1)), float(row[2])))
+
+            else:
+
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+                for (x, y, w, h) in self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40)):
+
+                    faces.append(((int(x), int(y), int(x + w), int(y + h)), 1.0))
+
+        faces.sort(key=lambda f: (f[0][2] - f[0][0]) * (f[0][3] - f[0][1]), reverse=True)
+
+        return faces
+
+
+
+class FaceEmbedder:
+
+    """MobileFaceNet on tflite-runtime: a face crop in, an L2-normalized embedding out."""
+
+    def __init__(self, model_path: str = FACE_EMBEDDER_MODEL_PATH, num_threads: int = 2):
+
+        self.model_path = model_path
+
+        self.num_threads = num_threads
+
+        self.interpreter = None
+
+        self._input_index = None
+
+        self._output_index = None
+
+        self._input_size = (112, 112)
+
+        self._load_failed = False
+
+        self._lock = threading.Lock()
+
+
+
+    def is_available(self) -> bool:
+
+        return HAS_TFLITE and HAS_OPENCV and not self._load_failed and os.path.exists(self.model_path)
+
+
+
+    def load(self) -> bool:
+
+        with self._lock:
+
+            if self.interpreter is not None:
+
+                return True
+
+            if not self.is_available():
+
+                return False
+
+            try:
+
+                interpreter = TFLiteInterpreter(model_path=self.model_path, num_threads=self.num_threads)
+
+                interpreter.allocate_tensors()
+
+                input_details = interpreter.get_input_details()[0]
+
+                self._input_index = input_details['index']
+
+                self._input_size = (int(input_details['shape'][2]), int(input_details['shape'][1]))
+
+                self._output_index = interpreter.get_output_details()[0]['index']
+
+                self.interpreter = interpreter
+
+                logger.info(f"FaceEmbedder: Loaded {os.path.basename(self.model_path)}.")
+
+                return True
+
+            except Exception as e:
+
+                logger.error(f"FaceEmbedder: Failed to load model: {e}")
+
+                self._load_failed = True
+
+                return False
+
+
+
+    def embed(self, face: np.ndarray) -> Optional[np.ndarray]:
+
+        """Returns the embedding of a BGR face crop, or None if the model is unavailable."""
+
+        if self.interpreter is None and not self.load():
+
+            return None
+
+        rgb = cv2.cvtColor(cv2.resize(face, self._input_size), cv2.COLOR_BGR2RGB)
+
+        tensor = ((rgb.astype(np.float32) - 127.5) / 127.5)[np.newaxis, ...] # Same normalization as the app (face_recognizer_service.dart)
+
+        with self._lock:
+
+            self.interpreter.set_tensor(self._input_index, tensor)
+
+            self.interpreter.invoke()
+
+            embedding = self.interpreter.get_tensor(self._output_index)[0].astype(np.float32)
+
+        norm = np.linalg.norm(embedding)
+
+        return embedding / norm if norm > 0 else embedding
+
+
+
+class FaceIndex:
+
+    """
+
+    Enrolled face embeddings, searched by cosine similarity. Stored as faces/embeddings.npy (float32
+
+    [N, D], unit rows) opened with mmap_mode='r', so startup doesn't read the whole index, plus
+
+    faces/names.json with the name of each row. Several rows per person are allowed.
+
+    """
+
+    def __init__(self, directory: str = FACE_INDEX_DIR):
+
+        self.directory = directory
+
+        self.embeddings_path = os.path.join(directory, 'embeddings.npy')
+
+        self.names_path = os.path.join(directory, 'names.json')
+
+        self.embeddings: Optional[np.ndarray] = None
+
+        self.names: List[str] = []
+
+        self._lock = threading.Lock()
+
+        self.load()
+
+
+
+    def load(self):
+
+        with self._lock:
+
+            if os.path.exists(self.embeddings_path) and os.path.exists(self.names_path):
+
+                try:
+
+                    self.embeddings = np.load(self.embeddings_path, mmap_mode='r')
+
+                    with open(self.names_path, 'r') as f:
+
+                        self.names = json.load(f)
+
+                    if len(self.names) != len(self.embeddings):
+
+                        raise ValueError(f"{len(self.names)} names for {len(self.embeddings)} embeddings")
+
+                    logger.info(f"FaceIndex: Loaded {len(self.names)} embeddings of {len(set(self.names))} people.")
+
+                except (OSError, ValueError) as e:
+
+                    logger.error(f"FaceIndex: Could not load the face index, starting empty: {e}")
+
+                    self.embeddings, self.names = None, []
+
+
+
+    def __len__(self) -> int:
+
+        return len(self.names)
+
+
+
+    def people(self) -> List[str]:
+
+        return sorted(set(self.names))
+
+
+
+    def search(self, embedding: np.ndarray) -> Tuple[Optional[str], float]:
+
+        """Returns (name, cosine similarity) of the closest enrolled embedding, or (None, 0.0) if empty."""
+
+        with self._lock:
+
+            if self.embeddings is None or not self.names:
+
+                return None, 0.0
+
+            if embedding.shape[-1] != self.embeddings.shape[1]:
+
+                logger.error(f"FaceIndex: Embedding has {embedding.shape[-1]} dimensions but the index has "
+
+                             f"{self.embeddings.shape[1]}; it was built with a different model. Re-enroll faces.")
+
+                return None, 0.0
+
+            scores = self.embeddings @ embedding
+
+            best = int(np.argmax(scores))
+
+            return self.names[best], float(scores[best])
+
+
+
+    def add(self, name: str, embedding: np.ndarray):
+
+        with self._lock:
+
+            rows = [np.asarray(self.embeddings)] if self.embeddings is not None else []
+
+            self._save(np.vstack(rows + [embedding[np.newaxis, :].astype(np.float32)]), self.names + [name])
+
+
+
+    def remove(self, name: str) -> int:
+
+        """Forgets every embedding of name. Returns how many were removed."""
+
+        with self._lock:
+
+            keep = [i for i, n in enumerate(self.names) if n != name]
+
+            removed = len(self.names) - len(keep)
+
+            if removed:
+
+                self._save(np.asarray(self.embeddings)[keep], [self.names[i] for i in keep])
+
+            return removed
+
+
+
+    def _save(self, embeddings: np.ndarray, names: List[str]):
+
+        """Writes both files atomically and re-opens the embeddings memory-mapped."""
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        tmp_embeddings = self.embeddings_path + '.tmp.npy'
+
+        np.save(tmp_embeddings, np.ascontiguousarray(embeddings, dtype=np.float32))
+
+        with open(self.names_path + '.tmp', 'w') as f:
+
+            json.dump(names, f)
+
+        os.replace(tmp_embeddings, self.embeddings_path)
+
+        os.replace(self.names_path + '.tmp', self.names_path)
+
+        self.embeddings = np.load(self.embeddings_path, mmap_mode='r') if names else None
+
+        self.names = names
+
+
+
+class FaceRecognizer:
+
+    """Detects faces and names the enrolled ones (cosine similarity >= match_threshold)."""
+
+    def __init__(self, detector: Optional[FaceDetector] = None, embedder: Optional[FaceEmbedder] = None,
+
+                 index: Optional[FaceIndex] = None, match_threshold: float = 0.55):
+
+        self.detector = detector if detector is not None else FaceDetector()
+
+        self.embedder = embedder if embedder is not None else FaceEmbedder()
+
+        self.index = index if index is not None else FaceIndex() # An empty FaceIndex is falsy (__len__)
+
+        self.match_threshold = match_threshold
+
+
+
+    def load(self) -> bool:
+
+        """Loads the models. True if faces can at least be detected; naming them also needs the embedder."""
+
+        detector_ready = self.detector.load()
+
+        if detector_ready:
+
+            self.embedder.load()
+
+        return detector_ready
+
+
+
+    @property
+
+    def can_identify(self) -> bool:
+
+        return self.embedder.interpreter is not None
+
+
+
+    @staticmethod
+
+    def _crop(image: np.ndarray, box: Tuple[int, int, int, int], margin: float = 0.1) -> np.ndarray:
+
+        """Square crop around the face box with a small margin, clipped to the image."""
+
+        x0, y0, x1, y1 = box
+
+        size = max(x1 - x0, y1 - y0) * (1 + 2 * margin)
+
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+
+        height, width = image.shape[:2]
+
+        left, top = max(0, int(cx - size / 2)), max(0, int(cy - size / 2))
+
+        right, bottom = min(width, int(cx + size / 2)), min(height, int(cy + size / 2))
+
+        return image[top:bottom, left:right]
+
+
+
+    def recognize(self, image: np.ndarray) -> List[Dict]:
+
+        """Returns one dict per face (largest first): box, position, name (None if unknown) and similarity."""
+
+        results = []
+
+        width = image.shape[1]
+
+        for box, confidence in self.detector.detect(image):
+
+            name, similarity = None, 0.0
+
+            embedding = self.embedder.embed(self._crop(image, box)) if self.can_identify else None
+
+            if embedding is not None:
+
+                candidate, similarity = self.index.search(embedding)
+
+                if candidate is not None and similarity >= self.match_threshold:
+
+                    name = candidate
+
+            results.append({'box': list(box), 'confidence': round(confidence, 3),
+
+                            'position': Detection('face', confidence, (box[0] / width, 0.0, box[2] / width, 1.0)).position,
+
+                            'name': name, 'similarity': round(similarity, 3)})
+
+        return results
+
+
+
+    def enroll(self, name: str, image: np.ndarray) -> str:
+
+        """Adds the largest face in image under name. Returns '' on success or a spoken error message."""
+
+        if not self.load() or not self.can_identify:
+
+            return "Face enrollment needs the offline face models, which are not installed."
+
+        faces = self.detector.detect(image)
+
+        if not faces:
+
+            return "I couldn't find a face to remember. Please face the camera."
+
+        embedding = self.embedder.embed(self._crop(image, faces[0][0]))
+
+        self.index.add(name, embedding)
+
+        logger.info(f"FaceRecognizer: Enrolled {name} ({len(self.index)} embeddings in the index).")
+
+        return ""
+
+
+
+# --- OCR Preprocessing ---
+
+class DocumentPreprocessor:
+
+    """
+
+    Prepares a page for OCR: finds the document quadrilateral and warps it flat, deskews by the
+
+    angle that maximizes the row-projection variance, then (for Tesseract) applies adaptive
+
+    thresholding against uneven lighting. Per-stage timings are logged and averaged for /stats.
+
+    """
+
+    STAGES = ('quad', 'warp', 'deskew', 'threshold')
+
+
+
+    def __init__(self, max_skew: float = 10.0, min_quad_area: float = 0.2):
+
+        self.max_skew = max_skew
+
+        self.min_quad_area = min_quad_area # Smallest document, as a fraction of the frame
+
+        self.runs = 0
+
+        self.total_ms = {stage: 0.0 for stage in self.STAGES}
+
+        self.last_timings: Dict[str, float] = {}
+
+        self._lock = threading.Lock()
+
+
+
+    @staticmethod
+
+    def _order_corners(points: np.ndarray) -> np.ndarray:
+
+        """Orders 4 points as top-left, top-right, bottom-right, bottom-left."""
+
+        sums = points.sum(axis=1)
+
+        diffs = np.diff(points, axis=1).ravel() # y - x
+
+        return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+
+                         points[np.argmax(sums)], points[np.argmax(diffs)]], dtype=np.float32)
+
+
+
+    def find_document_quad(self, gray: np.ndarray) -> Optional[np.ndarray]:
+
+        """Returns the page corners (4x2, full-resolution pixels) or None if no page outline is found."""
+
+        scale = min(1.0, 500.0 / max(gray.shape[:2]))
+
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+        edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+
+        edges = cv2.dilate(edges, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area = self.min_quad_area * small.shape[0] * small.shape[1]
+
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+
+            if cv2.contourArea(contour) < min_area:
+
+                break
+
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+
+            if len(approx) == 4 and cv2.isContourConvex(approx):
+
+                return self._order_corners(approx.reshape(4, 2).astype(np.float32) / scale)
+
+        return None
+
+
+
+    @staticmethod
+
+    def warp_quad(image: np.ndarray, quad: np.ndarray) -> np.ndarray:
+
+        """Perspective-corrects the quadrilateral to a flat rectangle of the same apparent size."""
+
+        tl, tr, br, bl = quad
+
+        width = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+
+        height = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+
+        target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+
+        return cv2.warpPerspective(image, cv2.getPerspectiveTransform(quad, target), (width, height),
+
+                                   flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+
+    def estimate_skew(self, gray: np.ndarray) -> float:
+
+        """Angle in degrees that makes text lines horizontal: coarse-to-fine search on a downscaled ink mask."""
+
+        scale = min(1.0, 400.0 / max(gray.shape[:2]))
+
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+        _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+        ink = ink.astype(np.float32)
+
+        height, width = small.shape[:2]
+
+        center = (width / 2, height / 2)
+
+        inner = (slice(int(height * 0.15), int(height * 0.85)), slice(int(width * 0.15), int(width * 0.85)))
+
+
+
+        def score(angle: float) -> float:
+
+            rotated = cv2.warpAffine(ink, cv2.getRotationMatrix2D(center, angle, 1.0), (width, height))
+
+            # Sharp row peaks/valleys when lines are level; the centre only, away from the rotated-in corners
+
+            return float(np.var(rotated[inner].sum(axis=1)))
+
+
+
+        best = max(np.arange(-self.max_skew, self.max_skew + 0.01, 1.0), key=score)
+
+        best = float(max(np.arange(best - 0.9, best + 0.91, 0.1), key=score))
+
+        if score(best) < 1.2 * score(0.0): # No clear line structure (a sign, a photo, noise): leave it level
+
+            return 0.0
+
+        return round(min(max(best, -self.max_skew), self.max_skew), 1) + 0.0 # + 0.0 drops -0.0
+
+
+
+    @staticmethod
+
+    def rotate(image: np.ndarray, angle: float) -> np.ndarray:
+
+        center = (image.shape[1] / 2, image.shape[0] / 2)
+
+        return cv2.warpAffine(image, cv2.getRotationMatrix2D(center, angle, 1.0), (image.shape[1], image.shape[0]),
+
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+
+    @staticmethod
+
+    def adaptive_threshold(gray: np.ndarray) -> np.ndarray:
+
+        """Binarizes against the local background, so shadows and gradients don't swallow text."""
+
+        block_size = max(15, (min(gray.shape[:2]) // 30) | 1) # Odd, a few character heights
+
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, 15)
+
+
+
+    def process(self, image: np.ndarray, binarize: bool = True) -> np.ndarray:
+
+        """Runs the pipeline on a grayscale or BGR image and returns a grayscale (or binary) page."""
+
+        if image.ndim == 3:
+
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+        timings: Dict[str, float] = {}
+
+        stage_start = time.perf_counter()
+
+
+
+        def lap(stage: str):
+
+            nonlocal stage_start
+
+            now = time.perf_counter()
+
+            timings[stage] = (now - stage_start) * 1000
+
+            stage_start = now
+
+
+
+        quad = self.find_document_quad(image)
+
+        lap('quad')
+
+        if quad is not None:
+
+            image = self.warp_quad(image, quad)
+
+        lap('warp')
+
+        angle = self.estimate_skew(image)
+
+        if abs(angle) >= 0.3:
+
+            image = self.rotate(image, angle)
+
+        lap('deskew')
+
+        if binarize:
+
+            image = self.adaptive_threshold(image)
+
+        lap('threshold')
+
+
+
+        with self._lock:
+
+            self.runs += 1
+
+            for stage, ms in timings.items():
+
+                self.total_ms[stage] += ms
+
+            self.last_timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+
+        logger.info(f"DocumentPreprocessor: {image.shape[1]}x{image.shape[0]} page "
+
+                    f"({'quad found' if quad is not None else 'no quad'}, skew {angle:+.1f} deg) in "
+
+                    + ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items()) + ".")
+
+        return np.ascontiguousarray(image)
+
+
+
+    def stats(self) -> Dict:
+
+        with self._lock:
+
+            return {'runs': self.runs, 'last_ms': self.last_timings,
+
+                    'avg_ms': {stage: round(total / self.runs, 1) for stage, total in self.total_ms.items()} if self.runs else {}}
+
+
+
+# --- OCR Engines ---
+
+class OCREngine:
+
+    """Base class for offline OCR. recognize() takes a grayscale uint8 image and returns the text."""
+
+    name = "base"
+
+
+
+    def load(self) -> bool:
+
+        return True
+
+
+
+    def recognize(self, gray: np.ndarray) -> str:
+
+        raise NotImplementedError
+
+
+
+    def close(self):
+
+        pass
+
+
+
+class TesserocrEngine(OCREngine):
+
+    """
+
+    Tesseract through its C API (tesserocr), kept loaded in-process: the language data is read
+
+    once and images are passed as raw bytes, with no process start or temp file per call.
+
+    """
+
+    name = "tesserocr"
+
+
+
+    def __init__(self, lang: str = 'eng'):
+
+        self.lang = lang
+
+        self.api = None
+
+        self._lock = threading.Lock() # One TessBaseAPI handles one image at a time
+
+
+
+    def load(self) -> bool:
+
+        with self._lock:
+
+            if self.api is None:
+
+                try:
+
+                    start = time.perf_counter()
+
+                    self.api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=tesserocr.PSM.AUTO)
+
+                    logger.info(f"TesserocrEngine: Loaded '{self.lang}' in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+                except RuntimeError as e:
+
+                    logger.error(f"TesserocrEngine: Failed to initialize Tesseract: {e}")
+
+                    return False
+
+            return True
+
+
+
+    def recognize(self, gray: np.ndarray) -> str:
+
+        if not self.load():
+
+            raise RuntimeError("Tesseract could not be initialized")
+
+        gray = np.ascontiguousarray(gray)
+
+        with self._lock:
+
+            self.api.SetImageBytes(gray.tobytes(), gray.shape[1], gray.shape[0], 1, gray.strides[0])
+
+            return self.api.GetUTF8Text()
+
+
+
+    def close(self):
+
+        with self._lock:
+
+            if self.api is not None:
+
+                self.api.End()
+
+                self.api = None
+
+
+
+class PytesseractEngine(OCREngine):
+
+    """pytesseract: starts a tesseract process (and reloads its language data) for every call."""
+
+    name = "pytesseract"
+
+
+
+    def recognize(self, gray: np.ndarray) -> str:
+
+        return pytesseract.image_to_string(gray)
+
+
+
+OCR_ENGINES = ('auto', 'tesserocr', 'pytesseract')
+
+
+
+def create_ocr_engine(backend: str = 'auto') -> Optional[OCREngine]:
+
+    """Returns the OCR engine for a backend name; 'auto' prefers the in-process engine."""
+
+    if backend in ('auto', 'tesserocr'):
+
+        if HAS_TESSEROCR:
+
+            return TesserocrEngine()
+
+        if backend == 'tesserocr':
+
+            logger.warning("tesserocr requested but not installed. Falling back to pytesseract.")
+
+    if HAS_TESSERACT:
+
+        return PytesseractEngine()
+
+    logger.warning("No OCR engine available (install tesserocr or pytesseract).")
+
+    return None
+
+
+
+def find_text_blocks(gray: np.ndarray, padding: int = 6) -> List[Tuple[int, int, int, int]]:
+
+    """
+
+    Proposes text blocks (paragraphs/columns) with morphology: gradient, Otsu threshold, then closing
+
+    to join characters into lines and lines (by the typical gap between lines) into blocks.
+
+    Returns non-overlapping (x0, y0, x1, y1) boxes in reading order.
+
+    """
+
+    height, width = gray.shape[:2]
+
+    scale = min(1.0, 1000.0 / max(height, width)) # Proposals don't need full resolution
+
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    join_x = max(9, small.shape[1] // 50)
+
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (join_x, 1)))
+
+    # Lines of a paragraph sit about one line gap apart; paragraph and column gaps are wider
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(lines)
+
+    stats = stats[1:]
+
+    stats = stats[(stats[:, cv2.CC_STAT_HEIGHT] >= 6) & (stats[:, cv2.CC_STAT_WIDTH] >= 16)]
+
+    line_gap = _median_line_gap(stats)
+
+    join_y = int(1.5 * line_gap) + 1 if line_gap is not None else max(5, small.shape[0] // 80)
+
+    connected = cv2.morphologyEx(lines, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, join_y)))
+
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+
+    for contour in contours:
+
+        x, y, w, h = cv2.boundingRect(contour)
+
+        if w < 16 or h < 8 or w * h < 0.0005 * small.size: # Specks, rules and noise
+
+            continue
+
+        if x == 0 or y == 0 or x + w >= small.shape[1] or y + h >= small.shape[0]: # Page edges, shadows, the next page
+
+            continue
+
+        boxes.append((max(0, int(x / scale) - padding), max(0, int(y / scale) - padding),
+
+                      min(width, int((x + w) / scale) + padding), min(height, int((y + h) / scale) + padding)))
+
+    return _reading_order(_merge_overlapping(boxes))
+
+
+
+def _median_line_gap(stats: np.ndarray) -> Optional[float]:
+
+    """Median vertical gap from each text line to the nearest line below it in the same column."""
+
+    gaps = []
+
+    for x, y, w, h, _ in stats:
+
+        below = stats[(stats[:, cv2.CC_STAT_TOP] >= y + h) & (stats[:, cv2.CC_STAT_LEFT] < x + w) & (stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH] > x)]
+
+        if below.size:
+
+            gaps.append(below[:, cv2.CC_STAT_TOP].min() - (y + h))
+
+    return float(np.median(gaps)) if gaps else None
+
+
+
+def _merge_overlapping(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+
+    """Merges boxes that overlap or contain one another until every box is disjoint."""
+
+    merged = list(boxes)
+
+    changed = True
+
+    while changed:
+
+        changed = False
+
+        for i in range(len(merged)):
+
+            for j in range(i + 1, len(merged)):
+
+                a, b = merged[i], merged[j]
+
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+                    del merged[j]
+
+                    changed = True
+
+                    break
+
+            if changed:
+
+                break
+
+    return merged
+
+
+
+def _reading_order(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+
+    """
+
+    Orders blocks top to bottom through sections separated by blocks that span several columns
+
+    (titles, full-width paragraphs); within a section, columns left to right, each top to bottom.
+
+    """
+
+    def overlaps_x(a, b) -> bool:
+
+        return a[0] < b[2] and b[0] < a[2]
+
+
+
+    def by_columns(section):
+
+        columns: List[List[Tuple[int, int, int, int]]] = []
+
+        for box in sorted(section, key=lambda b: b[0]):
+
+            if columns and box[0] < max(b[2] for b in columns[-1]):
+
+                columns[-1].append(box)
+
+            else:
+
+                columns.append([box])
+
+        return [box for column in columns for box in sorted(column, key=lambda b: b[1])]
+
+
+
+    spanning = set()
+
+    for i, box in enumerate(boxes):
+
+        under = [b for j, b in enumerate(boxes) if j != i and overlaps_x(box, b)]
+
+        if any(not overlaps_x(a, b) for k, a in enumerate(under) for b in under[k + 1:]):
+
+            spanning.add(i)
+
+    ordered: List[Tuple[int, int, int, int]] = []
+
+    section: List[Tuple[int, int, int, int]] = []
+
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i][1]):
+
+        if i in spanning:
+
+            ordered.extend(by_columns(section))
+
+            section = []
+
+            ordered.append(boxes[i])
+
+        else:
+
+            section.append(boxes[i])
+
+    ordered.extend(by_columns(section))
+
+    return ordered
+
+
+
+def split_text_lines(gray: np.ndarray, min_gap: int = 3) -> List[Tuple[int, int]]:
+
+    """Splits a text block into (y0, y1) line strips at rows without ink (horizontal projection profile)."""
+
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    inked = binary.sum(axis=1) > max(1, binary.shape[1] // 200)
+
+    rows = np.flatnonzero(inked)
+
+    if rows.size == 0:
+
+        return []
+
+    breaks = np.flatnonzero(np.diff(rows) > min_gap) # Index of the last inked row of each line
+
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+
+    ends = np.concatenate((rows[breaks], [rows[-1]])) + 1
+
+    margin = min_gap
+
+    return [(max(0, int(y0) - margin), min(gray.shape[0], int(y1) + margin)) for y0, y1 in zip(starts, ends) if y1 - y0 >= 6]
+
+
+
+# Worker-process side of ParallelOCR: each worker keeps its own engine loaded
+
+_ocr_worker_engine: Optional[OCREngine] = None
+
+
+
+def _init_ocr_worker(backend: str):
+
+    global _ocr_worker_engine
+
+    _ocr_worker_engine = create_ocr_engine(backend)
+
+    if _ocr_worker_engine:
+
+        _ocr_worker_engine.load()
+
+
+
+def _ocr_worker_recognize(gray: np.ndarray) -> str:
+
+    return _ocr_worker_engine.recognize(gray) if _ocr_worker_engine else ""
+
+
+
+class ParallelOCR:
+
+    """
+
+    Reads a page across CPU cores: text blocks are proposed with find_text_blocks, cut into line
+
+    strips and recognized in a persistent process pool (one loaded engine per worker). Blocks are
+
+    reported in reading order as soon as all of their lines are done, so the first can be spoken
+
+    while the rest of the page is still being read. Pages with too little text run in-process.
+
+    """
+
+    def __init__(self, engine: OCREngine, backend: str = 'auto', workers: Optional[int] = None, min_lines: int = 4):
+
+        self.engine = engine
+
+        self.backend = backend
+
+        # Leave one core for the capture thread and web server
+
+        self.workers = workers if workers else max(1, (os.cpu_count() or 1) - 1)
+
+        self.min_lines = min_lines
+
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+        self._lock = threading.Lock()
+
+
+
+    def start(self) -> bool:
+
+        """Starts the worker pool (once, by the first page that needs it) and loads the engine in every worker. False if running in-process."""
+
+        with self._lock:
+
+            if self.pool is None and self.workers > 1:
+
+                # Tesseract's own OpenMP threads would oversubscribe the cores the pool already uses
+
+                os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+                # forkserver: workers don't inherit the camera, GPIO and server threads of this process
+
+                context = multiprocessing.get_context('forkserver' if sys.platform.startswith('linux') else 'spawn')
+
+                start = time.perf_counter()
+
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+
+                                                initializer=_init_ocr_worker, initargs=(self.backend,))
+
+                blank = np.full((32, 32), 255, dtype=np.uint8)
+
+                list(self.pool.map(_ocr_worker_recognize, [blank] * self.workers)) # Spawn and warm up the workers
+
+                logger.info(f"ParallelOCR: {self.workers} OCR workers ready in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+            return self.pool is not None
+
+
+
+    def read(self, gray: np.ndarray, on_block: Optional[Callable[[str], None]] = None) -> List[str]:
+
+        """Returns the text of each block in reading order, calling on_block(text) as each one completes."""
+
+        tasks: List[Tuple[int, np.ndarray]] = [] # (block index, line strip)
+
+        for index, (x0, y0, x1, y1) in enumerate(find_text_blocks(gray)):
+
+            block = gray[y0:y1, x0:x1]
+
+            tasks.extend((index, np.ascontiguousarray(block[top:bottom])) for top, bottom in split_text_lines(block))
+
+        if len(tasks) < self.min_lines or not self.start():
+
+            text = self.engine.recognize(gray).strip()
+
+            if text and on_block:
+
+                on_block(text)
+
+            return [text] if text else []
+
+
+
+        lines: Dict[int, str] = {}
+
+        texts: List[str] = []
+
+        next_task = 0
+
+
+
+        def flush_blocks():
+
+            # Report every block whose lines (tasks are in reading order) are all done
+
+            nonlocal next_task
+
+            while next_task < len(tasks) and next_task in lines:
+
+                block_index = tasks[next_task][0]
+
+                block_end = next_task
+
+                while block_end < len(tasks) and tasks[block_end][0] == block_index:
+
+                    block_end += 1
+
+                if not all(i in lines for i in range(next_task, block_end)):
+
+                    break
+
+                text = " ".join(lines[i] for i in range(next_task, block_end) if lines[i])
+
+                next_task = block_end
+
+                if text:
+
+                    texts.append(text)
+
+                    if on_block:
+
+                        on_block(text)
+
+
+
+        try:
+
+            futures = {self.pool.submit(_ocr_worker_recognize, strip): i for i, (_, strip) in enumerate(tasks)}
+
+            for future in as_completed(futures):
+
+                lines[futures[future]] = future.result().strip()
+
+                flush_blocks()
+
+        except BrokenProcessPool as e:
+
+            logger.error(f"ParallelOCR: Worker pool failed ({e}); finishing the page in-process from block {len(texts) + 1}.")
+
+            with self._lock:
+
+                self.pool, self.workers = None, 1
+
+            # Blocks already reported have been spoken: read only the lines that are still missing
+
+            for i in range(next_task, len(tasks)):
+
+                if i not in lines:
+
+                    lines[i] = self.engine.recognize(tasks[i][1]).strip()
+
+                flush_blocks()
+
+        return texts
+
+
+
+    def close(self):
+
+        with self._lock:
+
+            if self.pool is not None:
+
+                self.pool.shutdown(wait=False, cancel_futures=True)
+
+                self.pool = None
+
+
+
+def benchmark_ocr_engines(ai_vision, runs: int = 10) -> Dict[str, Dict]:
+
+    """
+
+    Times every available OCR engine on the same grayscale image: a camera still if the camera
+
+    is running, else a synthetic page of printed text. The first call is reported separately
+
+    because it includes loading the language data.
+
+    """
+
+    frame = ai_vision._get_frame(still=True) if ai_vision.enable_camera and ai_vision.picam2 else None
+
+    if frame is not None:
+
+        gray = cv2.cvtColor(ai_vision._to_bgr(frame.array), cv2.COLOR_BGR2GRAY)
+
+    else:
+
+        width, height = ai_vision.still_size
+
+        gray = np.full((height, width), 255, dtype=np.uint8)
+
+        for line in range(12):
+
+            cv2.putText(gray, f"Line {line + 1}: The quick brown fox jumps over the lazy dog.", (40, 70 + line * 70),
+
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2, cv2.LINE_AA)
+
+
+
+    results = {}
+
+    if ai_vision.document_preprocessor:
+
+        gray = ai_vision.document_preprocessor.process(gray)
+
+        results['preprocess'] = ai_vision.document_preprocessor.last_timings
+
+
+
+    engines = []
+
+    if HAS_TESSEROCR:
+
+        engines.append(TesserocrEngine())
+
+    if HAS_TESSERACT:
+
+        engines.append(PytesseractEngine())
+
+    for engine in engines:
+
+        start = time.perf_counter()
+
+        text = engine.recognize(gray) # Cold: includes loading the engine
+
+        first_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+
+        for _ in range(runs):
+
+            start = time.perf_counter()
+
+            engine.recognize(gray)
+
+            timings.append((time.perf_counter() - start) * 1000)
+
+        engine.close()
+
+        results[engine.name] = {'first_call_ms': round(first_ms), 'p50_ms': round(float(np.percentile(timings, 50))),
+
+                                'p95_ms': round(float(np.percentile(timings, 95))), 'chars': len(text.strip())}
+
+        logger.info(f"OCR benchmark [{engine.name}] {gray.shape[1]}x{gray.shape[0]}: {results[engine.name]}")
+
+
+
+    reader = ai_vision.ocr_reader
+
+    if reader is not None and reader.start():
+
+        timings, first_block = [], []
+
+        for _ in range(runs):
+
+            start = time.perf_counter()
+
+            marks: List[float] = []
+
+            blocks = reader.read(gray, on_block=lambda text: marks.append(time.perf_counter() - start))
+
+            timings.append((time.perf_counter() - start) * 1000)
+
+            if marks:
+
+                first_block.append(marks[0] * 1000)
+
+        results['parallel'] = {'workers': reader.workers, 'p50_ms': round(float(np.percentile(timings, 50))),
+
+                               'first_block_p50_ms': round(float(np.percentile(first_block, 50))) if first_block else None,
+
+                               'blocks': len(blocks), 'chars': sum(len(block) for block in blocks)}
+
+        logger.info(f"OCR benchmark [parallel/{reader.engine.name}] {gray.shape[1]}x{gray.shape[0]}: {results['parallel']}")
+
+    return results
+
+
+
+# --- Vision Response Cache ---
+
+class VisionResponseCache:
+
+    """
+
+    LRU cache of vision LLM answers keyed by (prompt, model, perceptual hash of the image).
+
+    A lookup matches any entry for the same prompt and model whose hash is within max_distance bits,
+
+    so asking again in front of the same view is answered locally. Entries expire after ttl seconds
+
+    and the least recently used are evicted once the cached text exceeds max_bytes.
+
+    """
+
+    def __init__(self, ttl: float = 120.0, max_distance: int = 5, max_bytes: int = 256 * 1024):
+
+        self.ttl = ttl
+
+        self.max_distance = max_distance
+
+        self.max_bytes = max_bytes
+
+        self._entries: 'OrderedDict[Tuple[str, str, int], Tuple[float, str]]' = OrderedDict() # key -> (created, response)
+
+        self._bytes = 0
+
+        self._lock = threading.Lock()
+
+        self.hits = 0
+
+        self.misses = 0
+
+        self.evictions = 0
+
+
+
+    @staticmethod
+
+    def _entry_size(key: Tuple[str, str, int], response: str) -> int:
+
+        return len(key[0]) + len(key[1]) + len(response) + 64
+
+
+
+    def _remove_locked(self, key):
+
+        _, response = self._entries.pop(key)
+
+        self._bytes -= self._entry_size(key, response)
+
+
+
+    def get(self, prompt: str, model: str, image_hash: int) -> Optional[str]:
+
+        """Returns a cached answer for a near-identical image, or None."""
+
+        now = time.time()
+
+        with self._lock:
+
+            best_key, best_distance = None, self.max_distance + 1
+
+            for key, (created, _) in list(self._entries.items()):
+
+                if now - created > self.ttl:
+
+                    self._remove_locked(key)
+
+                    continue
+
+                if key[0] == prompt and key[1] == model:
+
+                    distance = bin(key[2] ^ image_hash).count('1') # int.bit_count() needs Python 3.10
+
+                    if distance < best_distance:
+
+                        best_key, best_distance = key, distance
+
+            if best_key is None:
+
+                self.misses += 1
+
+                return None
+
+            self._entries.move_to_end(best_key)
+
+            self.hits += 1
+
+            logger.debug(f"VisionResponseCache: Hit at Hamming distance {best_distance}.")
+
+            return self._entries[best_key][1]
+
+
+
+    def put(self, prompt: str, model: str, image_hash: int, response: str):
+
+        """Stores an answer, evicting least recently used entries beyond the memory cap."""
+
+        key = (prompt, model, image_hash)
+
+        with self._lock:
+
+            if key in self._entries:
+
+                self._remove_locked(key)
+
+            self._entries[key] = (time.time(), response)
+
+            self._bytes += self._entry_size(key, response)
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+
+                self._remove_locked(next(iter(self._entries)))
+
+                self.evictions += 1
+
+
+
+    def clear(self):
+
+        with self._lock:
+
+            self._entries.clear()
+
+            self._bytes = 0
+
+
+
+    def stats(self) -> Dict[str, int]:
+
+        with self._lock:
+
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+
+
+# --- Combined Scene Analysis ---
+
+SCENE_ANALYSIS_PROMPT = (
+
+    "Analyze this image for a visually impaired user. Respond with JSON only, in exactly this form: "
+
+    '{"scene": "<two or three sentence description of the scene>", '
+
+    '"objects": ["<prominent object>", ...], '
+
+    '"text": "<all readable text, or an empty string if there is none>"}'
+
+)
+
+
+
+def parse_scene_analysis(response_text: str) -> Optional[Dict]:
+
+    """Parses the analyze-all JSON answer into {'scene', 'objects', 'text'}. Returns None if it isn't valid."""
+
+    cleaned = response_text.strip()
+
+    if cleaned.startswith("```"): # Tolerate a fenced code block
+
+        cleaned = cleaned.strip("`")
+
+        cleaned = cleaned[len("json"):] if cleaned.lower().startswith("json") else cleaned
+
+    try:
+
+        data = json.loads(cleaned)
+
+    except (json.JSONDecodeError, TypeError):
+
+        return None
+
+    if not isinstance(data, dict) or not isinstance(data.get('scene'), str):
+
+        return None
+
+    objects = data.get('objects') or []
+
+    return {
+
+        'scene': data['scene'].strip(),
+
+        'objects': [str(item).strip() for item in objects if str(item).strip()] if isinstance(objects, list) else [],
+
+        'text': str(data.get('text') or "").strip(),
+
+    }
+
+
+
+# --- Request Coalescing ---
+
+class SingleFlight:
+
+    """
+
+    Collapses identical concurrent calls into one. A caller whose key matches a call that is still
+
+    running waits for and shares that call's result instead of running it again. Once a call has
+
+    finished, the next identical call runs afresh (a deliberate repeat press is never dropped).
+
+    """
+
+    class _Call:
+
+        def __init__(self):
+
+            self.done = threading.Event()
+
+            self.result = None
+
+            self.error: Optional[BaseException] = None
+
+
+
+    def __init__(self):
+
+        self._calls: Dict[tuple, 'SingleFlight._Call'] = {}
+
+        self._lock = threading.Lock()
+
+        self.calls_run = 0
+
+        self.calls_shared = 0
+
+
+
+    def in_flight(self, key: tuple) -> bool:
+
+        with self._lock:
+
+            return key in self._calls
+
+
+
+    def do(self, key: tuple, func: Callable[[], object]) -> Tuple[object, bool]:
+
+        """Runs func() unless an identical call is in flight. Returns (result, shared)."""
+
+        with self._lock:
+
+            call = self._calls.get(key)
+
+            leader = call is None
+
+            if leader:
+
+                call = self._calls[key] = SingleFlight._Call()
+
+                self.calls_run += 1
+
+            else:
+
+                self.calls_shared += 1
+
+        if not leader:
+
+            call.done.wait()
+
+            if call.error is not None:
+
+                raise call.error
+
+            return call.result, True
+
+        try:
+
+            call.result = func()
+
+        except BaseException as e:
+
+            call.error = e
+
+            raise
+
+        finally:
+
+            with self._lock:
+
+                del self._calls[key]
+
+            call.done.set()
+
+        return call.result, False
+
+
+
+# --- AI Vision System Class (Camera, Image Processing, LLM Integration) ---
+
+class AIVisionSystem:
+
+    """Manages camera operations and AI vision tasks."""
+
+    def __init__(self, socketio_instance, enable_camera: bool = True, frame_ring_size: int = 4,
+
+                 dual_stream: bool = True, preview_size: Tuple[int, int] = (320, 240),
+
+                 still_size: Tuple[int, int] = (1280, 960), encoder_backend: str = 'auto',
+
+                 stream_quality: int = 90, still_quality: int = 90, burst_frames: Optional[int] = None,
+
+                 stream_responses: bool = True, llm_backend: Optional[LLMBackend] = None,
+
+                 detection_mode: str = 'auto', ocr_engine: str = 'auto', ocr_workers: Optional[int] = None,
+
+                 ocr_preprocess: bool = True):
+
+        self.socketio = socketio_instance
+
+        self.enable_camera = enable_camera
+
+        self.picam2 = None
+
+        self.last_capture_time = 0
+
+
+
+        # Stream layout: a small lores stream feeds the ring continuously, while the
+
+        # full-resolution main stream is only converted when a command asks for a still.
+
+        self.dual_stream = dual_stream
+
+        self.preview_size = preview_size
+
+        self.still_size = still_size if dual_stream else (640, 480)
+
+        self.still_ring = FrameRingBuffer(capacity=2)
+
+        self._still_waiters = 0
+
+        self._still_lock = threading.Lock()
+
+
+
+        # Single capture thread feeding every consumer (video feed, AI commands, OCR)
+
+        self.frame_ring = FrameRingBuffer(capacity=frame_ring_size)
+
+        self.capture_thread: Optional[threading.Thread] = None
+
+        self.is_capturing = False
+
+        self.frame_wait_timeout = 2.0 # Seconds a consumer waits for a fresh frame
+
+        self.camera_warmup = 2.0 # Seconds of frames to let auto-exposure settle before AI use
+
+        self.broadcaster = MJPEGBroadcaster(self) # Shared encoder for every /video_feed viewer
+
+        # Prompt and thumbnail of the view each vision command last uploaded; while the view is unchanged,
+
+        # the command answers from response_cache without capturing or uploading again
+
+        self.last_uploads: Dict[str, Tuple[str, np.ndarray]] = {}
+
+        self.scene_change_threshold = 0.05
+
+        self.response_cache = VisionResponseCache() # Answers repeat questions about an unchanged view locally
+
+        self.stream_responses = stream_responses # Speak vision answers sentence by sentence as Gemini generates them
+
+        # Local object detection: 'auto' uses it when the cloud is unavailable, 'local' always (low latency),
+
+        # 'cloud' never
+
+        self.object_detector = ObjectDetector()
+
+        self.detection_mode = detection_mode
+
+        # Offline face detection + enrolled-face index, preferred over the cloud when its models are present
+
+        self.face_recognizer = FaceRecognizer()
+
+        # Offline OCR engine, kept loaded between calls (see create_ocr_engine)
+
+        self.ocr_engine = create_ocr_engine(ocr_engine)
+
+        # Page flattening/deskew before OCR (and before the OCR upload), with thresholding for Tesseract
+
+        self.document_preprocessor = DocumentPreprocessor() if ocr_preprocess else None
+
+        # Dense pages are split into blocks and read across cores; small ones use ocr_engine directly
+
+        self.ocr_reader = ParallelOCR(self.ocr_engine, backend=ocr_engine, workers=ocr_workers) if self.ocr_engine else None
+
+        # analyze_all results by source frame id; single-task commands reuse them while the view is unchanged
+
+        self.scene_analyses: 'OrderedDict[int, Dict]' = OrderedDict()
+
+        self.scene_analysis_ttl = 60.0 # Seconds an analysis may answer later commands
+
+        self.max_scene_analyses = 4
+
+
+
+        # JPEG encoding backend, selectable at startup (see benchmark_jpeg_encoders)
+
+        self.encoder_backend = encoder_backend
+
+        self.jpeg_encoder = create_jpeg_encoder(encoder_backend)
+
+        self.stream_quality = stream_quality
+
+        self.still_quality = still_quality
+
+        self.capture_profiles = {name: copy.copy(profile) for name, profile in CAPTURE_PROFILES.items()}
+
+        if burst_frames is not None: # Override every profile's burst length (1 disables burst capture)
+
+            for profile in self.capture_profiles.values():
+
+                profile.burst = max(1, burst_frames)
+
+
+
+        # LLM backend for text and vision calls (Gemini unless another is selected, see create_llm_backend)
+
+        self.llm = llm_backend or create_llm_backend('gemini')
+
+
+
+        self.broadcaster.start() # Viewers may connect while the camera is still starting
+
+
+
+    def initialize_camera(self):
+
+        """
+
+        Starts the camera and capture thread, then waits out the warm-up on this (startup) thread.
+
+        The stream is live as soon as the first frame arrives; AI use should wait for this to return.
+
+        """
+
+        if self.enable_camera and HAS_CAMERA:
+
+            try:
+
+                self.picam2 = Picamera2()
+
+                if self.dual_stream:
+
+                    camera_config = self.picam2.create_video_configuration(
+
+                        main={"size": self.still_size},
+
+                        lores={"size": self.preview_size, "format": "YUV420"})
+
+                else:
+
+                    camera_config = self.picam2.create_video_configuration(main={"size": self.still_size})
+
+                self.picam2.configure(camera_config)
+
+                self.picam2.options["quality"] = 90 # Set JPEG quality for captures
+
+                self.picam2.start()
+
+                if self.dual_stream:
+
+                    logger.info(f"AIVisionSystem: Camera initialized (lores preview {self.preview_size}, main still {self.still_size}).")
+
+                else:
+
+                    logger.info("AIVisionSystem: Camera initialized.")
+
+                self._start_capture_thread()
+
+                # Warm-up: wait for a frame captured after auto-exposure has had time to settle
+
+                warmup_end = time.time() + self.camera_warmup
+
+                if self.frame_ring.wait_for_frame(newer_than=warmup_end, timeout=self.camera_warmup + 3.0) is None:
+
+                    logger.warning("AIVisionSystem: No frames received during camera warm-up.")
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Camera initialization failed: {e}. Camera features disabled.")
+
+                self.enable_camera = False
+
+        else:
+
+            logger.warning("AIVisionSystem: Camera not available or disabled by configuration.")
+
+
+
+    def _start_capture_thread(self):
+
+        """Starts the single background thread that reads the sensor into the frame ring."""
+
+        self.is_capturing = True
+
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+
+        self.capture_thread.start()
+
+        logger.info("AIVisionSystem: Capture thread started.")
+
+        if self._start_hardware_encoder():
+
+            self.broadcaster.use_hardware_encoder()
+
+
+
+    def _start_hardware_encoder(self) -> bool:
+
+        """Starts Picamera2's MJPEG encoder on the preview stream when that backend was selected."""
+
+        if self.encoder_backend != 'picamera2':
+
+            return False
+
+        if not HAS_PICAMERA2_ENCODERS:
+
+            logger.warning("AIVisionSystem: picamera2 encoders not available. Streaming with software JPEG encoding.")
+
+            return False
+
+        try:
+
+            stream_name, size = ("lores", self.preview_size) if self.dual_stream else ("main", self.still_size)
+
+            output = FileOutput(BroadcasterOutput(self.broadcaster, size[0], size[1]))
+
+            self.picam2.start_encoder(MJPEGEncoder(), output, name=stream_name)
+
+            logger.info(f"AIVisionSystem: Hardware MJPEG encoder streaming the {stream_name} stream.")
+
+            return True
+
+        except Exception as e:
+
+            logger.error(f"AIVisionSystem: Could not start hardware MJPEG encoder: {e}. Using software encoding.")
+
+            return False
+
+
+
+    def _capture_loop(self):
+
+        """Sole reader of the camera; consumers read frames from the rings instead of the sensor."""
+
+        while self.is_capturing:
+
+            try:
+
+                if self.dual_stream:
+
+                    self._capture_dual_stream()
+
+                else:
+
+                    array = self.picam2.capture_array() # Paced by the camera frame rate
+
+                    self.frame_ring.push(array)
+
+                self.last_capture_time = time.time()
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Capture thread error: {e}")
+
+                time.sleep(0.5)
+
+        logger.info("AIVisionSystem: Capture thread stopped.")
+
+
+
+    def _capture_dual_stream(self):
+
+        """Pushes every lores frame to the preview ring; copies out the main stream only when a still is wanted."""
+
+        request = self.picam2.capture_request() # Paced by the camera frame rate
+
+        try:
+
+            # Converted to BGR only if a consumer reads it: with the hardware encoder, usually none does
+
+            self.frame_ring.push(request.make_array("lores"), convert=self._yuv420_to_bgr)
+
+            with self._still_lock:
+
+                still_wanted = self._still_waiters > 0
+
+            if still_wanted:
+
+                self.still_ring.push(request.make_array("main"))
+
+        finally:
+
+            request.release()
+
+
+
+    def _yuv420_to_bgr(self, yuv: np.ndarray) -> np.ndarray:
+
+        """Converts a planar YUV420 lores buffer (H*3/2 x W) to BGR, or to its Y plane without OpenCV."""
+
+        if HAS_OPENCV:
+
+            return cv2.cvtColor(yuv, cv2.COLOR_YUV420p2BGR)
+
+        return yuv[:yuv.shape[0] * 2 // 3]
+
+
+
+    def _get_frame(self, newer_than: float = 0.0, still: bool = False, burst: int = 1) -> Optional[CameraFrame]:
+
+        """
+
+        Returns the freshest frame captured after newer_than (a time.time() value).
+
+        With still=True and dual-stream enabled, the frame comes from the full-resolution main stream.
+
+        With burst > 1, waits for that many consecutive frames and returns the sharpest one.
+
+        Returns None if camera is not enabled/initialized or no fresh frame arrives in time.
+
+        """
+
+        if not self.enable_camera or self.picam2 is None:
+
+            logger.warning("AIVisionSystem: Camera not enabled or initialized. Cannot capture image. Returning None.")
+
+            return None
+
+
+
+        use_still = still and self.dual_stream
+
+        ring = self.still_ring if use_still else self.frame_ring
+
+        if use_still:
+
+            with self._still_lock:
+
+                self._still_waiters += 1 # Keeps the main stream flowing for the whole burst
+
+        try:
+
+            frames: List[CameraFrame] = []
+
+            after_id = 0
+
+            for _ in range(max(1, burst)):
+
+                frame = ring.wait_for_frame(after_id=after_id, newer_than=newer_than, timeout=self.frame_wait_timeout)
+
+                if frame is None:
+
+                    break
+
+                frames.append(frame)
+
+                after_id = frame.frame_id
+
+        finally:
+
+            if use_still:
+
+                with self._still_lock:
+
+                    self._still_waiters -= 1
+
+        if not frames:
+
+            logger.error("AIVisionSystem: Timed out waiting for a fresh camera frame. Returning None.")
+
+            return None
+
+        if len(frames) == 1:
+
+            return frames[0]
+
+        best = max(frames, key=lambda f: f.sharpness)
+
+        logger.debug(f"AIVisionSystem: Burst of {len(frames)} frames, sharpness "
+
+                     f"{', '.join(f'{f.sharpness:.0f}' for f in frames)}; using frame {best.frame_id}.")
+
+        return best
+
+
+
+    def _to_bgr(self, array: np.ndarray) -> Optional[np.ndarray]:
+
+        """Converts a captured array to a 3-channel BGR image. Returns None for unexpected shapes."""
+
+        # picamera2.capture_array() usually returns RGB or XBGR.
+
+        # XBGR is effectively BGR, so if 3 channels, we assume BGR and proceed.
+
+        # If grayscale (2D array), convert to BGR.
+
+        if len(array.shape) == 2:  # Grayscale image (H, W)
+
+            logger.debug("AIVisionSystem: Converted grayscale (2D) to BGR.")
+
+            return cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)
+
+        elif array.shape[2] == 3:  # Color image (H, W, 3) - assume it's already BGR or compatible
+
+            return array
+
+        elif array.shape[2] == 4:  # Color image with Alpha channel (H, W, 4)
+
+            return cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+
+        logger.error(f"AIVisionSystem: Unexpected image array shape: {array.shape}.")
+
+        return None
+
+
+
+    def _encode_jpeg(self, array: np.ndarray, quality: Optional[int] = None):
+
+        """Encodes a captured array to a JPEG buffer with the selected backend. Returns None on failure."""
+
+        if self.jpeg_encoder is None:
+
+            logger.warning("AIVisionSystem: No JPEG encoder available. Cannot reliably capture image. Returning None.")
+
+            return None
+
+
+
+        try:
+
+            image = array if array.ndim == 2 else self._to_bgr(array) # Grayscale encodes as-is
+
+            if image is None:
+
+                return None
+
+
+
+            buffer = self.jpeg_encoder.encode(image, quality or self.still_quality)
+
+            if buffer is None:
+
+                logger.error(f"AIVisionSystem: {self.jpeg_encoder.name} failed to encode image to JPEG. Returning None.")
+
+            return buffer
+
+        except Exception as e:
+
+            logger.error(f"AIVisionSystem: Error processing image: {e}. Returning None.")
+
+            return None
+
+
+
+    def _encode_frame(self, frame: CameraFrame, quality: Optional[int] = None) -> Optional[EncodedFrame]:
+
+        """Encodes a ring frame into an EncodedFrame carrying its id, timestamp and size."""
+
+        buffer = self._encode_jpeg(frame.array, quality=quality)
+
+        if buffer is None:
+
+            return None
+
+        height, width = frame.array.shape[:2]
+
+        return EncodedFrame(buffer, frame.frame_id, frame.timestamp, width, height)
+
+
+
+    def _get_jpeg_frame(self, newer_than: float = 0.0, profile: Optional[str] = None) -> Optional[EncodedFrame]:
+
+        """
+
+        Takes the freshest still captured after newer_than and returns it as raw JPEG plus metadata.
+
+        profile names an entry of capture_profiles that sets crop, size, color mode and quality.
+
+        Returns None if camera is not enabled/initialized or an error occurs.
+
+        """
+
+        capture_profile = self.capture_profiles.get(profile) if profile else None
+
+        frame = self._get_frame(newer_than=newer_than, still=True, burst=capture_profile.burst if capture_profile else 1)
+
+        if frame is None:
+
+            return None
+
+        logger.debug(f"AIVisionSystem: Using frame {frame.frame_id}, shape: {frame.array.shape}, dtype: {frame.array.dtype}")
+
+        if capture_profile is not None and HAS_OPENCV:
+
+            array = capture_profile.apply(frame.array)
+
+            if capture_profile.document and self.document_preprocessor:
+
+                # Flattened and deskewed, but not binarized: the vision model reads grayscale better
+
+                array = self.document_preprocessor.process(array, binarize=False)
+
+            prepared = CameraFrame(frame.frame_id, frame.timestamp, array)
+
+            encoded = self._encode_frame(prepared, quality=capture_profile.quality)
+
+        else:
+
+            encoded = self._encode_frame(frame)
+
+        if encoded is not None:
+
+            encoded.thumbnail = frame.thumbnail
+
+            logger.debug(f"AIVisionSystem: Encoded {profile or 'default'} upload {encoded.width}x{encoded.height}, {encoded.size // 1024} KiB.")
+
+        return encoded
+
+
+
+    def scene_change_since(self, thumbnail: Optional[np.ndarray]) -> float:
+
+        """Contrast-relative change score between the current preview frame and a reference thumbnail (1.0 if unknown)."""
+
+        latest = self.frame_ring.latest()
+
+        return view_change_score(latest.thumbnail if latest else None, thumbnail)
+
+
+
+    def is_new_upload_warranted(self, command: str) -> bool:
+
+        """True if the view changed enough since `command` last uploaded a frame to justify a new cloud call."""
+
+        last = self.last_uploads.get(command)
+
+        return last is None or self.scene_change_since(last[1]) >= self.scene_change_threshold
+
+
+
+    def _note_upload(self, command: str, prompt: str, encoded: EncodedFrame):
+
+        """Remembers what a command uploaded so later calls can tell whether the scene has changed."""
+
+        if encoded.thumbnail is not None:
+
+            self.last_uploads[command] = (prompt, encoded.thumbnail)
+
+
+
+    def _answer_from_last_upload(self, command: str, prefix: str) -> Optional[str]:
+
+        """
+
+        Speaks the answer to `command`'s last upload if the view hasn't changed since, skipping the
+
+        still capture, encode and upload. Returns the message, or None if a new upload is warranted.
+
+        """
+
+        if self.is_new_upload_warranted(command):
+
+            return None
+
+        prompt, thumbnail = self.last_uploads[command]
+
+        answer = self.response_cache.get(prompt, self._vision_model_key(), perceptual_hash(thumbnail))
+
+        if answer is None: # Expired, or the call failed
+
+            return None
+
+        logger.info(f"AIVisionSystem: Answering {command} from its last upload (view unchanged).")
+
+        response_msg = f"{prefix}{answer.strip()}"
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return response_msg
+
+
+
+    def _get_image_data(self, newer_than: float = 0.0) -> Optional[str]:
+
+        """
+
+        Takes the freshest ring frame captured after newer_than and returns it as a base64 JPEG data URL.
+
+        Returns None if camera is not enabled/initialized or an error occurs.
+
+        Prefer _get_jpeg_frame(); this is kept for callers that need the data-URL string.
+
+        """
+
+        encoded = self._get_jpeg_frame(newer_than=newer_than)
+
+        return encoded.data_url if encoded else None
+
+
+
+    def describe_scene(self, prompt_suffix: str = "") -> str:
+
+        """Captures an image and uses an LLM to describe the scene."""
+
+        logger.info("AIVisionSystem: Describing scene...")
+
+        requested_at = time.time() # Never answer from a frame buffered before the request
+
+        if not prompt_suffix:
+
+            answer = self._answer_from_analysis('describe_scene') or self._answer_from_last_upload('describe_scene', "Scene: ")
+
+            if answer:
+
+                return answer
+
+        if not self.llm.is_available():
+
+            offline_msg = "Cannot describe scene. Internet connection or AI service is unavailable."
+
+            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = offline_msg
+
+            return "Scene description unavailable offline."
+
+
+
+        image_data = self._get_jpeg_frame(newer_than=requested_at, profile='scene')
+
+        if image_data:
+
+            try:
+
+                base_prompt = "Describe the scene in detail, focusing on objects, colors, and overall environment."
+
+                full_prompt = f"{base_prompt} {prompt_suffix}".strip()
+
+                response_text = self._speak_llm_vision(full_prompt, image_data, prefix="Scene: ")
+
+                if not prompt_suffix:
+
+                    self._note_upload('describe_scene', full_prompt, image_data)
+
+                # Store the last spoken response
+
+                system_instance.last_spoken_response = f"Scene: {response_text}"
+
+                return f"Scene described: {response_text}"
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Error describing scene with LLM: {e}")
+
+                error_msg = "Sorry, I couldn't describe the scene at the moment."
+
+                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+
+                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+
+                system_instance.last_spoken_response = error_msg
+
+                return "Failed to describe scene."
+
+        else:
+
+            no_image_msg = "Sorry, I can't capture an image to describe the scene."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for scene description."
+
+
+
+    def read_text_from_image(self) -> str:
+
+        """Captures an image and uses OCR to read text, with online/offline fallback."""
+
+        logger.info("AIVisionSystem: Reading text from image...")
+
+        requested_at = time.time()
+
+        answer = self._answer_from_analysis('read_text')
+
+        if answer:
+
+            return answer
+
+
+
+        if not self.enable_camera or self.picam2 is None:
+
+            no_image_msg = "Sorry, I can't capture an image to read text."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for text reading."
+
+
+
+        # --- Online Path (Gemini Vision) ---
+
+        if self.llm.is_available():
+
+            logger.info("AIVisionSystem: Using online AI for text reading.")
+
+            answer = self._answer_from_last_upload('read_text', "I read: ")
+
+            if answer:
+
+                return answer
+
+            image_data = self._get_jpeg_frame(newer_than=requested_at, profile='ocr')
+
+            if image_data:
+
+                try:
+
+                    prompt = "Read all the text in this image. If there is no text, say 'No text found'."
+
+                    response_text = self._speak_llm_vision(prompt, image_data, prefix="I read: ")
+
+                    self._note_upload('read_text', prompt, image_data)
+
+                    response_msg = f"I read: {response_text.strip()}"
+
+                    system_instance.last_spoken_response = response_msg
+
+                    return f"Text read (online): {response_text.strip()}"
+
+                except Exception as e:
+
+                    logger.error(f"AIVisionSystem: Error reading text with LLM, falling back to offline: {e}")
+
+                    # Fall through to offline method if online fails
+
+            else:
+
+                logger.warning("AIVisionSystem: Could not get image for online OCR, falling back.")
+
+
+
+        # --- Offline Path (Tesseract) ---
+
+        logger.info("AIVisionSystem: Using offline OCR for text reading.")
+
+        if self.ocr_engine is None or not HAS_OPENCV:
+
+            no_ocr_msg = "Offline text reading is not available. Please install Tesseract OCR and OpenCV."
+
+            self.socketio.emit('speech_output', {'message': no_ocr_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_ocr_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_ocr_msg
+
+            return "Text reading not available."
+
+
+
+        try:
+
+            frame = self._get_frame(newer_than=requested_at, still=True, # Full resolution, sharpest of a burst
+
+                                    burst=self.capture_profiles['ocr'].burst)
+
+            if frame is None:
+
+                raise RuntimeError("No fresh camera frame available")
+
+            array = frame.array
+
+            # Convert to grayscale for better OCR performance
+
+            if array.shape[2] == 4:
+
+                array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+
+            gray_image = cv2.cvtColor(array, cv2.COLOR_BGR2GRAY)
+
+            if self.document_preprocessor:
+
+                gray_image = self.document_preprocessor.process(gray_image)
+
+            start = time.perf_counter()
+
+            spoken_blocks = 0
+
+
+
+            def speak_block(block_text: str):
+
+                # Blocks are spoken as they are read, the first one while the rest of the page is in progress
+
+                nonlocal spoken_blocks
+
+                if spoken_blocks == 0:
+
+                    logger.info(f"AIVisionSystem: First text block queued for speech after {time.perf_counter() - start:.2f}s.")
+
+                    block_text = f"I read: {block_text}"
+
+                system_instance.audio_system.speak(block_text)
+
+                spoken_blocks += 1
+
+
+
+            text = "\n".join(self.ocr_reader.read(gray_image, on_block=speak_block))
+
+            logger.info(f"AIVisionSystem: OCR ({self.ocr_engine.name}) took {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+            
+
+            if text.strip():
+
+                response_msg = f"I read: {text.strip()}"
+
+                self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log (already spoken block by block)
+
+                system_instance.last_spoken_response = response_msg
+
+                return f"Text read (offline): {text.strip()}"
+
+            else:
+
+                no_text_msg = "No readable text found in the image."
+
+                self.socketio.emit('speech_output', {'message': no_text_msg}) # Still emit for web log
+
+                system_instance.audio_system.speak(no_text_msg) # Now also speak directly on Pi
+
+                system_instance.last_spoken_response = no_text_msg
+
+                return "No text found."
+
+        except Exception as e:
+
+            logger.error(f"AIVisionSystem: Error reading text with {self.ocr_engine.name}: {e}")
+
+            error_msg = "Sorry, I encountered an error while trying to read text."
+
+            self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = error_msg
+
+            return "Failed to read text."
+
+
+
+    def detect_objects(self, prompt_suffix: str = "") -> str:
+
+        """Captures an image and uses an LLM to detect objects."""
+
+        logger.info("AIVisionSystem: Detecting objects...")
+
+        requested_at = time.time()
+
+        if not prompt_suffix:
+
+            answer = self._answer_from_analysis('detect_objects')
+
+            if answer:
+
+                return answer
+
+        use_local = self.detection_mode == 'local' or (self.detection_mode == 'auto' and not self.llm.is_available())
+
+        if use_local and self.object_detector.load():
+
+            return self._detect_objects_locally(requested_at)
+
+        if not self.llm.is_available():
+
+            offline_msg = "Cannot detect objects. Internet connection or AI service is unavailable."
+
+            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = offline_msg
+
+            return "Object detection unavailable offline."
+
+
+
+        if not prompt_suffix:
+
+            answer = self._answer_from_last_upload('detect_objects', "Objects detected: ")
+
+            if answer:
+
+                return answer
+
+        image_data = self._get_jpeg_frame(newer_than=requested_at, profile='objects')
+
+        if image_data:
+
+            try:
+
+                base_prompt = "List all prominent objects you see in this image. Be concise."
+
+                full_prompt = f"{base_prompt} {prompt_suffix}".strip()
+
+                response_text = self._speak_llm_vision(full_prompt, image_data, prefix="Objects detected: ")
+
+                if not prompt_suffix:
+
+                    self._note_upload('detect_objects', full_prompt, image_data)
+
+                response_msg = f"Objects detected: {response_text}"
+
+                system_instance.last_spoken_response = response_msg
+
+                return f"Objects detected: {response_text}"
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Error detecting objects with LLM: {e}")
+
+                error_msg = "Sorry, I couldn't detect objects at the moment."
+
+                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+
+                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+
+                system_instance.last_spoken_response = error_msg
+
+                return "Failed to detect objects."
+
+        else:
+
+            no_image_msg = "Sorry, I can't capture an image to detect objects."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for object detection."
+
+
+
+    def recognize_face(self) -> str:
+
+        """Captures an image and names enrolled faces locally, or asks the LLM whether a face is present."""
+
+        logger.info("AIVisionSystem: Attempting face recognition...")
+
+        requested_at = time.time()
+
+        # Local when it can name people, or as detection-only fallback when the cloud is unreachable
+
+        if self.face_recognizer.load() and (self.face_recognizer.can_identify or not self.llm.is_available()):
+
+            return self._recognize_face_locally(requested_at)
+
+        if not self.llm.is_available():
+
+            offline_msg = "Cannot recognize faces. Internet connection or AI service is unavailable."
+
+            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = offline_msg
+
+            return "Face recognition unavailable offline."
+
+
+
+        image_data = self._get_jpeg_frame(newer_than=requested_at, profile='face')
+
+        if image_data:
+
+            try:
+
+                # In a real system, you'd send image_data to a face recognition model/API
+
+                # This is a placeholder for the actual logic.
+
+                prompt = "Is there a human face in this image? If so, describe any identifiable features. Do not attempt to identify individuals."
+
+                response_text = self._call_llm_vision(prompt, image_data)
+
+                if "face" in response_text.lower():
+
+                    response_msg = f"I see a face. Description: {response_text}"
+
+                    self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+                    system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+                else:
+
+                    response_msg = "I don't detect a human face."
+
+                    self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+                    system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+                system_instance.last_spoken_response = response_msg
+
+                return f"Face recognition attempt: {response_text}"
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Error during face recognition: {e}")
+
+                error_msg = "Sorry, I couldn't perform face recognition at this time."
+
+                self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+
+                system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+
+                system_instance.last_spoken_response = error_msg
+
+                return "Face recognition failed."
+
+        else:
+
+            no_image_msg = "Sorry, I can't capture an image for face recognition."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for face recognition."
+
+
+
+    def _capture_face_image(self, requested_at: float) -> Optional[np.ndarray]:
+
+        """Full-resolution still (faces are too small in the preview) as BGR, or None."""
+
+        frame = self._get_frame(newer_than=requested_at, still=True, burst=self.capture_profiles['face'].burst)
+
+        return self._to_bgr(frame.array) if frame is not None else None
+
+
+
+    def _recognize_face_locally(self, requested_at: float) -> str:
+
+        image = self._capture_face_image(requested_at)
+
+        if image is None:
+
+            no_image_msg = "Sorry, I can't capture an image for face recognition."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for face recognition."
+
+        start = time.perf_counter()
+
+        faces = self.face_recognizer.recognize(image)
+
+        logger.info(f"AIVisionSystem: Local face recognition found {len(faces)} faces in "
+
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms.")
+
+        self.socketio.emit('status_update', {'type': 'face_recognition', 'data': {'faces': faces}})
+
+        if not faces:
+
+            response_msg = "I don't detect a human face."
+
+        elif len(faces) == 1:
+
+            face = faces[0]
+
+            response_msg = f"This is {face['name']}." if face['name'] else "I see a face, but I don't recognize them."
+
+        else:
+
+            described = [f"{face['name'] or 'someone I do not know'} {face['position']}" for face in faces[:4]]
+
+            response_msg = f"I see {len(faces)} people: " + ", ".join(described) + "."
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return f"Face recognition (local): {response_msg}"
+
+
+
+    def enroll_face(self, name: str) -> str:
+
+        """Remembers the largest face in view under name."""
+
+        logger.info(f"AIVisionSystem: Enrolling face for '{name}'...")
+
+        image = self._capture_face_image(time.time())
+
+        if image is None:
+
+            no_image_msg = "Sorry, I can't capture an image to remember this face."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for face enrollment."
+
+        error = self.face_recognizer.enroll(name, image)
+
+        response_msg = error or f"I'll remember {name}."
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return error or f"Enrolled face for {name}."
+
+
+
+    def forget_face(self, name: str) -> str:
+
+        """Removes every enrolled embedding of name."""
+
+        removed = self.face_recognizer.index.remove(name)
+
+        response_msg = f"I've forgotten {name}." if removed else f"I don't know anyone called {name}."
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return response_msg
+
+
+
+    def _call_llm_text(self, prompt: str) -> str:
+
+        """
+
+        Calls the text-only model of the configured LLM backend.
+
+        """
+
+        if not self.llm.is_configured():
+
+            logger.warning("GEMINI_API_KEY not set. Using mock LLM response.")
+
+            mock_response = "This is a simulated AI response. Please set GEMINI_API_KEY for real AI."
+
+            system_instance.audio_system.speak(mock_response) # Speak mock response
+
+            return mock_response
+
+
+
+        try:
+
+            return self.llm.generate_text(prompt)
+
+        except requests.exceptions.RequestException as e:
+
+            logger.error(f"Error calling {self.llm.name} text API: {e}")
+
+            return "Error communicating with AI service."
+
+        except ValueError as e:
+
+            logger.warning(f"LLM text call received an unusable response: {e}")
+
+            return "No coherent response from AI."
+
+        except Exception as e:
+
+            logger.error(f"Unexpected error in LLM text call: {e}")
+
+            return "An unexpected error occurred with the AI service."
+
+
+
+    def _detect_objects_locally(self, requested_at: float) -> str:
+
+        """Detects objects in the newest preview frame with the on-device SSD MobileNet model."""
+
+        frame = self._get_frame(newer_than=requested_at)
+
+        image = self._to_bgr(frame.array) if frame is not None else None
+
+        if image is None:
+
+            no_image_msg = "Sorry, I can't capture an image to detect objects."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for object detection."
+
+
+
+        detections = self.object_detector.detect(image)
+
+        logger.info(f"AIVisionSystem: Local detection found {len(detections)} objects in "
+
+                    f"{self.object_detector.last_inference_ms:.0f} ms (frame {frame.frame_id}).")
+
+        self.socketio.emit('status_update', {'type': 'object_detections', 'data': {
+
+            'frame_id': frame.frame_id, 'detections': [d.to_dict() for d in detections]}})
+
+        summary = describe_detections(detections)
+
+        response_msg = f"Objects detected: {summary}." if summary else "I don't see any objects I recognize."
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return f"Objects detected (local): {summary or 'none'}"
+
+
+
+    def analyze_all(self) -> str:
+
+        """
+
+        Uploads one still and asks for scene, objects and text together as JSON.
+
+        The parsed result is kept per frame, and describe_scene, detect_objects and read_text_from_image
+
+        answer from it locally while the view stays the same.
+
+        """
+
+        logger.info("AIVisionSystem: Analyzing scene, objects and text in one call...")
+
+        requested_at = time.time()
+
+        if not self.llm.is_available():
+
+            offline_msg = "Cannot analyze the scene. Internet connection or AI service is unavailable."
+
+            self.socketio.emit('speech_output', {'message': offline_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(offline_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = offline_msg
+
+            return "Scene analysis unavailable offline."
+
+
+
+        image_data = self._get_jpeg_frame(newer_than=requested_at, profile='analysis')
+
+        if not image_data:
+
+            no_image_msg = "Sorry, I can't capture an image to analyze."
+
+            self.socketio.emit('speech_output', {'message': no_image_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(no_image_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = no_image_msg
+
+            return "No image captured for scene analysis."
+
+
+
+        response_text = self._call_llm_vision(SCENE_ANALYSIS_PROMPT, image_data,
+
+                                              generation_config={"maxOutputTokens": 600, "responseMimeType": "application/json"})
+
+        analysis = parse_scene_analysis(response_text)
+
+        if analysis is None:
+
+            logger.error(f"AIVisionSystem: Could not parse scene analysis: {response_text[:200]}")
+
+            error_msg = "Sorry, I couldn't analyze the scene at the moment."
+
+            self.socketio.emit('speech_output', {'message': error_msg}) # Still emit for web log
+
+            system_instance.audio_system.speak(error_msg) # Now also speak directly on Pi
+
+            system_instance.last_spoken_response = error_msg
+
+            return "Failed to analyze scene."
+
+        analysis.update(frame_id=image_data.frame_id, thumbnail=image_data.thumbnail, created=time.time())
+
+        self.scene_analyses[image_data.frame_id] = analysis
+
+        while len(self.scene_analyses) > self.max_scene_analyses:
+
+            self.scene_analyses.popitem(last=False)
+
+
+
+        objects = ", ".join(analysis['objects']) if analysis['objects'] else "none"
+
+        text = f"Text: {analysis['text']}" if analysis['text'] else "No text found."
+
+        response_msg = f"Scene: {analysis['scene']} Objects: {objects}. {text}"
+
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
+
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
+
+        system_instance.last_spoken_response = response_msg
+
+        return f"Scene analyzed: {response_msg}"
 
-        Calls a text-only LLM like Gemini Pro.
 
-        """
 
-        if not self.gemini_api_key:
+    def _analysis_for_current_view(self) -> Optional[Dict]:
 
-            logger.warning("GEMINI_API_KEY not set. Using mock LLM response.")
+        """Returns the newest recent analyze_all result whose view still matches the camera, or None."""
 
-            mock_response = "This is a simulated AI response. Please set GEMINI_API_KEY for real AI."
+        now = time.time()
 
-            system_instance.audio_system.speak(mock_response) # Speak mock response
+        for analysis in reversed(list(self.scene_analyses.values())):
 
-            return mock_response
+            if now - analysis['created'] > self.scene_analysis_ttl:
 
+                continue
 
+            if self.scene_change_since(analysis['thumbnail']) < self.scene_change_threshold:
 
-        try:
+                return analysis
 
-            headers = {'Content-Type': 'application/json'}
+        return None
 
-            payload = {
 
-                "contents": [{"parts": [{"text": prompt}]}],
 
-                "generationConfig": {
+    def _answer_from_analysis(self, command: str) -> Optional[str]:
 
-                    "temperature": 0.5,
+        """Speaks a single-task command's answer from a matching analyze_all result. Returns the message, or None."""
 
-                    "maxOutputTokens": 125,
+        analysis = self._analysis_for_current_view()
 
-                },
+        if analysis is None:
 
-                "safetySettings": [
+            return None
 
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        if command == 'describe_scene':
 
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            response_msg = f"Scene: {analysis['scene']}"
 
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        elif command == 'detect_objects':
 
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+            response_msg = f"Objects detected: {', '.join(analysis['objects']) if analysis['objects'] else 'none'}"
 
-                ]
+        else:
 
-            }
+            response_msg = f"I read: {analysis['text']}" if analysis['text'] else "No text found."
 
+        logger.info(f"AIVisionSystem: Answering {command} from the analysis of frame {analysis['frame_id']} (view unchanged).")
 
+        self.socketio.emit('speech_output', {'message': response_msg}) # Still emit for web log
 
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.gemini_text_model}:generateContent?key={self.gemini_api_key}"
+        system_instance.audio_system.speak(response_msg) # Now also speak directly on Pi
 
-            response = requests.post(api_url, headers=headers, data=json.dumps(payload), timeout=20)
+        system_instance.last_spoken_response = response_msg
 
-            response.raise_for_status()
+        return response_msg
 
-            
 
-            result = response.json()
 
-            if result and result.get('candidates'):
+    def _speak_llm_vision(self, prompt: str, image_data: Union[EncodedFrame, str], prefix: str = "") -> str:
 
-                text = result['candidates'][0]['content']['parts'][0]['text']
+        """
 
-                return text
+        Asks the vision LLM and speaks the answer sentence by sentence while it is still generating
 
-            else:
+        (the first sentence carries prefix). Returns the full answer text.
 
-                logger.warning(f"LLM text call received unexpected response structure: {result}")
+        """
 
-                return "No coherent response from AI."
+        splitter = SentenceSplitter()
 
+        streamed: List[str] = []
 
+        spoken_count = 0
 
-        except requests.exceptions.RequestException as e:
 
-            logger.error(f"Error calling Gemini Text API: {e}")
 
-            return "Error communicating with AI service."
+        def speak_sentences(sentences: List[str]):
 
-        except Exception as e:
+            nonlocal spoken_count
 
-            logger.error(f"Unexpected error in LLM text call: {e}")
+            for sentence in sentences:
 
-            return "An unexpected error occurred with the AI service."
+                if spoken_count == 0:
 
+                    sentence = f"{prefix}{sentence}"
 
+                    logger.info(f"AIVisionSystem: First sentence queued for speech after {time.time() - asked_at:.2f}s.")
 
-    def _call_llm_vision(self, prompt: str, image_data: str) -> str:
+                system_instance.audio_system.speak(sentence)
 
-        """
+                spoken_count += 1
 
-        Simulates an API call to a multimodal LLM like Gemini Vision.
 
-        Replace with actual API call if you have Gemini API access.
 
-        """
+        def on_text(chunk: str):
 
-        if not self.gemini_api_key:
+            streamed.append(chunk)
 
-            logger.warning("GEMINI_API_KEY not set. Using mock LLM response.")
+            speak_sentences(splitter.feed(chunk))
 
-            mock_response = "This is a simulated AI response. Please set GEMINI_API_KEY for real AI."
 
-            system_instance.audio_system.speak(mock_response) # Speak mock response
 
-            return mock_response
+        asked_at = time.time()
 
+        response_text = self._call_llm_vision(prompt, image_data, on_text=on_text)
 
+        if not streamed:
 
-        # Example structure for Gemini API call (conceptual, adjust to actual SDK/REST)
+            speak_sentences(splitter.feed(response_text)) # Cached, mock or non-streamed answer
 
-        # Note: This is a simplified direct fetch, in production you'd use a robust client library.
+        elif response_text != "".join(streamed):
 
-        try:
+            speak_sentences(splitter.flush()) # Stream broke off: finish what was said, then the error
 
-            headers = {
+            splitter.feed(response_text)
 
-                'Content-Type': 'application/json',
+        speak_sentences(splitter.flush())
 
-            }
+        return response_text
 
-            # Remove "data:image/jpeg;base64," prefix for the actual data
 
-            image_b64_only = image_data.split(',')[1] if ',' in image_data else image_data
 
+    def _call_llm_vision(self, prompt: str, image_data: Union[EncodedFrame, str],
 
+                         on_text: Optional[Callable[[str], None]] = None,
 
-            payload = {
+                         generation_config: Optional[Dict] = None) -> str:
 
-                "contents": [
+        """
 
-                    {
+        Calls the vision model of the configured LLM backend.
 
-                        "parts": [
+        With on_text (and stream_responses enabled), the answer is streamed and each text chunk is
 
-                            {"text": prompt},
+        passed to on_text as it arrives; the full text is still returned at the end.
 
-                            {"inlineData": {"mimeType": "image/jpeg", "data": image_b64_only}}
+        generation_config entries override the backend defaults (e.g. a JSON responseMimeType).
 
-                        ]
+        """
 
-                    }
+        if not self.llm.is_configured():
 
-                ],
+            logger.warning("GEMINI_API_KEY not set. Using mock LLM response.")
 
-                "generationConfig": {
+            mock_response = "This is a simulated AI response. Please set GEMINI_API_KEY for real AI."
 
-                    "temperature": 0.4,
+            system_instance.audio_system.speak(mock_response) # Speak mock response
 
-                    "topK": 32,
+            return mock_response
 
-                    "topP": 1,
 
-                    "maxOutputTokens": 200,
 
-                    "stopSequences": []
+        image_hash = None
 
-                },
+        if isinstance(image_data, EncodedFrame) and image_data.thumbnail is not None:
 
-                "safetySettings": [
+            image_hash = perceptual_hash(image_data.thumbnail)
 
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            cached = self.response_cache.get(prompt, self._vision_model_key(), image_hash)
 
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            if cached is not None:
 
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+                logger.info("AIVisionSystem: Answering from vision response cache (view unchanged).")
 
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+                return cached
 
-                ]
 
-            }
 
+        try:
 
+            if isinstance(image_data, EncodedFrame):
 
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.gemini_vision_model}:generateContent?key={self.gemini_api_key}"
+                image_b64_only = image_data.b64 # Lazily encoded once, only for this upload
 
-            response = requests.post(api_url, headers=headers, data=json.dumps(payload), timeout=20)
+            else:
 
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+                # Remove "data:image/jpeg;base64," prefix for the actual data
 
-            
+                image_b64_only = image_data.split(',')[1] if ',' in image_data else image_data
 
-            result = response.json()
 
-            if result and result.get('candidates'):
 
-                text = result['candidates'][0]['content']['parts'][0]['text']
+            if on_text is not None and self.stream_responses:
 
-                return text
+                text = self.llm.stream_vision(prompt, image_b64_only, on_text, generation_config)
 
             else:
 
-                logger.warning(f"LLM call received unexpected response structure: {result}")
+                text = self.llm.generate_vision(prompt, image_b64_only, generation_config)
 
-                return "No coherent response from AI."
+            if image_hash is not None:
+
+                self.response_cache.put(prompt, self._vision_model_key(), image_hash, text)
+
+            return text
 
 
 
         except requests.exceptions.RequestException as e:
 
-            logger.error(f"Error calling Gemini Vision API: {e}")
+            logger.error(f"Error calling {self.llm.name} vision API: {e}")
 
             return "Error communicating with AI vision service."
 
@@ -1458,6 +6420,12 @@ class AIVisionSystem:
 
             return "Invalid AI response."
 
+        except ValueError as e:
+
+            logger.warning(f"LLM vision call received an unusable response: {e}")
+
+            return "No coherent response from AI."
+
         except Exception as e:
 
             logger.error(f"Unexpected error in LLM vision call: {e}")
@@ -1466,9 +6434,35 @@ class AIVisionSystem:
 
 
 
+    def _vision_model_key(self) -> str:
+
+        """Identifies backend + model in cache keys, so answers from different backends never mix."""
+
+        return f"{self.llm.name}:{self.llm.vision_model}"
+
+
+
     def cleanup(self):
 
-        """Stops the camera."""
+        """Stops the stream encoder, the capture thread and the camera."""
+
+        self.broadcaster.stop()
+
+        if self.broadcaster.hardware_encoding:
+
+            try:
+
+                self.picam2.stop_encoder()
+
+            except Exception as e:
+
+                logger.error(f"AIVisionSystem: Error stopping hardware encoder: {e}")
+
+        self.is_capturing = False
+
+        if self.capture_thread and self.capture_thread.is_alive():
+
+            self.capture_thread.join(timeout=2)
 
         if self.enable_camera and self.picam2:
 
@@ -1484,6 +6478,14 @@ class AIVisionSystem:
 
                 logger.error(f"AIVisionSystem: Error stopping camera: {e}")
 
+        if self.ocr_reader:
+
+            self.ocr_reader.close()
+
+        if self.ocr_engine:
+
+            self.ocr_engine.close()
+
 
 
 # --- Location System Class (Placeholder) ---
@@ -1520,7 +6522,11 @@ class LocationSystem:
 
         self.location_sensor_pin = 6 # BCM 6 (physical pin 22), was 24, now moved to avoid conflict
 
-        
+
+
+    def initialize(self):
+
+        """Configures the location sensor pin. Must run after HardwareSystem.initialize() sets the GPIO mode."""
 
         if self.enable_location and HAS_GPIO:
 
@@ -1596,7 +6602,7 @@ class LocationSystem:
 
         # Fallback to IP-based location if no client location
 
-        if not is_online():
+        if not connectivity.online:
 
             logger.warning("Cannot get location, no internet connection and no client location provided.")
 
@@ -1606,7 +6612,7 @@ class LocationSystem:
 
         try:
 
-            response = requests.get('http://ip-api.com/json/', timeout=10)
+            response = http_client.get('http://ip-api.com/json/', timeout=10)
 
             response.raise_for_status()
 
@@ -1692,7 +6698,7 @@ class LocationSystem:
 
         try:
 
-            response = requests.get(api_url, timeout=10)
+            response = http_client.get(api_url, timeout=10)
 
             response.raise_for_status()
 
@@ -1714,7 +6720,7 @@ class LocationSystem:
 
         logger.info("LocationSystem: Announcing weather...")
 
-        if not is_online():
+        if not connectivity.online:
 
             offline_msg = "Weather information is not available offline."
 
@@ -1818,6 +6824,94 @@ class LocationSystem:
 
 
 
+# --- Streaming Speech ---
+
+class SentenceSplitter:
+
+    """
+
+    Accumulates streamed LLM text and hands back each sentence once it is complete, so speech can
+
+    start before the whole answer has arrived. Fragments shorter than min_length are held back and
+
+    joined to the next sentence to avoid choppy TTS; a period after a common abbreviation ("Dr.",
+
+    "e.g.") doesn't end a sentence.
+
+    """
+
+    _boundary = re.compile(r'(?<=[.!?])\s+|\n+') # Sentence end followed by whitespace, or a line break
+
+    _abbreviation = re.compile(r'(?:^|\s)(?:Mr|Mrs|Ms|Dr|Prof|St|Mt|No|vs|approx|e\.g|i\.e)\.$')
+
+
+
+    def __init__(self, min_length: int = 20):
+
+        self.min_length = min_length
+
+        self._buffer = ""
+
+        self._pending = ""
+
+
+
+    def feed(self, text: str) -> List[str]:
+
+        """Adds streamed text; returns the sentences it completed."""
+
+        self._buffer += text
+
+        parts = self._boundary.split(self._buffer)
+
+        tail = parts.pop() # May still be mid-sentence
+
+        sentences = []
+
+        carry = ""
+
+        for part in parts:
+
+            part = f"{carry} {part.strip()}".strip()
+
+            carry = ""
+
+            if self._abbreviation.search(part):
+
+                carry = part # Continues into the next part
+
+                continue
+
+            if not part:
+
+                continue
+
+            self._pending = f"{self._pending} {part}".strip()
+
+            if len(self._pending) >= self.min_length:
+
+                sentences.append(self._pending)
+
+                self._pending = ""
+
+        self._buffer = f"{carry} {tail}" if carry else tail
+
+        return sentences
+
+
+
+    def flush(self) -> List[str]:
+
+        """Returns whatever is left once the stream has ended."""
+
+        remainder = f"{self._pending} {self._buffer.strip()}".strip()
+
+        self._buffer = self._pending = ""
+
+        return [remainder] if remainder else []
+
+
+
 # --- Audio System Class (Speech Output) ---
 
 class AudioSystem:
@@ -1834,7 +6928,21 @@ class AudioSystem:
 
         self.speech_thread = None
 
-        self._initialize_pyttsx3()
+        self.is_initializing = HAS_PYTTSX3 # Speech is queued until the engine finishes loading
+
+
+
+    def initialize(self):
+
+        """Loads the pyttsx3 engine and starts the speech thread. Called from a startup thread."""
+
+        try:
+
+            self._initialize_pyttsx3()
+
+        finally:
+
+            self.is_initializing = False
 
 
 
@@ -1908,7 +7016,7 @@ class AudioSystem:
 
         """Sends text to the client for speech synthesis and adds it to the Pi's speech queue."""
 
-        if not self.engine:
+        if not self.engine and not self.is_initializing:
 
             logger.error("AudioSystem: Speech engine not initialized. Cannot speak.")
 
@@ -2036,8 +7144,6 @@ class VoiceInputSystem:
 
     def __init__(self, socketio_instance, ai_vision_system: AIVisionSystem):
 
-        global HAS_SPEECH_RECOGNITION 
-
         self.socketio = socketio_instance
 
         self.ai_vision = ai_vision_system # For online NLU via Gemini
@@ -2070,6 +7176,10 @@ class VoiceInputSystem:
 
             "recognize face": "recognize_face",
 
+            "analyze everything": "analyze_all",
+
+            "analyze all": "analyze_all",
+
             "check obstacle": "check_and_announce_distance",
 
             "toggle light": "toggle_light",
@@ -2104,6 +7214,12 @@ class VoiceInputSystem:
 
 
 
+    def initialize(self):
+
+        """Opens the microphone and loads the offline Vosk model. Called from a startup thread."""
+
+        global HAS_SPEECH_RECOGNITION
+
         if HAS_SPEECH_RECOGNITION:
 
             try:
@@ -2246,7 +7362,7 @@ class VoiceInputSystem:
 
         # --- Online STT (Google Web Speech API) ---
 
-        if is_online():
+        if connectivity.online:
 
             logger.info("VoiceInputSystem: Attempting online speech recognition (Google).")
 
@@ -2266,6 +7382,8 @@ class VoiceInputSystem:
 
                 logger.error(f"VoiceInputSystem: Could not request results from Google; {e}. Falling back to offline.")
 
+                connectivity.report_failure()
+
 
 
         # --- Offline STT (Vosk) ---
@@ -2314,7 +7432,7 @@ class VoiceInputSystem:
 
         # --- Online NLU (Gemini) ---
 
-        if is_online() and self.ai_vision.gemini_api_key:
+        if self.ai_vision.llm.is_available():
 
             logger.info("VoiceInputSystem: Using online AI for intent recognition.")
 
@@ -2390,17 +7508,23 @@ class EnhancedAssistiveLensSystem:
 
                  enable_location: bool = True, enable_distance_sensor: bool = True,
 
-                 enable_buttons: bool = True, enable_keyboard: bool = True):
+                 enable_buttons: bool = True, enable_keyboard: bool = True,
+
+                 vision_options: Optional[Dict] = None,
+
+                 obstacle_vision_fps: float = 0.0, obstacle_vision_cpu: float = 0.25):
 
         
 
         self.socketio = socketio_instance
 
-        self.hardware = HardwareSystem(enable_distance_sensor=enable_distance_sensor)
+        # Constructors only set up state; the slow parts (GPIO, camera warm-up, pyttsx3, microphone/Vosk)
 
-        self.ai_vision = AIVisionSystem(socketio_instance, enable_camera=enable_camera)
+        # run concurrently in _start_subsystems() so the web UI and buttons are live immediately.
+
+        self.hardware = HardwareSystem(enable_distance_sensor=enable_distance_sensor)
 
-        # Initialize AudioSystem FIRST as other components will use it for speaking
+        self.ai_vision = AIVisionSystem(socketio_instance, enable_camera=enable_camera, **(vision_options or {}))
 
         self.audio_system = AudioSystem(socketio_instance)
 
@@ -2410,6 +7534,22 @@ class EnhancedAssistiveLensSystem:
 
         self.location_system = LocationSystem(socketio_instance, self.ai_vision, enable_location=enable_location)
 
+
+
+        # Per-subsystem readiness flags, set when each subsystem finishes initializing
+
+        self.subsystem_ready: Dict[str, threading.Event] = {
+
+            name: threading.Event() for name in ('hardware', 'camera', 'audio', 'voice', 'location', 'local_models')
+
+        }
+
+        self.startup_time = time.time()
+
+        # Identical vision commands from buttons, voice and the web arriving together share one call
+
+        self.vision_flights = SingleFlight()
+
         
 
         self.enable_buttons = enable_buttons
@@ -2418,6 +7558,22 @@ class EnhancedAssistiveLensSystem:
 
 
 
+        # Background obstacle vision: runs the local detector on preview frames at up to obstacle_vision_fps
+
+        # (0 disables) on its own single-threaded interpreter, using at most obstacle_vision_cpu of one core
+
+        self.obstacle_vision_fps = obstacle_vision_fps
+
+        self.obstacle_vision_cpu = obstacle_vision_cpu
+
+        self.obstacle_detections: List[Detection] = []
+
+        self.obstacle_detections_time = 0.0
+
+        self.obstacle_vision_stats = {'frames': 0, 'inference_ms': 0.0}
+
+
+
         self.last_spoken_response: str = "" # Store last spoken response for 'repeat' command
 
         self.is_navigation_active: bool = False
@@ -2470,21 +7626,175 @@ class EnhancedAssistiveLensSystem:
 
                 'long_press': self.stop_speaking 
 
-            }
+            }
+
+        }
+
+        
+
+        self.keyboard_listener = None
+
+        self.is_running = True
+
+
+
+        self._start_subsystems()
+
+
+
+    def _start_subsystems(self):
+
+        """Initializes every subsystem on its own thread; location waits for hardware (it needs the GPIO mode)."""
+
+        connectivity.add_listener(self._on_connectivity_change)
+
+        connectivity.start()
+
+        self._start_subsystem('hardware', self._initialize_hardware)
+
+        self._start_subsystem('camera', self.ai_vision.initialize_camera)
+
+        self._start_subsystem('audio', self.audio_system.initialize)
+
+        self._start_subsystem('voice', self.voice_input.initialize)
+
+        self._start_subsystem('location', self.location_system.initialize, depends_on='hardware')
+
+        self._start_subsystem('local_models', self._preload_local_models)
+
+        if self.obstacle_vision_fps > 0:
+
+            threading.Thread(target=self._obstacle_vision_loop, name="obstacle-vision", daemon=True).start()
+
+
+
+    def _preload_local_models(self):
+
+        """
+
+        Loads the offline detector, face models and OCR engine up front so first use doesn't pay the load cost.
+
+        The OCR worker pool (a process per core, each importing this module) only starts here when text is
+
+        always read offline; otherwise the first offline read starts it.
+
+        """
+
+        wanted = self.ai_vision.detection_mode != 'cloud' or self.obstacle_vision_fps > 0
+
+        if wanted and self.ai_vision.object_detector.is_available():
+
+            self.ai_vision.object_detector.load()
+
+        self.ai_vision.face_recognizer.load()
+
+        if self.ai_vision.ocr_engine:
+
+            self.ai_vision.ocr_engine.load()
+
+            if not self.ai_vision.llm.is_configured():
+
+                self.ai_vision.ocr_reader.start()
+
+
+
+    def _on_connectivity_change(self, online: bool):
+
+        """Tells the user and the web clients when online features become (un)available."""
+
+        message = "Internet connection restored." if online else "Internet connection lost. Using offline features."
+
+        self.socketio.emit('status_update', {'type': 'connectivity', 'data': {'online': online, 'message': message}})
+
+        self.audio_system.speak(message)
+
+
+
+    def _start_subsystem(self, name: str, init_func, depends_on: Optional[str] = None):
+
+        """Runs init_func in a background thread and flags the subsystem ready when it returns."""
+
+        def run():
+
+            if depends_on:
+
+                self.subsystem_ready[depends_on].wait()
+
+            start = time.time()
+
+            try:
+
+                init_func()
+
+            except Exception as e:
+
+                logger.error(f"Subsystem '{name}' failed to initialize: {e}")
+
+            finally:
+
+                self.subsystem_ready[name].set()
+
+            logger.info(f"Subsystem '{name}' ready in {time.time() - start:.2f}s ({time.time() - self.startup_time:.2f}s after boot).")
+
+            self.socketio.emit('status_update', {'type': 'subsystem_ready', 'data': {'subsystem': name}})
+
+        threading.Thread(target=run, name=f"init-{name}", daemon=True).start()
+
+
+
+    def _initialize_hardware(self):
+
+        """Configures GPIO and buttons, then starts distance monitoring."""
+
+        self.hardware.initialize()
+
+        self._start_distance_monitoring()
+
+
+
+    def prewarm_connections(self):
+
+        """Opens keep-alive connections to the cloud APIs at boot so the first command skips the handshakes."""
+
+        urls = []
+
+        if self.ai_vision.llm.is_configured() and self.ai_vision.llm.prewarm_url:
+
+            urls.append(self.ai_vision.llm.prewarm_url)
+
+        if self.location_system.openweather_api_key:
+
+            urls.append("https://api.openweathermap.org/")
+
+        if urls and connectivity.online:
+
+            http_client.prewarm(urls)
+
+
+
+    def is_subsystem_ready(self, name: str) -> bool:
+
+        return self.subsystem_ready[name].is_set()
+
+
+
+    def _require_subsystem(self, name: str, description: str) -> bool:
 
-        }
+        """Answers with a 'warming up' message if a command's subsystem hasn't finished starting."""
 
-        
+        if self.is_subsystem_ready(name):
 
-        self.keyboard_listener = None
+            return True
 
-        self.is_running = True
+        message = f"The {description} is still warming up. Please try again in a moment."
 
+        logger.info(f"Command deferred: subsystem '{name}' not ready yet.")
 
+        self.audio_system.speak(message)
 
-        # Buttons are now setup within HardwareSystem's __init__
+        self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': message}})
 
-        self._start_distance_monitoring()
+        return False
 
 
 
@@ -2556,13 +7866,21 @@ class EnhancedAssistiveLensSystem:
 
                 if distance < 100.0: # Threshold for close obstacle (e.g., 100 cm = 1 meter)
 
+                    obstacle = self._identify_obstacle() # What the camera sees in the sensor's cone, if anything
+
                     if distance < 30.0: # Very close, stronger buzz
 
                         self.hardware.trigger_buzzer(duration=0.1) # Short buzz
 
                         alert_level = "critical"
 
-                        message = f"Immediate obstacle detected at {distance} cm! Clear your path."
+                        if obstacle:
+
+                            message = f"Immediate obstacle: {obstacle.label}, {distance:.0f} cm, {obstacle.bearing}! Clear your path."
+
+                        else:
+
+                            message = f"Immediate obstacle detected at {distance} cm! Clear your path."
 
                     else: # Less critical, softer buzz/alert
 
@@ -2570,24 +7888,128 @@ class EnhancedAssistiveLensSystem:
 
                         alert_level = "warning"
 
-                        message = f"Obstacle detected at {distance} cm. Be cautious."
+                        if obstacle:
 
+                            message = f"{obstacle.label.capitalize()}, {distance:.0f} cm, {obstacle.bearing}."
 
+                        else:
 
-                    self.socketio.emit('status_update', {
+                            message = f"Obstacle detected at {distance} cm. Be cautious."
 
-                        'type': 'obstacle_alert',
 
-                        'data': {'message': message, 'distance': distance, 'level': alert_level}
 
-                    })
+                    alert = {'message': message, 'distance': distance, 'level': alert_level}
+
+                    if obstacle:
+
+                        alert.update({'object': obstacle.label, 'bearing': obstacle.bearing,
+
+                                      'confidence': round(obstacle.confidence, 3)})
 
-                    logger.info(f"Obstacle alert ({alert_level}): {distance} cm")
+                    self.socketio.emit('status_update', {'type': 'obstacle_alert', 'data': alert})
+
+                    logger.info(f"Obstacle alert ({alert_level}): {distance} cm" + (f", {obstacle.label} {obstacle.bearing}" if obstacle else ""))
 
             time.sleep(0.5) # Check every 0.5 seconds
 
 
 
+    def _obstacle_vision_loop(self):
+
+        """
+
+        Runs the local detector on the newest preview frame at up to obstacle_vision_fps. The loop has its
+
+        own single-threaded interpreter, so inference runs on this thread alone; after each frame it sleeps
+
+        long enough to keep the thread's CPU time within obstacle_vision_cpu of one core, leaving the other
+
+        cores to the web server, the capture thread and on-demand detect_objects.
+
+        """
+
+        self.subsystem_ready['camera'].wait()
+
+        self.subsystem_ready['local_models'].wait()
+
+        detector = ObjectDetector(num_threads=1)
+
+        if not self.ai_vision.picam2 or not detector.load():
+
+            logger.warning("Obstacle vision: camera or local detector unavailable. Loop not started.")
+
+            return
+
+        logger.info(f"Obstacle vision: Running at up to {self.obstacle_vision_fps:g} FPS "
+
+                    f"within {self.obstacle_vision_cpu:.0%} of one core.")
+
+        interval = 1.0 / self.obstacle_vision_fps
+
+        budget = min(1.0, max(0.05, self.obstacle_vision_cpu))
+
+        last_frame_id = 0
+
+        while self.is_running:
+
+            start = time.time()
+
+            frame = self.ai_vision.frame_ring.wait_for_frame(after_id=last_frame_id, timeout=1.0)
+
+            if frame is None:
+
+                continue
+
+            last_frame_id = frame.frame_id # Even if unusable, or the next wait returns this frame again at once
+
+            cpu_start = time.thread_time()
+
+            image = self.ai_vision._to_bgr(frame.array)
+
+            if image is None:
+
+                continue
+
+            detections = detector.detect(image)
+
+            busy = time.thread_time() - cpu_start # CPU seconds this frame cost (conversion + inference)
+
+            self.obstacle_detections = detections
+
+            self.obstacle_detections_time = frame.timestamp
+
+            self.obstacle_vision_stats['frames'] += 1
+
+            self.obstacle_vision_stats['inference_ms'] = round(detector.last_inference_ms, 1)
+
+            self.socketio.emit('status_update', {'type': 'obstacle_detections', 'data': {
+
+                'frame_id': frame.frame_id, 'detections': [d.to_dict() for d in detections]}})
+
+            time.sleep(max(interval - (time.time() - start), busy * (1.0 / budget - 1.0)))
+
+
+
+    def _identify_obstacle(self, max_age: float = 1.5) -> Optional[Detection]:
+
+        """
+
+        Picks the detection most likely to be what the ultrasonic sensor is ranging: the largest
+
+        (nearest) recent box overlapping the middle of the frame, where the HC-SR04's ~30 degree cone points.
+
+        """
+
+        if time.time() - self.obstacle_detections_time > max(max_age, 2.0 / max(self.obstacle_vision_fps, 0.1)):
+
+            return None
+
+        in_cone = [d for d in self.obstacle_detections if d.box[0] < 0.75 and d.box[2] > 0.25]
+
+        return max(in_cone, key=lambda d: d.area) if in_cone else None
+
+
+
     # --- Core Features (exposed as SocketIO commands and button gestures) ---
 
     def describe_scene(self, prompt_suffix: str = ""):
@@ -2596,11 +8018,13 @@ class EnhancedAssistiveLensSystem:
 
         logger.info(f"Command: describe_scene received. Suffix: {prompt_suffix}")
 
-        self.audio_system.speak("Analyzing the scene...") 
+        if not self._require_subsystem('camera', 'camera'):
+
+            return
 
-        response = self.ai_vision.describe_scene(prompt_suffix=prompt_suffix) 
+        self._run_vision_command('describe_scene', prompt_suffix, "Analyzing the scene...",
 
-        self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
+                                 lambda: self.ai_vision.describe_scene(prompt_suffix=prompt_suffix))
 
 
 
@@ -2610,11 +8034,11 @@ class EnhancedAssistiveLensSystem:
 
         logger.info("Command: read_text received.")
 
-        self.audio_system.speak("Reading text...")
+        if not self._require_subsystem('camera', 'camera'):
 
-        response = self.ai_vision.read_text_from_image()
+            return
 
-        self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
+        self._run_vision_command('read_text', "", "Reading text...", self.ai_vision.read_text_from_image)
 
 
 
@@ -2624,11 +8048,13 @@ class EnhancedAssistiveLensSystem:
 
         logger.info(f"Command: detect_objects received. Suffix: {prompt_suffix}")
 
-        self.audio_system.speak("Detecting objects...")
+        if not self._require_subsystem('camera', 'camera'):
 
-        response = self.ai_vision.detect_objects(prompt_suffix=prompt_suffix)
+            return
 
-        self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
+        self._run_vision_command('detect_objects', prompt_suffix, "Detecting objects...",
+
+                                 lambda: self.ai_vision.detect_objects(prompt_suffix=prompt_suffix))
 
 
 
@@ -2638,20 +8064,106 @@ class EnhancedAssistiveLensSystem:
 
         logger.info("Command: recognize_face received.")
 
-        self.audio_system.speak("Looking for faces...")
+        if not self._require_subsystem('camera', 'camera'):
+
+            return
+
+        self._run_vision_command('recognize_face', "", "Looking for faces...", self.ai_vision.recognize_face)
+
+
+
+    def enroll_face(self, name: str):
+
+        """Remembers the face in view under name for offline recognize_face."""
+
+        logger.info(f"Command: enroll_face received for '{name}'.")
+
+        if not self._require_subsystem('camera', 'camera'):
+
+            return
+
+        self.audio_system.speak(f"Hold still, remembering {name}...")
+
+        response = self.ai_vision.enroll_face(name)
+
+        self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
+
+
+
+    def forget_face(self, name: str):
+
+        """Removes an enrolled person."""
 
-        response = self.ai_vision.recognize_face()
+        logger.info(f"Command: forget_face received for '{name}'.")
+
+        response = self.ai_vision.forget_face(name)
 
         self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
 
 
 
+    def analyze_all(self):
+
+        """Triggers one combined scene/objects/text analysis that later vision commands can answer from."""
+
+        logger.info("Command: analyze_all received.")
+
+        if not self._require_subsystem('camera', 'camera'):
+
+            return
+
+        self._run_vision_command('analyze_all', "", "Analyzing everything...", self.ai_vision.analyze_all)
+
+
+
+    def _run_vision_command(self, command: str, prompt_suffix: str, announcement: str, func: Callable[[], str]) -> str:
+
+        """
+
+        Runs a vision command once for every identical trigger (button, voice, web) that arrives
+
+        while it is in flight; later triggers share the result, so the answer is spoken once.
+
+        """
+
+        def run() -> str:
+
+            self.audio_system.speak(announcement)
+
+            response = func()
+
+            self.socketio.emit('status_update', {'type': 'system_status', 'data': {'message': response}})
+
+            return response
+
+
+
+        key = (command, prompt_suffix)
+
+        if self.vision_flights.in_flight(key):
+
+            self.audio_system.speak("Still working on that.") # Feedback, so a repeat press isn't met with silence
+
+        response, shared = self.vision_flights.do(key, run)
+
+        if shared:
+
+            logger.info(f"Command: {command} joined an in-flight request; not repeating it.")
+
+        return response
+
+
+
     def check_and_announce_distance(self):
 
         """Gets and announces the current distance from ultrasonic sensor."""
 
         logger.info("Command: check_obstacle received.")
 
+        if not self._require_subsystem('hardware', 'distance sensor'):
+
+            return
+
         self.audio_system.speak("Checking for obstacles...")
 
         distance = self.hardware.get_distance()
@@ -2774,6 +8286,10 @@ class EnhancedAssistiveLensSystem:
 
         """Toggles voice command listening on/off."""
 
+        if not self._require_subsystem('voice', 'microphone'):
+
+            return
+
         if self.voice_input.is_listening:
 
             self.voice_input.stop_listening()
@@ -3072,6 +8588,8 @@ class EnhancedAssistiveLensSystem:
 
         self.is_running = False
 
+        connectivity.stop()
+
         if self.keyboard_listener:
 
             self.keyboard_listener.stop()
@@ -3202,57 +8720,119 @@ if HAS_FLASK_SOCKETIO:
 
     def video_feed():
 
-        return Response(gen_frames(system_instance.ai_vision), mimetype='multipart/x-mixed-replace; boundary=frame')
+        # Optional per-client caps and size, e.g. /video_feed?fps=5&quality=60&w=160
 
+        max_fps = request.args.get('fps', type=float)
 
+        max_quality = request.args.get('quality', type=int)
 
-    def gen_frames(ai_vision_system):
+        width = request.args.get('w', type=int)
 
-        """Generates JPEG frames for video streaming."""
+        if max_fps is not None:
 
-        while True:
+            max_fps = min(max(max_fps, 0.5), 30.0)
 
-            frame_b64 = ai_vision_system._get_image_data()
+        if max_quality is not None:
 
-            
+            max_quality = min(max(max_quality, 10), 95)
 
-            # This is the crucial check for valid base64 image data
+        return Response(gen_frames(system_instance.ai_vision, max_fps=max_fps, max_quality=max_quality, width=width),
 
-            if frame_b64 and frame_b64.startswith("data:image/jpeg;base64,"):
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
 
-                # Remove the data URL prefix for direct byte conversion
 
-                try:
 
-                    frame_bytes = base64.b64decode(frame_b64.split(',')[1])
+    @app.route('/stats')
 
-                    yield (b'--frame\r\n'
+    def stats():
 
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Connection reuse and stream encoder counters, for tuning on the device
 
-                except Exception as e:
+        broadcaster = system_instance.ai_vision.broadcaster
 
-                    logger.warning(f"gen_frames: Error decoding base64 image data: {e}. Skipping frame.")
+        return jsonify({
 
-                    time.sleep(0.1)
+            'http': http_client.stats(),
 
-            else:
+            'stream': {
+
+                'viewers': broadcaster.subscriber_count,
 
-                # If no valid image data, send a placeholder or just wait
+                'frames_encoded': broadcaster.frames_encoded,
 
-                # For video feed, it's better to keep sending something if possible,
+                'frames_scaled': broadcaster.frames_scaled,
 
-                # but if the camera is off, just wait briefly.
+                'encodes_skipped': broadcaster.encodes_skipped,
 
-                if not ai_vision_system.enable_camera:
+            },
 
-                    logger.debug("gen_frames: Camera disabled, no frames to send.")
+            'vision_cache': system_instance.ai_vision.response_cache.stats(),
 
-                else:
+            'connectivity': connectivity.stats(),
+
+            'coalescing': {'calls_run': system_instance.vision_flights.calls_run,
+
+                           'calls_shared': system_instance.vision_flights.calls_shared},
+
+            'obstacle_vision': system_instance.obstacle_vision_stats,
+
+            'ocr_preprocess': (system_instance.ai_vision.document_preprocessor.stats()
+
+                               if system_instance.ai_vision.document_preprocessor else None),
+
+        })
+
+
+
+    @app.route('/snapshot.jpg')
+
+    def snapshot():
+
+        # Latest frame for polling clients, e.g. /snapshot.jpg?w=320&quality=60.
+
+        # The ETag names the source frame, so If-None-Match gets a 304 until the scene changes.
 
-                    logger.warning("gen_frames: Invalid image data or camera error. Skipping frame.")
+        ai_vision_system = system_instance.ai_vision
 
-                time.sleep(0.5) # Wait briefly to avoid busy-waiting if camera is problematic
+        quality = request.args.get('quality', type=int)
+
+        if quality is not None:
+
+            quality = min(max(quality, 10), 95)
+
+        quality = quality or ai_vision_system.stream_quality
+
+        width = ai_vision_system.broadcaster.normalize_width(request.args.get('w', type=int))
+
+        encoded = ai_vision_system.broadcaster.latest_frame(quality=quality, width=width) if ai_vision_system.enable_camera else None
+
+        if encoded is None:
+
+            return Response("No frame available yet.", status=503, headers={'Retry-After': '1'}, mimetype='text/plain')
+
+        response = Response(encoded.jpeg, mimetype='image/jpeg')
+
+        response.set_etag(f"{encoded.source_frame_id}-w{width}-q{quality}")
+
+        response.headers['Cache-Control'] = 'no-cache' # Clients must revalidate, which is what makes 304s cheap
+
+        return response.make_conditional(request)
+
+
+
+    def gen_frames(ai_vision_system, max_fps: Optional[float] = None, max_quality: Optional[int] = None,
+
+                   width: Optional[int] = None):
+
+        """Generates JPEG frames for video streaming from the shared broadcaster (encoded once for all viewers)."""
+
+        if not ai_vision_system.enable_camera:
+
+            logger.debug("gen_frames: Camera disabled, no frames to send.")
+
+            return
+
+        yield from ai_vision_system.broadcaster.subscribe(max_fps=max_fps, max_quality=max_quality, width=width)
 
 
 
@@ -3264,6 +8844,16 @@ if HAS_FLASK_SOCKETIO:
 
         emit('system_status', {'message': 'Raspberry Pi system connected.'})
 
+        if system_instance:
+
+            # Let late-joining clients know which subsystems are already up
+
+            for name in system_instance.subsystem_ready:
+
+                if system_instance.is_subsystem_ready(name):
+
+                    emit('status_update', {'type': 'subsystem_ready', 'data': {'subsystem': name}})
+
 
 
     @socketio.on('disconnect')
@@ -3296,6 +8886,12 @@ if HAS_FLASK_SOCKETIO:
 
             'recognize_face': system_instance.recognize_face,
 
+            'enroll_face': system_instance.enroll_face,
+
+            'forget_face': system_instance.forget_face,
+
+            'analyze_all': system_instance.analyze_all,
+
             'check_obstacle': system_instance.check_and_announce_distance,
 
             'toggle_led': system_instance.toggle_light,
@@ -3344,6 +8940,20 @@ if HAS_FLASK_SOCKETIO:
 
                     threading.Thread(target=action, args=(prompt_suffix,)).start()
 
+                elif command in ['enroll_face', 'forget_face']: # Face enrollment needs the person's name
+
+                    name = (data.get('name') or '').strip()
+
+                    if name:
+
+                        threading.Thread(target=action, args=(name,)).start()
+
+                    else:
+
+                        emit('command_response', {'command': command, 'status': 'failed', 'error': 'No name provided.'})
+
+                        return
+
                 elif command == 'caretaker_message': # Handle caretaker message with its content
 
                     message_content = data.get('message', '')
@@ -3538,6 +9148,8 @@ def create_html_template():
 
                     <button class="command-button" onclick="sendCommand('recognize_face')">Recognize Face</button>
 
+                    <button class="command-button" onclick="sendCommand('analyze_all')">Analyze All</button>
+
                     <button class="command-button" onclick="sendCommand('check_obstacle')">Check Obstacle</button>
 
                     <button class="command-button" onclick="sendCommand('toggle_led')">Toggle LED</button>
@@ -3830,12 +9442,52 @@ if __name__ == '__main__':
 
     parser.add_argument('--no-voice-input', action='store_true', help='Disable voice command input.') # Add this back if removed
 
+    parser.add_argument('--single-stream', action='store_true', help='Use one 640x480 camera stream for preview and AI instead of lores preview + full-res stills')
+
+    parser.add_argument('--jpeg-encoder', choices=JPEG_ENCODER_BACKENDS, default='auto', help='JPEG encoder for the video feed (picamera2 = camera MJPEG encoder)')
+
+    parser.add_argument('--burst-frames', type=int, default=None, help='Stills captured per AI command, keeping the sharpest (1 disables; default per command)')
+
+    parser.add_argument('--no-stream-responses', action='store_true', help='Wait for complete vision answers instead of speaking them as they stream in')
+
+    parser.add_argument('--llm-backend', choices=LLM_BACKENDS, default='gemini', help='LLM service for text and vision (mock = local mock_llm_server.py)')
+
+    parser.add_argument('--llm-url', help='Override the LLM backend base URL (e.g. http://127.0.0.1:8765/v1beta)')
+
+    parser.add_argument('--benchmark-llm', type=int, metavar='N', help='Send N requests of each kind to the LLM backend, report latencies and exit')
+
+    parser.add_argument('--llm-concurrency', type=int, default=1, help='Concurrent requests during --benchmark-llm')
+
+    parser.add_argument('--detection-mode', choices=('auto', 'local', 'cloud'), default='auto', help="Object detection: on-device SSD MobileNet when offline (auto), always (local, low latency) or never (cloud)")
+
+    parser.add_argument('--obstacle-vision-fps', type=float, default=0.0, help='Run the local detector on the preview at this rate and name obstacles in distance alerts (0 disables)')
+
+    parser.add_argument('--obstacle-vision-cpu', type=float, default=0.25, help='Fraction of one CPU core the obstacle vision loop may use')
+
+    parser.add_argument('--ocr-engine', choices=OCR_ENGINES, default='auto', help='Offline OCR engine (tesserocr keeps Tesseract loaded in-process)')
+
+    parser.add_argument('--ocr-workers', type=int, default=None, help='OCR worker processes for dense pages (default: CPU cores - 1; 1 reads in-process)')
+
+    parser.add_argument('--no-ocr-preprocess', action='store_true', help='Skip page flattening, deskew and adaptive thresholding before OCR')
+
+    parser.add_argument('--benchmark-ocr', type=int, metavar='N', help='Time N OCR calls with each available engine, report and exit')
+
+    parser.add_argument('--no-http-prewarm', action='store_true', help='Do not open API connections at boot')
+
+    parser.add_argument('--benchmark-encoders', action='store_true', help='Benchmark the available JPEG encoders and exit')
+
 
 
     args = parser.parse_args()
 
 
 
+    # Patch socket.getaddrinfo only when running as the app, never on import
+
+    http_client.dns_cache.install()
+
+
+
     # Create HTML template (only if Flask/SocketIO is available)
 
     if HAS_FLASK_SOCKETIO:
@@ -3860,10 +9512,70 @@ if __name__ == '__main__':
 
         enable_buttons=not args.no_buttons,
 
-        enable_keyboard=not args.no_keyboard
+        enable_keyboard=not args.no_keyboard,
+
+        vision_options={
+
+            'dual_stream': not args.single_stream,
+
+            'encoder_backend': args.jpeg_encoder,
+
+            'burst_frames': args.burst_frames,
+
+            'stream_responses': not args.no_stream_responses,
+
+            'llm_backend': create_llm_backend(args.llm_backend, args.llm_url),
+
+            'detection_mode': args.detection_mode,
+
+            'ocr_engine': args.ocr_engine,
+
+            'ocr_workers': args.ocr_workers,
+
+            'ocr_preprocess': not args.no_ocr_preprocess,
+
+        },
+
+        obstacle_vision_fps=args.obstacle_vision_fps,
+
+        obstacle_vision_cpu=args.obstacle_vision_cpu,
 
     )
 
+
+
+    if not args.no_http_prewarm:
+
+        system_instance.prewarm_connections()
+
+
+
+    if args.benchmark_llm:
+
+        benchmark_llm_backend(system_instance.ai_vision, request_count=args.benchmark_llm, concurrency=args.llm_concurrency)
+
+        system_instance.stop_system()
+
+
+
+    if args.benchmark_ocr:
+
+        system_instance.subsystem_ready['camera'].wait()
+
+        benchmark_ocr_engines(system_instance.ai_vision, runs=args.benchmark_ocr)
+
+        system_instance.stop_system()
+
+
+
+    if args.benchmark_encoders:
+
+        system_instance.subsystem_ready['camera'].wait()
+
+        benchmark_jpeg_encoders(system_instance.ai_vision)
+
+        system_instance.stop_system()
+
     
 
     if not args.web_only:
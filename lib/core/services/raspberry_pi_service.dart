@@ -1,6 +1,7 @@
 // lib/core/services/raspberry_pi_service.dart
 import 'dart:async';
 import 'package:flutter/foundation.dart';
+import 'package:http/http.dart' as http;
 import 'package:logger/logger.dart';
 import 'package:socket_io_client/socket_io_client.dart' as io;
 
@@ -24,6 +25,46 @@ class RaspberryPiService extends ChangeNotifier {
   String? get videoFeedUrl =>
       raspberryPiUrl != null ? '$raspberryPiUrl/video_feed' : null;
 
+  /// Video feed downscaled on the Pi to [width] pixels (shared with other
+  /// viewers of the same size), so small previews don't decode full frames.
+  String? videoFeedUrlForWidth(int width) =>
+      videoFeedUrl != null ? '$videoFeedUrl?w=$width' : null;
+
+  /// Latest frame as a single JPEG, for polling instead of holding a stream open.
+  String? snapshotUrl({int? width}) {
+    if (raspberryPiUrl == null) return null;
+    return width != null
+        ? '$raspberryPiUrl/snapshot.jpg?w=$width'
+        : '$raspberryPiUrl/snapshot.jpg';
+  }
+
+  String? _snapshotEtag;
+  Uint8List? _lastSnapshot;
+
+  /// Fetches the Pi's latest frame. The previous ETag is sent along, so an
+  /// unchanged scene costs a bodyless 304 and the cached bytes are returned.
+  Future<Uint8List?> fetchSnapshot({int? width}) async {
+    final url = snapshotUrl(width: width);
+    if (url == null) return null;
+    try {
+      final response = await http.get(
+        Uri.parse(url),
+        headers: {if (_snapshotEtag != null) 'If-None-Match': _snapshotEtag!},
+      );
+      if (response.statusCode == 304) return _lastSnapshot;
+      if (response.statusCode != 200) {
+        _logger.w('Snapshot request failed: ${response.statusCode}');
+        return _lastSnapshot;
+      }
+      _snapshotEtag = response.headers['etag'];
+      _lastSnapshot = response.bodyBytes;
+      return _lastSnapshot;
+    } catch (e) {
+      _logger.e('Error fetching snapshot: $e');
+      return _lastSnapshot;
+    }
+  }
+
   // Streams for data from Raspberry Pi
   final StreamController<Map<String, dynamic>> _statusUpdateController =
       StreamController.broadcast();
@@ -127,6 +127,9 @@ class _RaspberryPiViewPageState extends State<RaspberryPiViewPage>
 
   String _currentPiStatus = "Connected";
   bool _isVideoExpanded = false;
+  // Latest still from /snapshot.jpg at the width being shown, displayed while
+  // the MJPEG stream connects
+  Uint8List? _snapshot;
 
   @override
   void initState() {
@@ -137,6 +140,18 @@ class _RaspberryPiViewPageState extends State<RaspberryPiViewPage>
 
     _setupListeners();
     _checkConnectionStatus();
+    _loadSnapshot();
+  }
+
+  Future<void> _loadSnapshot() async {
+    final expanded = _isVideoExpanded;
+    final snapshot = await _piService.fetchSnapshot(
+      width: expanded ? null : _collapsedPreviewWidth,
+    );
+    // Drop a still that arrives after the preview changed size
+    if (mounted && snapshot != null && expanded == _isVideoExpanded) {
+      setState(() => _snapshot = snapshot);
+    }
   }
 
   void _setupListeners() {
@@ -238,7 +253,13 @@ void didChangeDependencies() {
               _isVideoExpanded ? Icons.fullscreen_exit : Icons.fullscreen,
               color: colorScheme.onPrimary,
             ),
-            onPressed: () => setState(() => _isVideoExpanded = !_isVideoExpanded),
+            onPressed: () {
+              setState(() {
+                _isVideoExpanded = !_isVideoExpanded;
+                _snapshot = null;
+              });
+              _loadSnapshot();
+            },
             tooltip: 'Toggle video size',
           ),
           IconButton(
@@ -288,8 +309,14 @@ void didChangeDependencies() {
     );
   }
 
+  // Collapsed preview width, below the Pi's native 320 px preview stream so
+  // the Pi sends (and this device decodes) a downscaled variant.
+  static const int _collapsedPreviewWidth = 160;
+
   Widget _buildVideoSection(ColorScheme colorScheme, TextTheme textTheme) {
-    final videoUrl = _piService.videoFeedUrl;
+    final videoUrl = _isVideoExpanded
+        ? _piService.videoFeedUrl
+        : _piService.videoFeedUrlForWidth(_collapsedPreviewWidth);
     final aspectRatio = _isVideoExpanded ? 16 / 9 : 4 / 3;
 
     return AnimatedContainer(
@@ -316,19 +343,39 @@ void didChangeDependencies() {
                   isLive: true,
                   stream: videoUrl,
                   fit: BoxFit.cover,
-                  loading: (context) => Center(
-                    child: Column(
-                      mainAxisAlignment: MainAxisAlignment.center,
-                      children: [
-                        CircularProgressIndicator(color: colorScheme.primary),
-                        const SizedBox(height: 16),
-                        Text(
-                          'Loading video feed...',
-                          style: textTheme.bodyMedium?.copyWith(color: Colors.white),
+                  loading: (context) => _snapshot != null
+                      ? Stack(
+                          fit: StackFit.expand,
+                          children: [
+                            Image.memory(
+                              _snapshot!,
+                              fit: BoxFit.cover,
+                              gaplessPlayback: true,
+                            ),
+                            Center(
+                              child: CircularProgressIndicator(
+                                color: colorScheme.primary,
+                              ),
+                            ),
+                          ],
+                        )
+                      : Center(
+                          child: Column(
+                            mainAxisAlignment: MainAxisAlignment.center,
+                            children: [
+                              CircularProgressIndicator(
+                                color: colorScheme.primary,
+                              ),
+                              const SizedBox(height: 16),
+                              Text(
+                                'Loading video feed...',
+                                style: textTheme.bodyMedium?.copyWith(
+                                  color: Colors.white,
+                                ),
+                              ),
+                            ],
+                          ),
                         ),
-                      ],
-                    ),
-                  ),
                   error: (context, error, stackTrace) => Center(
                     child: Column(
                       mainAxisAlignment: MainAxisAlignment.center,
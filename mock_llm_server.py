@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for benchmarking and load-testing assistive_vision1.py
+without network access. Serves generateContent and streamGenerateContent (?alt=sse) with canned
+answers, configurable latency, jitter and error rate.
+
+    python3 mock_llm_server.py --latency 0.8 --jitter 0.3 --error-rate 0.05
+    python3 assistive_vision1.py --llm-backend mock --benchmark-llm 50
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('MockLLM')
+
+# Canned answers, picked by the first keyword found in the prompt (case-insensitive)
+DEFAULT_RESPONSES: List[Tuple[str, str]] = [
+    ("json", json.dumps({
+        "scene": "A tidy office with a wooden desk under a window. Daylight comes from the left.",
+        "objects": ["desk", "laptop", "coffee mug", "office chair", "window"],
+        "text": "EXIT",
+    })),
+    ("read all the text", "EXIT. Fire door, keep closed."),
+    ("list all prominent objects", "A desk, a laptop, a coffee mug, an office chair and a window."),
+    ("describe the scene", "You are in a tidy office. A wooden desk stands under a window with a laptop "
+                           "and a coffee mug on it. An office chair is pushed in front of the desk. "
+                           "The floor ahead is clear for about three meters."),
+    ("face", "I can see one person facing the camera, about two meters away. They appear to be smiling."),
+    ("weather", "It is mild and cloudy at 18 degrees, with a light breeze. A light jacket should be enough."),
+    ("system commands", "describe_scene"),
+]
+FALLBACK_RESPONSE = "This is a canned response from the local mock LLM server."
+
+class MockLLMStats:
+    """Request counters shared by every handler thread."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, failed: bool):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(failed)
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real API
+    server_version = "MockLLM/1.0"
+
+    # Set by serve()
+    responses: List[Tuple[str, str]] = DEFAULT_RESPONSES
+    latency = 0.8
+    jitter = 0.3
+    error_rate = 0.0
+    chunk_delay = 0.05
+    stats = MockLLMStats()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_HEAD(self):
+        # Connection pre-warm
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        match = re.match(r'^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)', self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": "Unknown endpoint"}})
+            return
+        try:
+            prompt = self._prompt(json.loads(body))
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": {"code": 400, "message": "Malformed request"}})
+            return
+
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))) # Time to first byte
+        failed = random.random() < self.error_rate
+        self.stats.record(failed)
+        if failed:
+            self._send_json(503, {"error": {"code": 503, "message": "Simulated overload"}})
+            return
+
+        answer = self._answer(prompt)
+        if match.group(2) == 'streamGenerateContent':
+            self._stream(answer)
+        else:
+            self._send_json(200, self._candidate(answer))
+
+    @staticmethod
+    def _prompt(request: Dict) -> str:
+        parts = request['contents'][0]['parts']
+        return " ".join(part.get('text', '') for part in parts)
+
+    def _answer(self, prompt: str) -> str:
+        lowered = prompt.lower()
+        for keyword, answer in self.responses:
+            if keyword in lowered:
+                return answer
+        return FALLBACK_RESPONSE
+
+    @staticmethod
+    def _candidate(text: str) -> Dict:
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+    def _send_json(self, status: int, payload: Dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, answer: str):
+        """Sends the answer as server-sent events of a few words each, chunk_delay apart."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = answer.split(' ')
+        for start in range(0, len(words), 4):
+            text = " ".join(words[start:start + 4]) + (" " if start + 4 < len(words) else "")
+            self._write_chunk(f"data: {json.dumps(self._candidate(text))}\r\n\r\n".encode('utf-8'))
+            time.sleep(self.chunk_delay)
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+def load_responses(path: Optional[str]) -> List[Tuple[str, str]]:
+    """Reads canned answers from a JSON object of {keyword: answer}; defaults if path is None."""
+    if not path:
+        return DEFAULT_RESPONSES
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(keyword.lower(), answer) for keyword, answer in json.load(f).items()]
+
+def serve(host: str = '127.0.0.1', port: int = 8765, latency: float = 0.8, jitter: float = 0.3,
+          error_rate: float = 0.0, chunk_delay: float = 0.05, responses_path: Optional[str] = None):
+    """Runs the mock server until interrupted."""
+    MockLLMHandler.responses = load_responses(responses_path)
+    MockLLMHandler.latency = latency
+    MockLLMHandler.jitter = jitter
+    MockLLMHandler.error_rate = error_rate
+    MockLLMHandler.chunk_delay = chunk_delay
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    logger.info(f"Mock LLM server on http://{host}:{port}/v1beta (latency {latency}s +/- {jitter}s, "
+                f"error rate {error_rate:.0%}, {len(MockLLMHandler.responses)} canned answers).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stats = MockLLMHandler.stats
+        logger.info(f"Mock LLM server stopped after {stats.requests} requests ({stats.errors} simulated errors).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini-compatible mock server for benchmarking.")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.8, help='Mean seconds before the first byte of a response')
+    parser.add_argument('--jitter', type=float, default=0.3, help='Uniform +/- jitter added to the latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='Seconds between streamed chunks')
+    parser.add_argument('--responses', help='JSON file of {"prompt keyword": "canned answer"}')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible latency/error sequences')
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    serve(args.host, args.port, args.latency, args.jitter, args.error_rate, args.chunk_delay, args.responses)
@@ -0,0 +1,527 @@
+import concurrent.futures
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_getaddrinfo = socket.getaddrinfo  # Captured before the import, which must leave it alone
+import assistive_vision1 as av  # noqa: E402
+
+
+# --- Frame ring ---
+def _push_later(ring, value, delay=0.05):
+    timer = threading.Timer(delay, ring.push, [np.full((2, 2), value, np.uint8)])
+    timer.start()
+    return timer
+
+
+def test_ring_overwrites_the_oldest_frames():
+    ring = av.FrameRingBuffer(capacity=3)
+    assert ring.latest() is None
+    for value in range(5):
+        ring.push(np.full((2, 2), value, np.uint8))
+    assert ring.latest().frame_id == 5
+    assert [frame.frame_id for frame in ring.recent(10)] == [5, 4, 3]
+    assert [int(frame.array[0, 0]) for frame in ring.recent(2)] == [4, 3]
+
+
+def test_ring_wait_times_out_without_a_newer_frame():
+    ring = av.FrameRingBuffer()
+    ring.push(np.zeros((2, 2), np.uint8))
+    start = time.monotonic()
+    assert ring.wait_for_frame(after_id=1, timeout=0.1) is None
+    assert time.monotonic() - start >= 0.09
+    assert ring.wait_for_frame(newer_than=time.time() + 60, timeout=0.05) is None
+
+
+def test_ring_wait_returns_the_next_frame_in_order():
+    ring = av.FrameRingBuffer()
+    first = ring.push(np.zeros((2, 2), np.uint8))
+    assert ring.wait_for_frame(after_id=0, timeout=0) is first  # Already buffered: no wait
+    timer = _push_later(ring, 1)
+    frame = ring.wait_for_frame(after_id=first.frame_id, timeout=2.0)
+    timer.join()
+    assert frame.frame_id == first.frame_id + 1 and frame.timestamp >= first.timestamp
+    requested_at = time.time()
+    timer = _push_later(ring, 2)
+    assert ring.wait_for_frame(newer_than=requested_at, timeout=2.0).frame_id == frame.frame_id + 1
+    timer.join()
+
+
+# --- Video feed pacing and variants ---
+class _Clock:
+    """Stands in for the time module: time only moves when a test sleeps or advances it."""
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    perf_counter = monotonic = time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(av, 'time', clock)
+    return clock
+
+
+def _preview(value):
+    image = np.full((240, 320, 3), value, np.uint8)
+    image[:, :160] //= 2  # Some structure, so the scene-change check has contrast to compare
+    return image
+
+
+def test_pacer_slows_a_slow_viewer_and_lowers_quality_after_the_hold_time(clock):
+    pacer = av.AdaptiveStreamPacer(max_fps=30, max_quality=90)
+    pacer.record_send(50_000, 0.5)  # 100 kB/s: 1.6 frames/s with headroom
+    assert pacer.target_fps == pytest.approx(1.6)
+    assert pacer.quality == 90  # Quality holds for ADJUST_INTERVAL after a change
+    pacer.wait_until_due()
+    assert clock.sleeps == [pytest.approx(1 / 1.6)]
+
+    clock.advance(pacer.ADJUST_INTERVAL)
+    pacer.record_send(50_000, 0.5)
+    assert pacer.quality == 75
+    pacer.record_send(50_000, 0.5)
+    assert pacer.quality == 75
+
+
+def test_pacer_caps_a_fast_viewer_and_raises_quality_back(clock):
+    pacer = av.AdaptiveStreamPacer(max_fps=10, max_quality=75)
+    assert pacer.levels == [30, 45, 60, 75]
+    pacer.level_index = 0
+    clock.advance(pacer.ADJUST_INTERVAL)
+    pacer.record_send(20_000, 0.001)
+    assert pacer.target_fps == 10
+    assert pacer.quality == 45
+    assert pacer.frames_sent == 1 and pacer.bytes_sent == 20_000
+
+
+def test_broadcaster_retags_an_unchanged_frame_instead_of_encoding_it(vision, clock):
+    broadcaster = vision.broadcaster
+    vision.frame_ring.push(_preview(200))
+    first = broadcaster.wait_for_frame(after_id=0, timeout=0)
+    vision.frame_ring.push(_preview(200))
+    alias = broadcaster.wait_for_frame(after_id=first.frame_id, timeout=0)
+    assert alias.frame_id == first.frame_id + 1
+    assert alias.multipart_chunk is first.multipart_chunk and alias.source_frame_id == first.frame_id
+    assert broadcaster.encodes_skipped == 1 and broadcaster.frames_encoded == 1
+
+    clock.advance(broadcaster.static_reencode_interval)  # Even a static scene is re-encoded now and then
+    vision.frame_ring.push(_preview(200))
+    assert broadcaster.wait_for_frame(after_id=alias.frame_id, timeout=0).source_frame_id == alias.frame_id + 1
+    assert broadcaster.frames_encoded == 2
+
+
+def test_broadcaster_evicts_width_variants_nobody_requests(vision, clock):
+    broadcaster = vision.broadcaster
+    assert broadcaster.normalize_width(170) == 160
+    assert broadcaster.normalize_width(640) == 0
+    vision.frame_ring.push(_preview(120))
+    small = broadcaster.latest_frame(width=160)
+    assert (small.width, small.height) == (160, 120)
+    assert (160, vision.stream_quality) in broadcaster._cache and 160 in broadcaster._scaled
+
+    clock.advance(broadcaster.variant_idle_timeout + 1)
+    vision.frame_ring.push(_preview(60))
+    broadcaster.latest_frame()
+    assert list(broadcaster._cache) == [(0, vision.stream_quality)]
+    assert broadcaster._scaled == {}
+
+
+def test_viewer_skips_unchanged_frames_until_the_keepalive_is_due(vision, clock):
+    broadcaster = vision.broadcaster
+    broadcaster.start()
+    vision.frame_ring.push(_preview(200))
+    viewer = broadcaster.subscribe(max_fps=10)
+    first = next(viewer)
+    assert broadcaster.subscriber_count == 1
+
+    vision.frame_ring.push(_preview(200))  # Unchanged: not sent again...
+    timer = threading.Timer(0.05, vision.frame_ring.push, [_preview(30)])
+    timer.start()
+    changed = next(viewer)  # ...so the next part is the changed frame
+    timer.join()
+    assert changed is not first
+    assert clock.sleeps == [pytest.approx(0.1)]  # Paced to max_fps
+
+    clock.advance(broadcaster.keepalive_interval)
+    vision.frame_ring.push(_preview(30))
+    assert next(viewer) is changed  # Unchanged, but resent as a keep-alive
+    viewer.close()
+    assert broadcaster.subscriber_count == 0
+
+
+# --- Hardware-encoded stream ---
+def test_ring_converts_raw_frames_only_when_read():
+    conversions = []
+
+    def convert(raw):
+        conversions.append(raw)
+        return raw * 2
+
+    ring = av.FrameRingBuffer(capacity=2)
+    for value in range(3):
+        ring.push(np.full((4, 4), value, np.uint8), convert=convert)
+    assert conversions == []
+    frame = ring.latest()
+    assert frame.array[0, 0] == 4 and frame.array[0, 0] == 4
+    assert len(conversions) == 1
+
+
+class _Broadcaster:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, encoded):
+        self.published.append(encoded)
+
+
+def test_hardware_frames_are_numbered_by_the_encoder():
+    broadcaster = _Broadcaster()
+    output = av.BroadcasterOutput(broadcaster, 320, 240)
+    for _ in range(3):
+        output.write(b'\xff\xd8\xff\xd9')
+    assert [encoded.frame_id for encoded in broadcaster.published] == [1, 2, 3]
+
+
+# --- Local object detection ---
+@pytest.fixture(scope='module')
+def detector():
+    detector = av.ObjectDetector()
+    detector.labels = av.load_detector_labels()
+    return detector
+
+
+@pytest.mark.parametrize('class_id, name', [
+    (0, 'person'), (12, 'stop sign'), (17, 'dog'), (46, 'cup'),
+    (61, 'chair'), (66, 'dining table'), (71, 'tv'), (72, 'laptop'),
+])
+def test_detector_labels_follow_the_90_class_labelmap(detector, class_id, name):
+    assert detector.label_for(class_id) == name
+
+
+def test_detector_skips_placeholder_and_out_of_range_ids(detector):
+    assert detector.label_for(11) is None  # '???' placeholder in the labelmap
+    assert detector.label_for(-1) is None
+    assert detector.label_for(500) is None
+
+
+# --- Connectivity ---
+def test_connectivity_boot_state_is_quiet_and_later_changes_are_announced(monkeypatch):
+    state = {'online': False}
+    monkeypatch.setattr(av, 'is_online', lambda timeout: state['online'])
+    monitor = av.ConnectivityMonitor(offline_interval=0.05)
+    monitor.min_probe_gap = 0.0
+    changes = []
+    monitor.add_listener(changes.append)
+    monitor.start()
+    try:
+        while monitor.probe_count < 2:
+            time.sleep(0.01)
+        assert monitor.online is False and changes == []  # Booting offline is not a lost connection
+        state['online'] = True
+        deadline = time.time() + 2
+        while not changes and time.time() < deadline:
+            time.sleep(0.01)
+        assert changes == [True]
+    finally:
+        monitor.stop()
+
+
+# --- HTTP client ---
+def test_import_leaves_socket_getaddrinfo_alone():
+    assert socket.getaddrinfo is _getaddrinfo
+
+
+def test_http_client_retries_connection_setup_only():
+    retry = av.HTTPClient().adapter.max_retries
+    assert retry.connect == 1
+    assert retry.read == 0 and retry.status == 0 and retry.other == 0
+
+
+# --- Face index ---
+def _unit(vector):
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def test_face_index_persists_and_searches_by_cosine_similarity(tmp_path):
+    rng = np.random.default_rng(0)
+    ama, kofi = _unit(rng.normal(size=128)), _unit(rng.normal(size=128))
+    index = av.FaceIndex(str(tmp_path))
+    index.add('Ama', ama)
+    index.add('Kofi', kofi)
+
+    reloaded = av.FaceIndex(str(tmp_path))
+    assert isinstance(reloaded.embeddings, np.memmap)
+    name, similarity = reloaded.search(ama)
+    assert name == 'Ama' and similarity == pytest.approx(1.0)
+
+
+def test_face_index_rejects_embeddings_of_another_size(tmp_path):
+    index = av.FaceIndex(str(tmp_path))
+    index.add('Ama', _unit(np.ones(128)))
+    assert index.search(_unit(np.ones(192))) == (None, 0.0)
+
+
+# --- Text block proposals ---
+def _two_column_page():
+    cv2 = pytest.importorskip('cv2')
+    page = np.full((1100, 850), 250, np.uint8)
+    cv2.putText(page, 'A Title Across Columns', (120, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 20, 3)
+    for column in range(2):
+        for paragraph in range(3):
+            for line in range(5):
+                origin = (50 + column * 410, 160 + paragraph * 300 + line * 40)
+                cv2.putText(page, 'quick brown fox jumps', origin, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+    return page
+
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def test_text_blocks_are_disjoint_paragraphs_in_reading_order():
+    page = np.hstack([np.full((1100, 30), 40, np.uint8), _two_column_page()])  # Dark strip along the page edge
+    blocks = av.find_text_blocks(page)
+    assert len(blocks) == 7  # Title, then three paragraphs per column
+    assert not any(_overlap(a, b) for i, a in enumerate(blocks) for b in blocks[i + 1:])
+    assert blocks[0][1] < 100 and blocks[1][0] < blocks[4][0]
+
+
+_PHOTO_CORNERS = np.float32([[330, 60], [930, 90], [990, 900], [280, 880]])  # Page corners TL, TR, BR, BL
+
+
+def _photograph(page):
+    """The page lying on a dark desk, seen at an angle by a 1280x960 camera."""
+    cv2 = pytest.importorskip('cv2')
+    height, width = page.shape
+    corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    photo = np.full((960, 1280), 60, np.uint8)
+    return cv2.warpPerspective(page, cv2.getPerspectiveTransform(corners, _PHOTO_CORNERS), (1280, 960),
+                               dst=photo, borderMode=cv2.BORDER_TRANSPARENT)
+
+
+def test_text_blocks_of_a_preprocessed_photo_do_not_overlap():
+    photo = _photograph(_two_column_page())
+    blocks = av.find_text_blocks(av.DocumentPreprocessor().process(photo, binarize=False))
+    assert len(blocks) == 7
+    assert not any(_overlap(a, b) for i, a in enumerate(blocks) for b in blocks[i + 1:])
+
+
+# --- Document preprocessing ---
+def test_preprocessor_finds_and_flattens_the_page():
+    preprocessor = av.DocumentPreprocessor()
+    photo = _photograph(_two_column_page())
+    quad = preprocessor.find_document_quad(photo)
+    assert quad is not None
+    assert np.abs(quad - _PHOTO_CORNERS).max() < 10
+    page = preprocessor.process(photo, binarize=False)
+    assert page.shape == pytest.approx((820, 710), abs=15)  # Longest edges of the quad, not the camera frame
+    assert preprocessor.estimate_skew(page) == 0.0
+
+
+def test_preprocessor_deskews_when_no_page_outline_is_visible():
+    preprocessor = av.DocumentPreprocessor()
+    page = preprocessor.rotate(_two_column_page(), 4.0)  # Fills the frame: no desk around it
+    assert preprocessor.find_document_quad(page) is None
+    assert preprocessor.estimate_skew(page) == pytest.approx(-4.0, abs=0.5)
+    flattened = preprocessor.process(page)
+    assert flattened.shape == page.shape
+    assert set(np.unique(flattened)) <= {0, 255}
+    assert abs(preprocessor.estimate_skew(flattened)) <= 0.5
+
+
+def test_preprocessor_leaves_pages_without_text_lines_level():
+    preprocessor = av.DocumentPreprocessor()
+    noise = np.random.default_rng(0).integers(0, 256, (480, 640), dtype=np.uint8)
+    assert preprocessor.estimate_skew(noise) == 0.0
+
+
+def test_preprocessor_reports_stage_timings():
+    preprocessor = av.DocumentPreprocessor()
+    assert preprocessor.stats() == {'runs': 0, 'last_ms': {}, 'avg_ms': {}}
+    preprocessor.process(_photograph(_two_column_page()))
+    preprocessor.process(_two_column_page(), binarize=False)
+    stats = preprocessor.stats()
+    assert stats['runs'] == 2
+    assert set(stats['last_ms']) == set(stats['avg_ms']) == set(av.DocumentPreprocessor.STAGES)
+    assert all(ms >= 0 for ms in stats['avg_ms'].values())
+
+
+# --- Vision commands ---
+class _SocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class _Audio:
+    def __init__(self):
+        self.spoken = []
+
+    def speak(self, text):
+        self.spoken.append(text)
+
+
+class _System:
+    def __init__(self):
+        self.audio_system = _Audio()
+        self.last_spoken_response = None
+
+
+@pytest.fixture
+def spoken(monkeypatch):
+    system = _System()
+    monkeypatch.setattr(av, 'system_instance', system, raising=False)
+    return system.audio_system.spoken
+
+
+@pytest.fixture
+def vision():
+    return av.AIVisionSystem(_SocketIO(), enable_camera=False)
+
+
+def test_unchanged_view_reuses_the_last_upload_without_capturing(vision, spoken, monkeypatch):
+    view = np.tile(np.linspace(0, 255, 640).astype(np.uint8), (480, 1))
+    vision.frame_ring.push(view)
+    upload = av.EncodedFrame(b'', 1, 0.0, 640, 480)
+    upload.thumbnail = av.frame_thumbnail(view)
+    vision.response_cache.put('describe', vision._vision_model_key(), av.perceptual_hash(upload.thumbnail), 'A desk.')
+    vision._note_upload('describe_scene', 'describe', upload)
+    monkeypatch.setattr(vision, '_get_jpeg_frame', lambda *args, **kwargs: pytest.fail('captured a new still'))
+
+    assert vision.describe_scene() == 'Scene: A desk.'
+    assert spoken == ['Scene: A desk.']
+
+    vision.frame_ring.push(255 - view)
+    assert vision.is_new_upload_warranted('describe_scene')
+
+
+def test_analysis_is_not_reused_for_a_different_dim_room(vision):
+    room = np.tile(np.linspace(20, 35, 320), (240, 1)).astype(np.uint8)
+    other_room = np.tile(np.linspace(10, 40, 240)[:, None], (1, 320)).astype(np.uint8)
+    thumbnail = av.frame_thumbnail(room)
+    vision.scene_analyses[1] = {'frame_id': 1, 'thumbnail': thumbnail, 'created': time.time(),
+                                'scene': 'A dim hallway.', 'objects': [], 'text': ''}
+    vision.frame_ring.push(other_room)
+    assert av.change_score(thumbnail, vision.frame_ring.latest().thumbnail) < vision.scene_change_threshold
+    assert vision._analysis_for_current_view() is None
+    vision.frame_ring.push(room)
+    assert vision._analysis_for_current_view()['frame_id'] == 1
+
+
+# --- Parallel OCR ---
+class _LineEngine(av.OCREngine):
+    name = 'fake'
+
+    def recognize(self, gray):
+        return 'in-process'
+
+
+class _BreakingPool:
+    """Finishes the first `good` submitted lines, then fails like a pool whose worker died."""
+    def __init__(self, good):
+        self.good = good
+        self.submitted = 0
+
+    def submit(self, fn, strip):
+        future = concurrent.futures.Future()
+        if self.submitted < self.good:
+            future.set_result('pooled')
+        else:  # Fails only after the finished lines have been collected
+            threading.Timer(0.05, future.set_exception, [BrokenProcessPool('worker died')]).start()
+        self.submitted += 1
+        return future
+
+
+def test_parallel_ocr_resumes_in_process_without_repeating_spoken_blocks():
+    reader = av.ParallelOCR(_LineEngine(), workers=2)
+    reader.pool = _BreakingPool(good=5)
+    spoken = []
+    blocks = reader.read(_two_column_page(), on_block=spoken.append)
+    assert spoken == blocks  # Every block is spoken exactly once
+    assert len(blocks) == 7
+    words = ' '.join(blocks).split()
+    assert len(words) == 31  # Title + 6 paragraphs of 5 lines, each line read once
+    assert words.count('pooled') == 5  # Lines finished by the pool are not read again
+    assert blocks[0] == 'pooled'
+    assert reader.pool is None
+
+
+# --- Streamed speech ---
+def _feed_all(splitter, chunks):
+    return [splitter.feed(chunk) for chunk in chunks]
+
+
+def test_sentence_splitter_releases_sentences_as_chunks_complete_them():
+    splitter = av.SentenceSplitter()
+    assert _feed_all(splitter, ['The room is bri', 'ght and tidy. There', ' is a desk by the window.\nA lamp']) == [
+        [], ['The room is bright and tidy.'], ['There is a desk by the window.']]
+    assert splitter.flush() == ['A lamp']
+    assert splitter.flush() == []
+
+
+def test_sentence_splitter_joins_short_fragments():
+    splitter = av.SentenceSplitter(min_length=20)
+    assert splitter.feed('Yes. It is a large brown dog. Ok. ') == ['Yes. It is a large brown dog.']
+    assert splitter.flush() == ['Ok.']
+
+
+def test_sentence_splitter_does_not_break_after_abbreviations():
+    splitter = av.SentenceSplitter()
+    chunks = ['A sign points to Dr.', " Brown's office, e.g. room", ' 4.5 on the left. Next to', ' it is a lift.']
+    assert sum(_feed_all(splitter, chunks), []) == [
+        "A sign points to Dr. Brown's office, e.g. room 4.5 on the left."]
+    assert splitter.flush() == ['Next to it is a lift.']
+
+
+# --- Vision response cache ---
+def test_vision_cache_matches_near_duplicate_frames():
+    cache = av.VisionResponseCache()
+    thumbnail = np.tile(np.linspace(0, 255, 32, dtype=np.float32), (24, 1))
+    cache.put('describe', 'model', av.perceptual_hash(thumbnail), 'A desk.')
+    assert cache.get('describe', 'model', av.perceptual_hash(thumbnail + 1.0)) == 'A desk.'
+
+
+# --- Command coalescing ---
+def test_single_flight_shares_only_calls_still_in_flight():
+    flights = av.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return len(calls)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do(('describe', ''), slow)))
+    leader.start()
+    while not flights.in_flight(('describe', '')):
+        time.sleep(0.01)
+    follower = threading.Thread(target=lambda: results.append(flights.do(('describe', ''), slow)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert sorted(results) == [(1, False), (1, True)]
+
+    # A repeat right after the call finished runs again instead of reusing the old answer
+    assert flights.do(('describe', ''), slow) == (2, False)